@@ -0,0 +1,342 @@
+"""Admission control for agent runs: priority queueing and early load shedding.
+
+Every agent run (an analysis or a chat answer; cache hits never get here)
+takes a slot from the `AdmissionController` first. At most ADMISSION_MAX_RUNS
+runs proceed at once per process, and each run also draws its expected number
+of model calls from a token bucket sized to the providers' request quota
+(PROVIDER_RPM). Runs that cannot start yet wait in a priority queue. Chat goes
+first, then News Impact, then Complete Analysis, and batch items and
+pre-warming only run when no interactive request is waiting.
+
+A request is turned away up front, rather than left to time out or to push
+the providers into rate-limit errors, when the queue is full or its
+estimated wait exceeds ADMISSION_MAX_WAIT seconds. The estimate comes from
+the work queued ahead of it and the observed run durations, and is returned
+to the client as Retry-After. The work ahead includes runs queued before
+they ask for a slot, such as analysis jobs waiting for a job-pool worker
+(the `backlog` hook). When a provider does answer with a rate-limit
+error, new admissions pause for a while.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from rate_limit import TokenBucket
+from tracing import ADMISSIONS, annotate
+
+ADMISSION_MAX_RUNS = int(os.environ.get("ADMISSION_MAX_RUNS", 8))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 32))
+ADMISSION_MAX_WAIT = float(os.environ.get("ADMISSION_MAX_WAIT", 60))
+# Model calls per minute the providers allow us (0 disables the quota) and how many may be made at once
+PROVIDER_RPM = float(os.environ.get("PROVIDER_RPM", 120))
+PROVIDER_BURST = float(os.environ.get("PROVIDER_BURST", 30))
+# How long admissions pause after a provider rate-limit error that does not say how long to wait
+RATE_LIMIT_PAUSE = float(os.environ.get("RATE_LIMIT_PAUSE", 20))
+
+# Lower runs first; background work queues behind every interactive request.
+# "News Update" is an incremental News Impact run that only assesses new articles (news_store.py).
+PRIORITIES = {"chat": 0, "News Update": 1, "News Impact": 1, "Comparison": 2, "Complete Analysis": 2}
+BACKGROUND_PRIORITY = 10
+# Expected model calls per run, drawn from the provider quota when the run starts
+MODEL_CALLS = {"chat": 1, "News Update": 1, "News Impact": 3, "Comparison": 1, "Complete Analysis": 6}
+# Run durations assumed until some have been observed
+DEFAULT_RUN_SECONDS = {"chat": 5.0, "News Update": 8.0, "News Impact": 20.0, "Comparison": 15.0, "Complete Analysis": 40.0}
+
+
+class Overloaded(Exception):
+    """The request was shed; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def is_rate_limit_error(error: Union[BaseException, str]) -> bool:
+    if getattr(error, "status_code", None) == 429:
+        return True
+    text = str(error).lower()
+    return "rate limit" in text or "rate_limit" in text or "resource_exhausted" in text or "too many requests" in text
+
+
+@dataclass(order=True)
+class Ticket:
+    priority: int
+    seq: int
+    kind: str = field(compare=False)
+    cost: float = field(compare=False)
+    wake: Callable[[], None] = field(compare=False, repr=False)
+    enqueued_at: float = field(default_factory=time.monotonic, compare=False)
+    started_at: Optional[float] = field(default=None, compare=False)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_runs: int = ADMISSION_MAX_RUNS,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        rpm: float = PROVIDER_RPM,
+        burst: float = PROVIDER_BURST,
+    ):
+        self.max_runs = max_runs
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # The bucket must hold the most expensive run or that run could never start
+        self.quota = TokenBucket(rpm / 60, max(burst, max(MODEL_CALLS.values()))) if rpm > 0 else None
+        self._queue: List[Ticket] = []
+        self._running: Dict[int, Ticket] = {}
+        self._durations: Dict[str, float] = dict(DEFAULT_RUN_SECONDS)
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.counts = {"admitted": 0, "shed": 0, "timed_out": 0, "rate_limited": 0}
+        # The kinds of runs queued outside the controller at or ahead of a priority, e.g. jobs waiting
+        # for a worker (server.py); counted by `check` and `estimate_wait`, which a request passes before queueing there
+        self.backlog: Optional[Callable[[int], List[str]]] = None
+
+    @staticmethod
+    def priority(kind: str, background: bool = False) -> int:
+        return PRIORITIES.get(kind, len(PRIORITIES)) + (BACKGROUND_PRIORITY if background else 0)
+
+    def _duration(self, kind: str) -> float:
+        return self._durations.get(kind, DEFAULT_RUN_SECONDS["Complete Analysis"])
+
+    def _backlog(self, priority: int) -> List[str]:
+        return self.backlog(priority) if self.backlog is not None else []
+
+    def _estimate_wait(self, priority: int, kind: str, backlog: List[str] = ()) -> float:
+        """Seconds until a new run of `kind` at `priority` would start; called with the lock held."""
+        now = time.monotonic()
+        ahead = [t.kind for t in self._queue if t.priority <= priority] + list(backlog)
+        wait = 0.0
+        if len(self._running) + len(ahead) >= self.max_runs:
+            # The work ahead (queued runs plus what is left of running ones) spread over all slots
+            remaining = sum(max(0.0, self._duration(t.kind) - (now - t.started_at)) for t in self._running.values())
+            wait = (remaining + sum(self._duration(k) for k in ahead)) / self.max_runs
+        if self.quota is not None:
+            wait = max(wait, self.quota.wait_time(sum(MODEL_CALLS.get(k, 1) for k in ahead) + MODEL_CALLS.get(kind, 1)))
+        return wait + max(0.0, self._paused_until - now)
+
+    def estimate_wait(self, kind: str, background: bool = False) -> float:
+        priority = self.priority(kind, background)
+        with self._lock:
+            return self._estimate_wait(priority, kind, self._backlog(priority))
+
+    def check(self, kind: str, background: bool = False) -> None:
+        """Raise `Overloaded` if a run of `kind` would be shed, without queueing it."""
+        priority = self.priority(kind, background)
+        with self._lock:
+            self._check(priority, kind, self._backlog(priority))
+
+    def _check(self, priority: int, kind: str, backlog: List[str] = ()) -> None:
+        estimate = self._estimate_wait(priority, kind, backlog)
+        # Only what would run first counts, so queued background work never sheds interactive requests
+        if sum(1 for t in self._queue if t.priority <= priority) + len(backlog) >= self.max_queue or estimate > self.max_wait:
+            self.counts["shed"] += 1
+            ADMISSIONS.inc(kind=kind, outcome="shed")
+            raise Overloaded(f"Server busy: {len(self._running)} runs in progress and {len(self._queue) + len(backlog)} queued", estimate or self.max_wait)
+
+    def _enqueue(self, kind: str, background: bool, wake: Callable[[], None]) -> Ticket:
+        priority = self.priority(kind, background)
+        with self._lock:
+            self._check(priority, kind)
+            ticket = Ticket(priority, next(self._seq), kind, MODEL_CALLS.get(kind, 1), wake)
+            heapq.heappush(self._queue, ticket)
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self) -> None:
+        """Start queued runs while slots and quota allow; called with the lock held."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            self._schedule(self._paused_until - now)
+            return
+        while self._queue and len(self._running) < self.max_runs:
+            head = self._queue[0]
+            if self.quota is not None and not self.quota.try_acquire(head.cost):
+                self._schedule(self.quota.wait_time(head.cost))
+                return
+            heapq.heappop(self._queue)
+            head.started_at = now
+            self._running[head.seq] = head
+            self.counts["admitted"] += 1
+            ADMISSIONS.inc(kind=head.kind, outcome="admitted")
+            head.wake()
+
+    def _schedule(self, delay: float) -> None:
+        # Nothing finishing may be what frees the quota or ends a pause, so dispatch again on a timer
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Timer(max(delay, 0.01), self._redispatch)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _redispatch(self) -> None:
+        with self._lock:
+            self._dispatch()
+
+    def _abandon(self, ticket: Ticket) -> bool:
+        """Remove a ticket that stopped waiting; returns False if it was admitted in the meantime."""
+        with self._lock:
+            if ticket.started_at is not None:
+                return False
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self.counts["timed_out"] += 1
+            ADMISSIONS.inc(kind=ticket.kind, outcome="timed_out")
+            return True
+
+    def _timed_out(self, ticket: Ticket) -> Overloaded:
+        with self._lock:
+            estimate = self._estimate_wait(ticket.priority, ticket.kind)
+        return Overloaded(f"Server busy: no capacity within {self.max_wait:g} seconds", estimate or self.max_wait)
+
+    def acquire(self, kind: str, background: bool = False, timeout: Optional[float] = None) -> Ticket:
+        """Wait for a run slot; raises `Overloaded` if the run is shed or not admitted within `timeout`."""
+        admitted = threading.Event()
+        ticket = self._enqueue(kind, background, admitted.set)
+        if not admitted.wait(self.max_wait if timeout is None else timeout) and self._abandon(ticket):
+            raise self._timed_out(ticket)
+        annotate(admission_wait=round(ticket.started_at - ticket.enqueued_at, 3))
+        return ticket
+
+    async def aacquire(self, kind: str, background: bool = False, timeout: Optional[float] = None) -> Ticket:
+        """Async `acquire`: waiting does not hold a thread."""
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        ticket = self._enqueue(kind, background, wake)
+        try:
+            await asyncio.wait_for(asyncio.shield(admitted), self.max_wait if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(ticket):
+                raise self._timed_out(ticket)
+        except asyncio.CancelledError:
+            # The client went away while queued; give back the slot if it was granted meanwhile
+            if not self._abandon(ticket):
+                self.release(ticket)
+            raise
+        annotate(admission_wait=round(ticket.started_at - ticket.enqueued_at, 3))
+        return ticket
+
+    def release(self, ticket: Ticket, error: Optional[Union[BaseException, str]] = None) -> None:
+        with self._lock:
+            if self._running.pop(ticket.seq, None) is None:
+                return
+            if error is None:
+                # Exponentially weighted, so the estimates follow the providers' current speed
+                duration = time.monotonic() - ticket.started_at
+                self._durations[ticket.kind] = 0.8 * self._duration(ticket.kind) + 0.2 * duration
+            elif is_rate_limit_error(error):
+                pause = float(getattr(error, "retry_after", None) or RATE_LIMIT_PAUSE)
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                self.counts["rate_limited"] += 1
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, kind: str, background: bool = False):
+        ticket = self.acquire(kind, background)
+        error = None
+        try:
+            yield ticket
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(ticket, error)
+
+    @asynccontextmanager
+    async def aadmit(self, kind: str, background: bool = False):
+        ticket = await self.aacquire(kind, background)
+        error = None
+        try:
+            yield ticket
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(ticket, error)
+
+    def stream(self, kind: str, events: Callable[[], Iterator[Tuple[str, Dict[str, Any]]]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Admit a streamed run (`stream_agent_run` events), reporting the wait as progress.
+
+        A run that is shed, or not admitted in time, ends with an `error` event carrying `retry_after`.
+        """
+        waiting = self.estimate_wait(kind) > 0
+        if waiting:
+            yield "progress", {"stage": "Waiting for capacity", "status": "started"}
+        try:
+            ticket = self.acquire(kind)
+        except Overloaded as e:
+            yield "error", {"message": str(e), "retry_after": e.retry_after}
+            return
+        if waiting:
+            yield "progress", {"stage": "Waiting for capacity", "status": "completed"}
+        error = None
+        try:
+            for event, data in events():
+                if event == "error":
+                    error = data["message"]
+                yield event, data
+        finally:
+            self.release(ticket, error)
+
+    async def astream(self, kind: str, events: Callable[[], AsyncIterator[Tuple[str, Dict[str, Any]]]]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Async `stream` for `astream_agent_run` events."""
+        waiting = self.estimate_wait(kind) > 0
+        if waiting:
+            yield "progress", {"stage": "Waiting for capacity", "status": "started"}
+        try:
+            ticket = await self.aacquire(kind)
+        except Overloaded as e:
+            yield "error", {"message": str(e), "retry_after": e.retry_after}
+            return
+        if waiting:
+            yield "progress", {"stage": "Waiting for capacity", "status": "completed"}
+        error = None
+        try:
+            async for event, data in events():
+                if event == "error":
+                    error = data["message"]
+                yield event, data
+        finally:
+            self.release(ticket, error)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "max_runs": self.max_runs,
+                "max_queue": self.max_queue,
+                "paused_seconds": round(max(0.0, self._paused_until - now), 1),
+                "quota_wait_seconds": round(self.quota.wait_time(1), 2) if self.quota is not None else None,
+                "run_seconds": {kind: round(seconds, 2) for kind, seconds in self._durations.items()},
+                "estimated_wait": {kind: round(self._estimate_wait(self.priority(kind), kind, self._backlog(self.priority(kind))), 1) for kind in PRIORITIES},
+                **self.counts,
+            }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide admission controller (see ADMISSION_MAX_RUNS, ADMISSION_MAX_QUEUE, ADMISSION_MAX_WAIT and PROVIDER_RPM)."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
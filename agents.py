@@ -0,0 +1,410 @@
+"""Process-wide registry of models and agents shared by main.py and server.py.
+
+Everything is built lazily on first use and then reused for the life of the
+process, so model clients (and their HTTP connection pools) are created once
+instead of on every Streamlit rerun or request. The provider SDKs and the
+toolkits' libraries are imported by the builders too, which keeps them out of
+process startup; `preload()` imports them up front where that is wanted.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from agno.agent import Agent
+
+from indicators import TechnicalIndicatorTools
+from parallel_team import Member, ParallelTeam
+from report_schema import ComparisonReport, NewsUpdate, StockReport
+from routing import ROUTING_MODE, RoutedModel
+from streaming import progress_hook
+from tracing import instrument_agent, instrument_model, trace_tool_hook
+
+load_dotenv()
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
+# Point the providers at other endpoints, e.g. the local fake model server in benchmarks/fake_llm.py
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL")
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL")
+
+GEMINI_MODEL_ID = "gemini-2.0-flash"
+GROQ_MODEL_ID = "meta-llama/llama-4-maverick-17b-128e-instruct"
+
+# "parallel" runs the finance and web-search members concurrently and only uses the leader to
+# synthesize; "team" keeps agno's sequential delegation from the leader
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "parallel")
+MEMBER_TIMEOUT = float(os.environ.get("MEMBER_TIMEOUT", 90))
+
+# "json" has the report agents fill in a StockReport (report_schema.py) instead of writing markdown
+# tables, which takes far fewer output tokens; server.py renders markdown only when a client asks.
+# "markdown" keeps the table-formatted reports.
+REPORT_FORMAT = os.environ.get("REPORT_FORMAT", "json")
+STRUCTURED_REPORTS = REPORT_FORMAT == "json"
+
+ANALYSIS_PROMPTS = {
+    "Complete Analysis": "Provide comprehensive analysis for {stock_symbol} including current price, analyst recommendations, technical indicators, and investment outlook.",
+    "News Impact": "Find and summarize the latest news for {stock_symbol} with market impact assessment.",
+    # {stock_symbol} is a comparison key such as "AAPL,GOOGL,MSFT" (comparison.py)
+    "Comparison": "Compare {stock_symbol} side by side on performance, valuation, risk and technicals, rank them and say which is the better investment.",
+}
+
+
+def analysis_prompt(stock_symbol: str, analysis_type: str, context: Optional[str] = None) -> str:
+    prompt = ANALYSIS_PROMPTS[analysis_type].format(stock_symbol=stock_symbol)
+    if context:
+        prompt += f"\n\n{context}"
+    return prompt
+
+
+class Registry:
+    """Builds each named object once, on first request, in a thread-safe way."""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str):
+        def decorator(factory: Callable[[], Any]) -> Callable[[], Any]:
+            self._factories[name] = factory
+            return factory
+        return decorator
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown registry entry: {name}")
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def create(self, name: str) -> Any:
+        """Build a fresh, uncached instance (e.g. an agent for one concurrent run)."""
+        if name not in self._factories:
+            raise KeyError(f"Unknown registry entry: {name}")
+        return self._factories[name]()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._instances.clear()
+
+
+registry = Registry()
+
+
+def get_agent(name: str) -> Agent:
+    return registry.get(name)
+
+
+def new_agent(name: str) -> Agent:
+    # Agents keep per-run state, so concurrent runs each get their own instance.
+    # Construction is cheap: the model clients underneath are still shared.
+    return registry.create(name)
+
+
+def analysis_agent_name(mode: Optional[str] = None, analysis_type: Optional[str] = None) -> str:
+    if analysis_type == "Comparison":
+        return "comparison_agent"
+    return "parallel_team" if (mode or ANALYSIS_MODE) == "parallel" else "multi_ai_agent"
+
+
+def preload() -> None:
+    """Import the provider SDKs and tool libraries that the builders would import on first use.
+
+    serve.py calls this before forking workers, so they share the modules instead of each importing them.
+    """
+    import agno.models.google  # noqa: F401
+    import agno.models.groq  # noqa: F401
+    import google.genai  # noqa: F401
+    import groq  # noqa: F401
+    import toolkits  # noqa: F401
+
+
+# --- Model clients ---
+
+@registry.register("groq_http_client")
+def build_groq_http_client():
+    # One pooled client shared by every Groq model so TLS connections are reused
+    return httpx.Client(limits=httpx.Limits(max_connections=20, max_keepalive_connections=10), timeout=120)
+
+
+@registry.register("groq_async_client")
+def build_groq_async_client():
+    # agno would otherwise hand the sync http client above to AsyncGroq on every arun() call.
+    # httpx async pools are tied to one event loop; the async server runs one loop per process.
+    from groq import AsyncGroq
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=200, max_keepalive_connections=50), timeout=120)
+    return AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, http_client=http_client)
+
+
+@registry.register("gemini_client")
+def build_gemini_client():
+    from google import genai
+    http_options = genai.types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+    return genai.Client(api_key=GOOGLE_API_KEY, http_options=http_options)
+
+
+def gemini_model():
+    from agno.models.google import Gemini
+    # Each agent gets its own model object (models carry per-run state) but all share one client
+    return instrument_model(Gemini(id=GEMINI_MODEL_ID, api_key=GOOGLE_API_KEY, client=registry.get("gemini_client")))
+
+
+def groq_model():
+    from agno.models.groq import Groq
+    return instrument_model(Groq(
+        id=GROQ_MODEL_ID,
+        api_key=GROQ_API_KEY,
+        base_url=GROQ_BASE_URL,
+        http_client=registry.get("groq_http_client"),
+        async_client=registry.get("groq_async_client"),
+    ))
+
+
+# Builder and API key per provider; providers without a key are left out of routing
+MODEL_BUILDERS = {"gemini": (gemini_model, GOOGLE_API_KEY), "groq": (groq_model, GROQ_API_KEY)}
+
+
+def routed_model(*providers: str):
+    """A model for the first provider that can move to the others when it is slow or failing (MODEL_ROUTING)."""
+    builders = [MODEL_BUILDERS[providers[0]]] + [MODEL_BUILDERS[p] for p in providers[1:] if MODEL_BUILDERS[p][1]]
+    if ROUTING_MODE == "off" or len(builders) == 1:
+        return builders[0][0]()
+    return RoutedModel(candidates=[build() for build, _ in builders])
+
+
+# --- Agents ---
+
+# Tool hooks for every agent with tools: a trace span per call, then UI progress events
+TOOL_HOOKS = [trace_tool_hook, progress_hook]
+
+
+# With structured reports the members' output is only read by the report agent, so they write terse notes
+WEB_SEARCH_NOTES = [
+    "Report each relevant news item on one line: date, source, headline, market impact (Positive/Neutral/Negative) and why",
+    "Always include sources with dates of publication",
+    "Do not use tables, headings or introductions",
+    "If the request includes a <news_articles> block, report on every article in it before searching for more",
+]
+
+FINANCE_NOTES = [
+    "Report the data as terse notes, one fact per line with its figure - no tables, headings or prose",
+    "Cover price data, fundamentals compared to industry averages, analyst consensus with target prices, technical indicators with buy/sell signals, short/medium/long-term timing and risks",
+    "Use compute_technical_indicators for technical indicators and signals instead of estimating them from raw prices",
+    "If the request includes a <market_data> block, use that data instead of calling tools for the same information"
+]
+
+
+@registry.register("web_search_agent")
+def build_web_search_agent():
+    from toolkits import CachedDuckDuckGoTools
+    return instrument_agent(Agent(
+        name="Web Search Agent",
+        role="Search the web for the latest information",
+        model=routed_model("gemini", "groq"),
+        tools=[CachedDuckDuckGoTools()],
+        instructions=WEB_SEARCH_NOTES if STRUCTURED_REPORTS else [
+            "ALWAYS present information in tabular format where possible",
+            "Always include sources with dates of publication",
+            "Structure your output with clear headings and bullet points",
+            "For financial news, categorize information by market impact (Positive/Neutral/Negative) in a table format",
+            "Include a summary of key takeaways at the end in a table format",
+            "If the request includes a <news_articles> block, report on every article in it before searching for more",
+        ],
+        show_tool_calls=True,
+        tool_hooks=TOOL_HOOKS,
+        markdown=not STRUCTURED_REPORTS,
+    ))
+
+
+@registry.register("finance_agent")
+def build_finance_agent():
+    from toolkits import CachedYFinanceTools
+    return instrument_agent(Agent(
+        name="Finance AI Agent",
+        model=routed_model("gemini", "groq"),
+        tools=[
+            CachedYFinanceTools(stock_price=True, analyst_recommendations=True, stock_fundamentals=True, company_news=True),
+            TechnicalIndicatorTools(),
+        ],
+        instructions=FINANCE_NOTES if STRUCTURED_REPORTS else [
+            "ALWAYS present ALL data in tabular format - no exceptions",
+            "Present analyst recommendations with consensus ratings in a table (Strong Buy/Buy/Hold/Sell/Strong Sell)",
+            "Include target price ranges and average price targets in a dedicated table",
+            "Provide technical indicators with clear buy/sell signals in a table format",
+            "Use compute_technical_indicators for technical indicators and signals instead of estimating them from raw prices",
+            "Format all price data with appropriate currency symbols",
+            "Present 'Timing Guidance' section with short-term, medium-term, and long-term outlooks in a table",
+            "Add a 'Risk Assessment' section in tabular format highlighting potential downsides",
+            "Structure output with clear headings: Summary, Price Data, Fundamentals, Analyst Views, Technical Analysis, Timing Guidance, Risk Assessment",
+            "Even summary information must be presented in a table format",
+            "If the request includes a <market_data> block, use that data instead of calling tools for the same information"
+        ],
+        show_tool_calls=True,
+        tool_hooks=TOOL_HOOKS,
+        markdown=not STRUCTURED_REPORTS,
+    ))
+
+
+# Output requirements shared by the delegating team leader and the parallel-mode synthesizer
+REPORT_INSTRUCTIONS = [
+    "ALWAYS present ALL information in table format - this is mandatory",
+    "Structure output with clear sections using markdown headings, with each section containing at least one table",
+    "Present ALL data in tables - never use paragraphs where tables can be used instead",
+    "Include a 'Stock Fundamentals' table with key metrics and comparisons to industry averages",
+    "Provide 'Analyst Consensus' table with specific ratings, target prices and timeframes",
+    "Add 'Technical Analysis' table with key indicators and clear buy/sell signals",
+    "Include 'Entry Points' table suggesting optimal buying opportunities based on technical patterns",
+    "Add 'Investment Timeframe' table (Short-term trader vs. Long-term investor recommendations)",
+    "Include 'Risk Assessment' table highlighting potential downside scenarios",
+    "End with 'Action Plan' table summarizing recommendations with clear timing guidance",
+    "Always cite sources for all external information in a dedicated sources table"
+]
+
+# The same requirements for a StockReport; the first two entries match the layout of REPORT_INSTRUCTIONS
+STRUCTURED_REPORT_INSTRUCTIONS = [
+    "Answer with a single JSON object following the StockReport schema and nothing else",
+    "Keep text fields short - facts and figures, no markdown",
+    "Fill in every section the gathered data supports and leave out fields the data does not cover rather than guessing",
+    "Give prices and price targets as plain numbers in the stock's currency",
+    "Compare fundamentals to industry averages in their benchmark field and give each technical indicator a buy/sell signal",
+    "Include short-term, medium-term and long-term entries in action_plan with entry points and timing",
+    "For news, rate the market impact of each item as Positive, Neutral or Negative",
+    "Cite sources for all external information in sources",
+]
+
+
+def report_agent_options(instructions):
+    """Instructions and output options for an agent that writes the final analysis report."""
+    base = STRUCTURED_REPORT_INSTRUCTIONS if STRUCTURED_REPORTS else REPORT_INSTRUCTIONS
+    options = {"instructions": base[:2] + instructions + base[2:]}
+    if STRUCTURED_REPORTS:
+        # JSON mode rather than native structured outputs, so every routed provider returns the same schema
+        options.update(response_model=StockReport, use_json_mode=True, markdown=False)
+    else:
+        options["markdown"] = True
+    return options
+
+
+@registry.register("multi_ai_agent")
+def build_multi_ai_agent():
+    return instrument_agent(Agent(
+        team=[new_agent("finance_agent"), new_agent("web_search_agent")],
+        model=routed_model("groq", "gemini"),
+        show_tool_calls=True,
+        tool_hooks=TOOL_HOOKS,
+        **report_agent_options([
+            "First use the Finance Agent to get detailed stock data",
+            "Then use the Web Search Agent for recent news and market sentiment",
+            "If the request includes a <market_data> block, it already contains the Finance Agent's price, fundamentals, analyst, news and technical indicator data: use it directly instead of asking the Finance Agent to fetch it again",
+        ]),
+    ))
+
+
+@registry.register("synthesis_agent")
+def build_synthesis_agent():
+    return instrument_agent(Agent(
+        name="Report Synthesizer",
+        model=routed_model("groq", "gemini"),
+        **report_agent_options([
+            "You are given reports from the Finance Agent and the Web Search Agent inside <member_report> blocks",
+            "Combine them into one report; do not invent data that is missing from the reports or the <market_data> and <news_articles> blocks",
+        ]),
+    ))
+
+
+@registry.register("news_update_agent")
+def build_news_update_agent():
+    # Assesses only the articles published since the last News Impact report (news_store.py)
+    return instrument_agent(Agent(
+        name="News Update Analyst",
+        model=routed_model("groq", "gemini"),
+        instructions=[
+            "Answer with a single JSON object following the NewsUpdate schema and nothing else",
+            "Add one news item for each article in <new_articles>, rating its market impact as Positive, Neutral or Negative; do not repeat items from <previous_assessment>",
+            "Rewrite the summary to cover the previous assessment and the new articles together",
+            "Only list risks the new articles raise",
+        ],
+        response_model=NewsUpdate,
+        use_json_mode=True,
+        markdown=False,
+    ))
+
+
+@registry.register("comparison_agent")
+def build_comparison_agent():
+    # One synthesis pass over data fetched for all tickers at once (comparison.py), so no tools and no team
+    instructions = [
+        "You are given the data for every ticker in one <comparison_data> table; base the comparison on it and do not invent figures it does not contain",
+        "Say where a ticker has no data for a metric rather than guessing",
+        "Rank all the tickers, most attractive first, each with a recommendation and a one-sentence rationale",
+        "Close with a verdict: which stock is preferred, and for what kind of investor",
+    ]
+    if STRUCTURED_REPORTS:
+        options = dict(response_model=ComparisonReport, use_json_mode=True, markdown=False)
+        instructions = [
+            "Answer with a single JSON object following the ComparisonReport schema and nothing else",
+            "Keep text fields short - facts and figures, no markdown",
+            "In metrics, give the rows that tell the stocks apart, with each ticker's value as shown in the table and the leading ticker",
+        ] + instructions + ["Cite Yahoo Finance, the source of the table, in sources"]
+    else:
+        options = dict(markdown=True)
+        instructions = [
+            "Present the comparison in markdown tables, with one column per ticker",
+            "Include 'Side by Side', 'Ranking', 'Risk Assessment' and 'Verdict' sections",
+        ] + instructions
+    return instrument_agent(Agent(
+        name="Comparison Analyst",
+        model=routed_model("groq", "gemini"),
+        instructions=instructions,
+        **options,
+    ))
+
+
+@registry.register("parallel_team")
+def build_parallel_team():
+    return ParallelTeam(
+        leader=new_agent("synthesis_agent"),
+        members=[
+            Member(new_agent("finance_agent"), timeout=MEMBER_TIMEOUT),
+            Member(
+                new_agent("web_search_agent"),
+                task="Find the latest news and market sentiment relevant to this request:\n{request}",
+                timeout=MEMBER_TIMEOUT,
+                strip_market_data=True,
+            ),
+        ],
+    )
+
+
+@registry.register("chat_agent")
+def build_chat_agent():
+    # agno's Gemini model has no .chat(); a tool-less agent gives the assistant a .run() interface
+    return instrument_agent(Agent(
+        name="Simple Chatbot",
+        model=routed_model("gemini", "groq"),
+        instructions=[
+            "You are a helpful financial assistant. Answer the user's question directly and concisely.",
+            "Present information clearly. Use tables if appropriate for complex data.",
+            "If the request includes <conversation_summary> or <recent_conversation> blocks, they are the earlier conversation with this user: use them to resolve follow-up questions, but answer only the final question",
+        ],
+        markdown=True,
+    ))
+
+
+@registry.register("summary_agent")
+def build_summary_agent():
+    # Folds old chat exchanges into a session's rolling summary (conversation.py)
+    return instrument_agent(Agent(
+        name="Conversation Summarizer",
+        model=routed_model("gemini", "groq"),
+        instructions=[
+            "You maintain a running summary of a conversation between a user and a financial assistant",
+            "Merge the new exchanges into the existing summary as plain prose without tables",
+            "Keep the tickers, figures, conclusions and user preferences that later questions could refer to; drop pleasantries and formatting",
+        ],
+    ))
@@ -0,0 +1,158 @@
+"""Offline stand-ins for yfinance and DuckDuckGo search.
+
+`install()` swaps `yfinance.Ticker`, `yfinance.download` and the `DDGS` client
+used by agno's DuckDuckGo toolkit for deterministic fakes, so the agents' tools,
+the prefetch step and the indicator engine all run without network access.
+Every fake call sleeps `latency` seconds to stand in for the real round trip.
+"""
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+# Trading days Yahoo returns for each period (a year has ~251, not the 252 used for annualizing)
+PERIOD_BARS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "ytd": 200, "1y": 251, "2y": 503, "5y": 1260, "10y": 2520, "max": 2520}
+
+
+def _seed(symbol: str) -> int:
+    return zlib.crc32(symbol.upper().encode())
+
+
+def fake_history(symbol: str, period: str = "1mo") -> pd.DataFrame:
+    bars = PERIOD_BARS.get(period, 252)
+    rng = np.random.default_rng(_seed(symbol))
+    close = (50 + _seed(symbol) % 400) * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    spread = np.abs(rng.normal(0, 0.01, bars))
+    index = pd.bdate_range(end=pd.Timestamp.now(tz="America/New_York").normalize(), periods=bars, name="Date")
+    return pd.DataFrame(
+        {
+            "Open": close * (1 + rng.normal(0, 0.005, bars)),
+            "High": close * (1 + spread),
+            "Low": close * (1 - spread),
+            "Close": close,
+            "Volume": rng.integers(1_000_000, 50_000_000, bars).astype(float),
+        },
+        index=index,
+    )
+
+
+class FakeTicker:
+    latency = 0.0
+
+    def __init__(self, ticker: str, session=None):
+        time.sleep(self.latency)
+        self.ticker = ticker.upper()
+        self._rng = np.random.default_rng(_seed(self.ticker))
+
+    @property
+    def info(self) -> Dict:
+        price = round(float(fake_history(self.ticker, "5d")["Close"].iloc[-1]), 2)
+        return {
+            "symbol": self.ticker,
+            "shortName": f"{self.ticker} Inc.",
+            "longName": f"{self.ticker} Incorporated",
+            "sector": "Technology",
+            "industry": "Software",
+            "currency": "USD",
+            "regularMarketPrice": price,
+            "currentPrice": price,
+            "marketCap": int(price * 1e9),
+            "trailingPE": round(10 + self._rng.random() * 30, 2),
+            "forwardPE": round(10 + self._rng.random() * 25, 2),
+            "trailingEps": round(price / 25, 2),
+            "dividendYield": round(self._rng.random() * 0.03, 4),
+            "beta": round(0.5 + self._rng.random(), 2),
+            "fiftyTwoWeekHigh": round(price * 1.2, 2),
+            "fiftyTwoWeekLow": round(price * 0.7, 2),
+            "fiftyDayAverage": round(price * 0.98, 2),
+            "twoHundredDayAverage": round(price * 0.95, 2),
+            "targetMeanPrice": round(price * 1.1, 2),
+            "recommendationKey": "buy",
+            "longBusinessSummary": f"{self.ticker} makes products used by many customers.",
+        }
+
+    @property
+    def recommendations(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {"period": ["0m", "-1m", "-2m"], "strongBuy": [8, 7, 7], "buy": [20, 19, 18], "hold": [10, 11, 12], "sell": [1, 1, 2], "strongSell": [0, 0, 1]}
+        )
+
+    @property
+    def financials(self) -> pd.DataFrame:
+        years = [pd.Timestamp(f"{datetime.now().year - i}-12-31") for i in range(1, 4)]
+        revenue = [1e10 * (1.1 ** -i) for i in range(3)]
+        return pd.DataFrame({year: {"Total Revenue": r, "Net Income": r * 0.2, "Gross Profit": r * 0.45} for year, r in zip(years, revenue)})
+
+    income_stmt = financials
+
+    @property
+    def news(self) -> List[Dict]:
+        now = datetime.now(timezone.utc)
+        return [
+            {
+                "id": f"{self.ticker}-{i}",
+                "content": {
+                    "title": f"{self.ticker} headline {i}",
+                    "summary": f"Synthetic news story {i} about {self.ticker}.",
+                    "pubDate": (now - timedelta(hours=3 * i)).isoformat(),
+                    "provider": {"displayName": "Fake Wire"},
+                    "canonicalUrl": {"url": f"https://news.example.com/{self.ticker.lower()}/{i}"},
+                },
+            }
+            for i in range(8)
+        ]
+
+    def history(self, period: str = "1mo", interval: str = "1d", **kwargs) -> pd.DataFrame:
+        return fake_history(self.ticker, period)
+
+
+def fake_download(tickers: Union[str, List[str]], period: str = "1mo", interval: str = "1d", group_by: str = "column", **kwargs) -> pd.DataFrame:
+    time.sleep(FakeTicker.latency)
+    symbols = tickers.split() if isinstance(tickers, str) else list(tickers)
+    frames = {symbol.upper(): fake_history(symbol, period) for symbol in symbols}
+    frame = pd.concat(frames, axis=1)
+    return frame if group_by == "ticker" else frame.swaplevel(axis=1).sort_index(axis=1)
+
+
+class FakeDDGS:
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _results(self, keywords: str, max_results: int, kind: str) -> List[Dict]:
+        time.sleep(self.latency)
+        slug = "-".join(keywords.lower().split())[:60]
+        now = datetime.now(timezone.utc)
+        return [
+            {
+                "title": f"{keywords} - {kind} result {i}",
+                "href": f"https://{kind}.example.com/{slug}/{i}",
+                "url": f"https://{kind}.example.com/{slug}/{i}",
+                "body": f"Synthetic {kind} snippet {i} for '{keywords}'. " * 3,
+                "date": (now - timedelta(hours=i)).isoformat(),
+                "source": "Example",
+            }
+            for i in range(max_results or 5)
+        ]
+
+    def text(self, keywords: str, max_results: int = 5, **kwargs) -> List[Dict]:
+        return self._results(keywords, max_results, "web")
+
+    def news(self, keywords: str, max_results: int = 5, **kwargs) -> List[Dict]:
+        return self._results(keywords, max_results, "news")
+
+
+def install(latency: float = 0.0) -> None:
+    """Replace the yfinance and DuckDuckGo clients for the rest of the process."""
+    import yfinance
+    import agno.tools.duckduckgo
+
+    FakeTicker.latency = latency
+    FakeDDGS.latency = latency
+    yfinance.Ticker = FakeTicker
+    yfinance.download = fake_download
+    agno.tools.duckduckgo.DDGS = FakeDDGS
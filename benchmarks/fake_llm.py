@@ -0,0 +1,372 @@
+"""Local stand-in for the Groq (OpenAI-compatible) and Gemini model APIs.
+
+Serves `POST /openai/v1/chat/completions` (and `/v1/chat/completions`) in the
+OpenAI/Groq format and `POST /v1beta/models/<model>:generateContent` /
+`:streamGenerateContent` in the Gemini format, both streaming and not. Each
+response waits a configurable, jittered time-to-first-token; streamed answers
+then trickle out word by word.
+
+Tool calling is canned: while a conversation that offers tools has had fewer
+than `tool_rounds` tool-call turns, the model calls the first
+`tools_per_round` tools, filling string arguments with the ticker found in the
+prompt. After that it answers with a fixed markdown report, or with a fixed
+JSON report when the system prompt asks for JSON output (REPORT_FORMAT=json).
+
+    python -m benchmarks.fake_llm --port 8090 --latency 0.8 --tool-rounds 1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class FakeLLMConfig:
+    # Seconds before the first token, plus exponentially distributed extra delay with this mean
+    latency: float = 0.5
+    jitter: float = 0.1
+    # Seconds between streamed words
+    token_latency: float = 0.005
+    response_words: int = 300
+    tool_rounds: int = 1
+    tools_per_round: int = 2
+    # Fraction of requests answered with HTTP 500
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+
+TICKER_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]{0,5}(?:\.[A-Z]{1,2})?\b")
+COMPARISON_PATTERN = re.compile(r'<comparison_data symbols="([^"]+)"')
+NOT_TICKERS = {"I", "A", "AI", "API", "JSON", "SMA", "EMA", "RSI", "MACD", "ATR", "CEO", "USD"}
+
+
+def find_ticker(text: str) -> str:
+    for match in TICKER_PATTERN.findall(text):
+        if match not in NOT_TICKERS:
+            return match
+    return "AAPL"
+
+
+def canned_report(ticker: str, words: int) -> str:
+    header = f"## {ticker} Analysis\n\n| Metric | Value |\n|---|---|\n| Price | $123.45 |\n| Consensus | Buy |\n\n"
+    filler = " ".join(f"word{i % 50}" for i in range(max(0, words - len(header.split()))))
+    return header + filler
+
+
+def canned_json_report(ticker: str, words: int) -> str:
+    # Roughly `words` words of output, spread over news items like a real report's
+    news = [
+        {"headline": f"{ticker} headline {i}", "source": "Newswire", "impact": "Neutral", "summary": " ".join(f"word{j % 50}" for j in range(10))}
+        for i in range(max(1, words // 20))
+    ]
+    return json.dumps({
+        "symbol": ticker,
+        "summary": f"{ticker} looks balanced.",
+        "price": {"price": 123.45, "currency": "USD"},
+        "analyst_consensus": {"rating": "Buy"},
+        "news": news,
+        "action_plan": [{"horizon": "Long-term", "recommendation": "Buy"}],
+    })
+
+
+def canned_json_comparison(tickers: List[str], words: int) -> str:
+    metrics = [
+        {"name": f"Metric {i}", "values": {t: f"{i + 1}.{j}" for j, t in enumerate(tickers)}, "leader": tickers[i % len(tickers)]}
+        for i in range(max(1, words // (5 + 2 * len(tickers))))
+    ]
+    return json.dumps({
+        "symbols": tickers,
+        "summary": f"{tickers[0]} leads on most metrics.",
+        "metrics": metrics,
+        "rankings": [{"symbol": t, "recommendation": "Buy" if i == 0 else "Hold", "rationale": f"{t} ranks {i + 1}."} for i, t in enumerate(tickers)],
+        "verdict": f"{tickers[0]} is preferred.",
+    })
+
+
+def fake_arguments(parameters: Dict[str, Any], ticker: str) -> Dict[str, Any]:
+    """Fill a tool's required arguments (and its symbol/query ones) with plausible values."""
+    properties = parameters.get("properties") or {}
+    required = set(parameters.get("required") or [])
+    arguments = {}
+    for name, schema in properties.items():
+        kind = str(schema.get("type", "string")).lower()
+        if name in ("symbol", "symbols", "stock_symbol"):
+            arguments[name] = ticker
+        elif name in ("query", "task_description"):
+            arguments[name] = f"{ticker} latest news"
+        elif name == "expected_output":
+            arguments[name] = "A short report in tables"
+        elif name in required:
+            arguments[name] = {"integer": 3, "number": 1.0, "boolean": False}.get(kind, ticker)
+    return arguments
+
+
+class FakeLLM:
+    """Decides what the fake model says; independent of the wire format."""
+
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            extra = self.random.expovariate(1 / self.config.jitter) if self.config.jitter > 0 else 0.0
+            return self.config.latency + extra
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.config.error_rate
+
+    def reply(self, prompt: str, tools: List[Tuple[str, Dict[str, Any]]], tool_turns: int) -> Tuple[str, List[Tuple[str, Dict[str, Any]]]]:
+        """Return (text, tool calls) for a conversation; exactly one of them is non-empty."""
+        ticker = find_ticker(prompt)
+        if tools and tool_turns < self.config.tool_rounds:
+            chosen = tools[: self.config.tools_per_round]
+            return "", [(name, fake_arguments(parameters, ticker)) for name, parameters in chosen]
+        comparison = COMPARISON_PATTERN.search(prompt)
+        if comparison and "Provide your output as a JSON" in prompt:
+            return canned_json_comparison(comparison.group(1).split(","), self.config.response_words), []
+        if "Provide your output as a JSON" in prompt:
+            return canned_json_report(ticker, self.config.response_words), []
+        return canned_report(ticker, self.config.response_words), []
+
+
+def _words(text: str) -> Iterator[str]:
+    for match in re.finditer(r"\S+\s*", text):
+        yield match.group(0)
+
+
+def _usage(prompt: str, text: str) -> Tuple[int, int]:
+    return len(prompt.split()), max(1, len(text.split()))
+
+
+# --- OpenAI / Groq wire format ---
+
+def openai_parse(body: Dict[str, Any]) -> Tuple[str, List[Tuple[str, Dict[str, Any]]], int]:
+    messages = body.get("messages") or []
+    # User turns first so the ticker is looked up there rather than in the system instructions
+    prompt = "\n".join(str(m.get("content") or "") for role in ("user", "system") for m in messages if m.get("role") == role)
+    tools = [(t["function"]["name"], t["function"].get("parameters") or {}) for t in body.get("tools") or [] if t.get("type") == "function"]
+    tool_turns = sum(1 for m in messages if m.get("role") == "assistant" and m.get("tool_calls"))
+    return prompt, tools, tool_turns
+
+
+def openai_completion(model: str, text: str, calls, usage: Tuple[int, int]) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": "assistant", "content": text or None}
+    if calls:
+        message["tool_calls"] = [
+            {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+            for name, args in calls
+        ]
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if calls else "stop"}],
+        "usage": {"prompt_tokens": usage[0], "completion_tokens": usage[1], "total_tokens": sum(usage)},
+    }
+
+
+def openai_chunks(model: str, text: str, calls, usage: Tuple[int, int]) -> Iterator[Dict[str, Any]]:
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    if calls:
+        delta = {
+            "role": "assistant",
+            "tool_calls": [
+                {"index": i, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+                for i, (name, args) in enumerate(calls)
+            ],
+        }
+        yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+    else:
+        for word in _words(text):
+            yield {**base, "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+    totals = {"prompt_tokens": usage[0], "completion_tokens": usage[1], "total_tokens": sum(usage)}
+    # Groq reports streaming usage under x_groq, OpenAI under usage
+    yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls" if calls else "stop"}], "usage": totals, "x_groq": {"id": base["id"], "usage": totals}}
+
+
+# --- Gemini wire format ---
+
+def gemini_parse(body: Dict[str, Any]) -> Tuple[str, List[Tuple[str, Dict[str, Any]]], int]:
+    contents = body.get("contents") or []
+    texts = [p.get("text", "") for c in contents if c.get("role", "user") == "user" for p in c.get("parts") or []]
+    system = body.get("systemInstruction") or body.get("system_instruction") or {}
+    texts += [p.get("text", "") for p in system.get("parts") or []]
+    tools = [
+        (d["name"], d.get("parameters") or d.get("parametersJsonSchema") or d.get("parameters_json_schema") or {})
+        for t in body.get("tools") or []
+        for d in t.get("functionDeclarations") or t.get("function_declarations") or []
+    ]
+    tool_turns = sum(
+        1 for c in contents if c.get("role") == "model" and any("functionCall" in p or "function_call" in p for p in c.get("parts") or [])
+    )
+    return "\n".join(texts), tools, tool_turns
+
+
+def gemini_response(text: str, calls, usage: Tuple[int, int]) -> Dict[str, Any]:
+    parts = [{"functionCall": {"name": name, "args": args}} for name, args in calls] if calls else [{"text": text}]
+    return {
+        "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": usage[0], "candidatesTokenCount": usage[1], "totalTokenCount": sum(usage)},
+    }
+
+
+def gemini_chunks(text: str, calls, usage: Tuple[int, int]) -> Iterator[Dict[str, Any]]:
+    if calls:
+        yield gemini_response("", calls, usage)
+        return
+    words = list(_words(text))
+    for i, word in enumerate(words):
+        chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": word}]}, "index": 0}]}
+        if i == len(words) - 1:
+            chunk["candidates"][0]["finishReason"] = "STOP"
+            chunk["usageMetadata"] = {"promptTokenCount": usage[0], "candidatesTokenCount": usage[1], "totalTokenCount": sum(usage)}
+        yield chunk
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    llm: FakeLLM
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request, e.g. a hedged duplicate that lost the race
+            pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/chat/completions"):
+            prompt, tools, tool_turns = openai_parse(body)
+            fmt, stream = "openai", bool(body.get("stream"))
+        elif ":generateContent" in path or ":streamGenerateContent" in path:
+            prompt, tools, tool_turns = gemini_parse(body)
+            fmt, stream = "gemini", ":streamGenerateContent" in path
+        else:
+            return self._json(404, {"error": {"message": f"Unknown path {path}"}})
+
+        time.sleep(self.llm.delay())
+        if self.llm.should_fail():
+            return self._json(500, {"error": {"code": 500, "message": "Injected failure", "status": "INTERNAL"}})
+
+        text, calls = self.llm.reply(prompt, tools, tool_turns)
+        usage = _usage(prompt, text)
+        model = body.get("model") or path.rsplit("/", 1)[-1].split(":", 1)[0]
+        if not stream:
+            return self._json(200, openai_completion(model, text, calls, usage) if fmt == "openai" else gemini_response(text, calls, usage))
+        chunks = openai_chunks(model, text, calls, usage) if fmt == "openai" else gemini_chunks(text, calls, usage)
+        self._stream(chunks, done_marker=fmt == "openai")
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, chunks: Iterator[Dict[str, Any]], done_marker: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.llm.config.token_latency)
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        if done_marker:
+            self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeLLMServer:
+    """Runs the fake model API on a background thread; use as a context manager."""
+
+    def __init__(self, config: Optional[FakeLLMConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.llm = FakeLLM(config or FakeLLMConfig())
+        handler = type("Handler", (FakeLLMHandler,), {"llm": self.llm})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def config_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeLLMConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Base time to first token in seconds")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="Mean of the exponential extra delay in seconds")
+    parser.add_argument("--token-latency", type=float, default=defaults.token_latency, help="Delay between streamed words")
+    parser.add_argument("--response-words", type=int, default=defaults.response_words)
+    parser.add_argument("--tool-rounds", type=int, default=defaults.tool_rounds, help="Tool-call turns before answering")
+    parser.add_argument("--tools-per-round", type=int, default=defaults.tools_per_round)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        token_latency=args.token_latency,
+        response_words=args.response_words,
+        tool_rounds=args.tool_rounds,
+        tools_per_round=args.tools_per_round,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    config_arguments(parser)
+    args = parser.parse_args()
+    server = FakeLLMServer(config_from_args(args), args.host, args.port)
+    print(f"Fake model API on {server.url} (GROQ_BASE_URL={server.url} GEMINI_BASE_URL={server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Offline load test for the API in server.py.
+
+Starts the fake model API from `benchmarks.fake_llm`, points the Groq and
+Gemini clients at it, swaps yfinance and DuckDuckGo for the fakes in
+`benchmarks.fake_data`, then serves the real Flask app on a local port and
+drives it with concurrent HTTP clients. Nothing leaves the machine.
+
+For every scenario and concurrency level it reports p50/p95/p99 latency and
+requests per second. `--json` saves the results; `--baseline` compares against
+saved results and exits with status 1 when p95 latency or throughput regress by
+more than `--tolerance`, so it can gate changes in CI.
+
+    python -m benchmarks.load_test --scenarios analyze,chat --concurrency 1,4,16 --requests 40
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks import fake_data
+from benchmarks.fake_llm import FakeLLMServer, config_arguments, config_from_args
+
+POPULAR_SYMBOLS = ["AAPL", "MSFT", "GOOGL", "TSLA"]
+
+
+def configure_environment(model_url: str, args: argparse.Namespace) -> None:
+    """Must run before server.py (and agents.py) are imported: they read these at import time."""
+    cache_dir = tempfile.mkdtemp(prefix="finance-agent-bench-")
+    os.environ.update({
+        "GROQ_API_KEY": "offline",
+        "GOOGLE_API_KEY": "offline",
+        "GROQ_BASE_URL": model_url,
+        "GEMINI_BASE_URL": model_url,
+        "AGNO_TELEMETRY": "false",
+        "NO_PROXY": "127.0.0.1,localhost",
+        "FINANCE_AGENT_CACHE_DIR": cache_dir,
+        "REPORT_CACHE_PATH": os.path.join(cache_dir, "reports.sqlite3"),
+        "ANALYSIS_MODE": args.analysis_mode,
+        "ANALYSIS_WORKERS": str(args.workers),
+        "ANALYSIS_MAX_PENDING": str(max(args.concurrency) * 2),
+        # Background pre-warming would add analyses the benchmark did not ask for
+        "PREWARM": "0",
+        # The fake provider has no quota, and every offered request should reach it
+        "PROVIDER_RPM": "0",
+        # Likewise the fake DuckDuckGo; its real 1/s limit would cap the analyses instead of the server
+        "SEARCH_RATE_PER_SECOND": "100000",
+        "SEARCH_RATE_BURST": "100000",
+        "ADMISSION_MAX_RUNS": str(max(args.concurrency)),
+        "ADMISSION_MAX_QUEUE": str(max(args.concurrency) * 2),
+    })
+    os.environ.pop("TOOL_CACHE_PATH", None)
+
+
+def start_app() -> Tuple[str, Callable[[], None]]:
+    from werkzeug.serving import make_server
+
+    import server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_port}", httpd.shutdown
+
+
+def analyze_request(i: int, cached: bool) -> Tuple[str, str, Dict]:
+    # Unique symbols keep requests from being served by the report cache or coalesced into one job
+    symbol = POPULAR_SYMBOLS[i % len(POPULAR_SYMBOLS)] if cached else f"Z{i:05d}"
+    return "POST", "/analyze", {"stock_symbol": symbol, "analysis_type": "Complete Analysis"}
+
+
+def news_request(i: int, cached: bool) -> Tuple[str, str, Dict]:
+    symbol = POPULAR_SYMBOLS[i % len(POPULAR_SYMBOLS)] if cached else f"N{i:05d}"
+    return "POST", "/analyze", {"stock_symbol": symbol, "analysis_type": "News Impact"}
+
+
+def chat_request(i: int, cached: bool) -> Tuple[str, str, Dict]:
+    if cached:
+        return "POST", "/chat", {"user_question": f"What is the outlook for {POPULAR_SYMBOLS[i % len(POPULAR_SYMBOLS)]}?"}
+    # A different number in every question keeps the chat answer cache from matching it to an earlier one
+    return "POST", "/chat", {"user_question": f"What is the outlook for stock number {i}?"}
+
+
+SCENARIOS = {"analyze": analyze_request, "news": news_request, "chat": chat_request}
+
+
+def run_level(client: httpx.Client, base_url: str, scenario: str, concurrency: int, requests: int, offset: int, cached: bool) -> Dict:
+    build = SCENARIOS[scenario]
+
+    def one(i: int) -> Tuple[float, bool]:
+        method, path, body = build(offset + i, cached)
+        started = time.perf_counter()
+        try:
+            ok = client.request(method, base_url + path, json=body).status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, ok in results if ok])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float("nan"),) * 3
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, ok in results if not ok),
+        "rps": round(len(latencies) / elapsed, 3),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "mean": round(float(latencies.mean()), 4) if len(latencies) else float("nan"),
+    }
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"{'scenario':<10}{'conc':>6}{'reqs':>6}{'errors':>8}{'req/s':>10}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+    for r in results:
+        print(f"{r['scenario']:<10}{r['concurrency']:>6}{r['requests']:>6}{r['errors']:>8}{r['rps']:>10.2f}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['p99']:>10.3f}")
+
+
+def regressions(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    problems = []
+    for r in results:
+        before = previous.get((r["scenario"], r["concurrency"]))
+        if before is None:
+            continue
+        label = f"{r['scenario']} @ {r['concurrency']}"
+        if r["p95"] > before["p95"] * (1 + tolerance):
+            problems.append(f"{label}: p95 {r['p95']:.3f}s vs baseline {before['p95']:.3f}s")
+        if r["rps"] < before["rps"] * (1 - tolerance):
+            problems.append(f"{label}: {r['rps']:.2f} req/s vs baseline {before['rps']:.2f} req/s")
+        if r["errors"] > before["errors"]:
+            problems.append(f"{label}: {r['errors']} errors vs baseline {before['errors']}")
+    return problems
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default="analyze,chat", help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario and concurrency level")
+    parser.add_argument("--cached", action="store_true", help="Reuse a few popular symbols so analyses hit the report cache")
+    parser.add_argument("--analysis-mode", choices=["parallel", "team"], default="parallel")
+    parser.add_argument("--workers", type=int, default=4, help="ANALYSIS_WORKERS for the server's job pool")
+    parser.add_argument("--data-latency", type=float, default=0.05, help="Simulated yfinance/DuckDuckGo round trip in seconds")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against the baseline")
+    config_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with FakeLLMServer(config_from_args(args)) as model_server:
+        configure_environment(model_server.url, args)
+        fake_data.install(latency=args.data_latency)
+        base_url, stop_app = start_app()
+        results = []
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        with httpx.Client(timeout=600, limits=limits, trust_env=False) as client:
+            offset = 0
+            for scenario in scenarios:
+                for concurrency in args.concurrency:
+                    results.append(run_level(client, base_url, scenario, concurrency, args.requests, offset, args.cached))
+                    offset += args.requests
+        stop_app()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")}, "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(results, json.load(f)["results"], args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
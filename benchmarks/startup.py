@@ -0,0 +1,183 @@
+"""Startup-time report and cold-start budget for the API servers.
+
+Prints what importing server.py costs per package and module (from
+`python -X importtime`), and fails if startup imports any of the libraries
+that are meant to load on first use (provider SDKs, yfinance, pandas,
+duckduckgo-search). Then it measures cold starts:
+
+- `python server.py`: from launching the process until /health answers;
+- `python serve.py --workers N`: until /health answers, and for each worker
+  the time from its fork until it serves, from the workers' log lines.
+
+Exits with status 1 when a median exceeds its budget, so it can gate changes
+in CI. No model API is contacted; placeholder keys are used if none are set.
+
+    python -m benchmarks.startup --runs 5 --workers 4
+"""
+import argparse
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use; importing any of them at startup is a regression
+LAZY_MODULES = ("google.genai", "groq", "yfinance", "pandas", "duckduckgo_search", "agno.models.google", "agno.models.groq", "toolkits")
+READY_LINE = re.compile(r"Worker (\d+) serving on .* \(([\d.]+)s after start\)")
+
+
+def environment() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "offline")
+    env.setdefault("GOOGLE_API_KEY", "offline")
+    env.update({
+        "FINANCE_AGENT_CACHE_DIR": tempfile.mkdtemp(prefix="finance-agent-startup-"),
+        "PREWARM": "0",
+        "AGNO_TELEMETRY": "false",
+        "NO_PROXY": "127.0.0.1,localhost",
+    })
+    return env
+
+
+def import_times(module: str, env: Dict[str, str]) -> List[Tuple[str, int, int]]:
+    """(module, self microseconds, cumulative microseconds) for every module imported by `import module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report_imports(module: str, env: Dict[str, str], top: int) -> List[str]:
+    """Print the import report for `module` and return the lazy modules it imported."""
+    rows = import_times(module, env)
+    total = next(cumulative for name, _, cumulative in reversed(rows) if name == module)
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"import {module}: {total / 1e6:.3f}s, {len(rows)} modules\n")
+    print(f"{'package':<28}{'self':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{package:<28}{self_us / 1e6:>9.3f}s{self_us / total:>8.0%}")
+    print(f"\n{'module':<40}{'cumulative':>12}")
+    for name, _, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"{name:<40}{cumulative / 1e6:>11.3f}s")
+    print()
+    names = {name for name, _, _ in rows}
+    return [lazy for lazy in LAZY_MODULES if lazy in names]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(process: subprocess.Popen, port: int, timeout: float) -> float:
+    deadline = time.perf_counter() + timeout
+    with httpx.Client(timeout=1, trust_env=False) as client:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                if client.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                    return time.perf_counter()
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+    raise TimeoutError(f"No answer from /health within {timeout:g}s")
+
+
+def cold_start(command: List[str], port: int, env: Dict[str, str], workers: int = 0, timeout: float = 60) -> Tuple[float, List[float]]:
+    """Seconds from launch until /health answers, and each worker's seconds from fork until serving."""
+    log = tempfile.TemporaryFile(mode="w+")
+    started = time.perf_counter()
+    # A session of its own: serve.py forwards shutdown signals to its whole process group
+    process = subprocess.Popen(
+        command, cwd=ROOT, env={**env, "PORT": str(port)}, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+    )
+    try:
+        healthy = wait_healthy(process, port, timeout) - started
+        forks: Dict[str, float] = {}
+        deadline = time.perf_counter() + timeout
+        while len(forks) < workers and time.perf_counter() < deadline:
+            log.seek(0)
+            forks = {pid: float(seconds) for pid, seconds in READY_LINE.findall(log.read())}
+            time.sleep(0.05)
+        return healthy, list(forks.values())
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+
+
+def median(values: List[float]) -> Optional[float]:
+    return statistics.median(values) if values else None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per server, reported as the median")
+    parser.add_argument("--workers", type=int, default=2, help="Workers for the serve.py cold start")
+    parser.add_argument("--top", type=int, default=15, help="Rows in the import report")
+    parser.add_argument("--imports-only", action="store_true", help="Only print the import report")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds until `python server.py` is healthy")
+    parser.add_argument("--serve-budget", type=float, default=3.0, help="Seconds until `python serve.py --workers N` is healthy")
+    parser.add_argument("--fork-budget", type=float, default=0.25, help="Seconds from a worker's fork until it serves")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    env = environment()
+    problems = [f"startup imports {lazy}, which should load on first use" for lazy in report_imports("server", env, args.top)]
+    if args.imports_only:
+        for problem in problems:
+            print(f"OVER BUDGET {problem}")
+        sys.exit(1 if problems else 0)
+
+    server_starts, serve_starts, forks = [], [], []
+    for _ in range(args.runs):
+        server_starts.append(cold_start([sys.executable, "server.py"], free_port(), env)[0])
+        healthy, ready = cold_start([sys.executable, "serve.py", "--workers", str(args.workers)], free_port(), env, args.workers)
+        serve_starts.append(healthy)
+        forks.extend(ready)
+
+    results = [
+        ("python server.py until healthy", median(server_starts), args.budget),
+        (f"python serve.py --workers {args.workers} until healthy", median(serve_starts), args.serve_budget),
+        ("worker fork until serving", median(forks), args.fork_budget),
+    ]
+    print(f"{'cold start':<44}{'median':>10}{'budget':>10}")
+    for name, value, budget in results:
+        shown = f"{value:.3f}s" if value is not None else "-"
+        print(f"{name:<44}{shown:>10}{budget:>9.2f}s")
+        if value is None or value > budget:
+            problems.append(f"{name}: {shown} (budget {budget:.2f}s)")
+    for problem in problems:
+        print(f"OVER BUDGET {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
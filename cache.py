@@ -0,0 +1,191 @@
+"""Small caching primitives shared by the report, tool and chat caches.
+
+`LRUCache` is a thread-safe, size-bounded in-process cache and `SQLiteStore`
+is a persistent key/value store. Entries carry the time they were created so
+callers can decide freshness with a TTL that is evaluated at read time.
+`offload` runs such blocking calls from async code without stalling its event loop.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+DEFAULT_CACHE_DIR = os.environ.get("FINANCE_AGENT_CACHE_DIR", ".cache")
+
+T = TypeVar("T")
+
+
+async def offload(fn: Callable[..., T], *args: Any) -> T:
+    """Await a blocking call, such as a SQLite write waiting out another process's lock, on the loop's default executor.
+
+    The call runs in a copy of the caller's context, so trace spans and annotations still reach the request.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, fn, *args)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    created_at: float
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.created_at)
+
+
+class LRUCache:
+    """In-process LRU cache with an optional per-read TTL."""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if ttl is not None and entry.age > ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: Any, created_at: Optional[float] = None) -> CacheEntry:
+        entry = CacheEntry(value=value, created_at=created_at if created_at is not None else time.time())
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return entry
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """Persistent JSON key/value store backed by a single SQLite table."""
+
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps the store safe to share across threads
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[CacheEntry]:
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(value=json.loads(row[0]), created_at=row[1])
+        if ttl is not None and entry.age > ttl:
+            return None
+        return entry
+
+    def set(self, key: str, value: Any, created_at: Optional[float] = None) -> CacheEntry:
+        entry = CacheEntry(value=value, created_at=created_at if created_at is not None else time.time())
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), entry.created_at),
+            )
+        return entry
+
+    def update(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> CacheEntry:
+        """Replace the value under `key` with `fn(current value or None)` in one write transaction.
+
+        Concurrent updates (from other threads or processes) are serialized, so none is lost.
+        If `fn` returns None the key is left absent.
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                entry = CacheEntry(value=fn(json.loads(row[0]) if row else None), created_at=time.time())
+                if entry.value is None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                else:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(entry.value), entry.created_at),
+                    )
+        finally:
+            conn.close()
+        return entry
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def items(self) -> List[Tuple[str, CacheEntry]]:
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT key, value, created_at FROM {self.table}").fetchall()
+        return [(key, CacheEntry(value=json.loads(value), created_at=created_at)) for key, value, created_at in rows]
+
+    def purge(self, older_than: float) -> int:
+        """Delete entries older than `older_than` seconds and return how many were removed."""
+        with self._connect() as conn:
+            cursor = conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - older_than,))
+            return cursor.rowcount
+
+
+class TieredCache:
+    """An `LRUCache` in front of an optional `SQLiteStore`.
+
+    Reads check memory first and promote disk hits into memory; writes go to both.
+    """
+
+    def __init__(self, memory: LRUCache, store: Optional[SQLiteStore] = None):
+        self.memory = memory
+        self.store = store
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[CacheEntry]:
+        entry = self.memory.get(key, ttl)
+        if entry is not None:
+            return entry
+        if self.store is None:
+            return None
+        entry = self.store.get(key, ttl)
+        if entry is not None:
+            self.memory.set(key, entry.value, created_at=entry.created_at)
+        return entry
+
+    def set(self, key: str, value: Any) -> CacheEntry:
+        entry = self.memory.set(key, value)
+        if self.store is not None:
+            self.store.set(key, value, created_at=entry.created_at)
+        return entry
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.store is not None:
+            self.store.delete(key)
@@ -0,0 +1,115 @@
+"""Caching for the results of the agno toolkits used by the agents.
+
+Every tool result is cached under (tool name, canonicalized arguments) with a
+TTL chosen per tool, because the data behind them changes at very different
+rates: prices move by the second, fundamentals daily, analyst ratings rarely.
+The cache is process-wide so fresh agent instances still share it. The cached
+toolkits themselves are in toolkits.py.
+"""
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+from cache import LRUCache, SQLiteStore, TieredCache
+from tracing import CACHE_RESULTS, annotate
+
+# TTLs in seconds per YFinanceTools function
+YFINANCE_TTLS = {
+    "get_current_stock_price": 30,
+    "get_company_info": 24 * 3600,
+    "get_stock_fundamentals": 24 * 3600,
+    "get_income_statements": 24 * 3600,
+    "get_key_financial_ratios": 24 * 3600,
+    "get_analyst_recommendations": 12 * 3600,
+    "get_company_news": 15 * 60,
+    "get_technical_indicators": 15 * 60,
+    "get_historical_stock_prices": 15 * 60,
+}
+
+# Search results go stale quickly, but identical queries within a report burst are common
+SEARCH_TTL = int(os.environ.get("SEARCH_CACHE_TTL", 10 * 60))
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", 5))
+SEARCH_BODY_CHARS = 400
+
+# Tool outputs that report a failure rather than data, which must never be cached
+ERROR_PREFIXES = ("Error", "Could not")
+
+
+class ToolCache:
+    """Tiered cache for tool results with per-tool hit/miss counters."""
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None):
+        store = SQLiteStore(path, table="tool_results") if path else None
+        self._cache = TieredCache(LRUCache(max_entries), store)
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool: str, args: Dict[str, Any]) -> str:
+        return f"{tool}:{json.dumps(args, sort_keys=True, default=str)}"
+
+    def get_or_call(self, tool: str, args: Dict[str, Any], ttl: float, fn: Callable[[], str]) -> str:
+        key = self.key(tool, args)
+        entry = self._cache.get(key, ttl=ttl)
+        outcome = "hit" if entry is not None else "miss"
+        with self._lock:
+            (self.hits if entry is not None else self.misses)[tool] += 1
+        CACHE_RESULTS.inc(cache="tool", kind=tool, outcome=outcome)
+        annotate(cache=outcome)
+        if entry is not None:
+            return entry.value
+        result = fn()
+        if isinstance(result, str) and not result.startswith(ERROR_PREFIXES):
+            self._cache.set(key, result)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {tool: {"hits": self.hits[tool], "misses": self.misses[tool]} for tool in set(self.hits) | set(self.misses)}
+
+
+_tool_cache: Optional[ToolCache] = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolCache:
+    """Process-wide tool cache; set TOOL_CACHE_PATH to also persist results in SQLite."""
+    global _tool_cache
+    if _tool_cache is None:
+        with _tool_cache_lock:
+            if _tool_cache is None:
+                _tool_cache = ToolCache(
+                    max_entries=int(os.environ.get("TOOL_CACHE_MAX_ENTRIES", 1024)),
+                    path=os.environ.get("TOOL_CACHE_PATH"),
+                )
+    return _tool_cache
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _normalize_url(url: str) -> str:
+    return url.split("#", 1)[0].rstrip("/").lower()
+
+
+def compact_search_results(raw: str, limit: int) -> str:
+    """De-duplicate results by URL, cap their number and trim long snippets."""
+    results = json.loads(raw)
+    seen = set()
+    compacted = []
+    for result in results:
+        url = result.get("href") or result.get("url") or ""
+        key = _normalize_url(url) if url else result.get("title")
+        if key in seen:
+            continue
+        seen.add(key)
+        if isinstance(result.get("body"), str) and len(result["body"]) > SEARCH_BODY_CHARS:
+            result["body"] = result["body"][:SEARCH_BODY_CHARS].rstrip() + "..."
+        compacted.append(result)
+        if len(compacted) >= limit:
+            break
+    return json.dumps(compacted)
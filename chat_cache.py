@@ -0,0 +1,221 @@
+"""Answer cache for the chat assistant with near-duplicate question matching.
+
+Questions are normalized (case, punctuation, filler words) and looked up exactly
+first. Question words, modals and negations are kept: "why should I buy AAPL"
+and "when should I buy AAPL" are different questions. Otherwise they are compared against every cached question with cosine
+similarity over TF-IDF weighted character n-grams, hashed into a fixed number
+of features so the whole index is one small numpy matrix and a lookup is a
+single matrix-vector product. A cached answer is reused when the best match
+clears the similarity threshold, mentions the same tickers and numbers
+("outlook for AAPL" must never answer "outlook for MSFT") and uses the same
+question words and negations.
+"""
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional
+
+import numpy as np
+
+from tracing import CACHE_RESULTS, annotate
+
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", 6 * 3600))
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", 512))
+CHAT_CACHE_THRESHOLD = float(os.environ.get("CHAT_CACHE_THRESHOLD", 0.85))
+
+NGRAM_SIZES = (3, 4, 5)
+N_FEATURES = 4096
+
+# Filler that changes how a question is phrased but not what it asks
+STOPWORDS = frozenset(
+    "a an the is are was were be i me my we our you your it its this that these those of to in on for at by with "
+    "about from into as and or so please tell give show explain some any there here".split()
+)
+# Words that change what is asked ("why should I" is not "when should I", "not" flips the question);
+# they stay in the normalized question and two questions must use the same ones to share an answer
+QUESTION_WORDS = frozenset("what which who whom whose when where why how".split())
+MODALS = frozenset("do does did can could would should will shall may might must".split())
+NEGATIONS = frozenset("not no never nor".split())
+QUALIFIERS = QUESTION_WORDS | MODALS | NEGATIONS
+
+_NON_WORD = re.compile(r"[^\w$%.]+|(?<!\d)\.|\.(?!\d)")
+_ENTITY = re.compile(r"\b(?:[A-Z]{2,5}(?:\.[A-Z]{1,2})?|\$?\d[\d,.]*%?)\b")
+# "don't" -> "do not", "can't"/"cannot" -> "can not", "won't" -> "will not"
+_CONTRACTIONS = ((re.compile(r"\bwon't\b"), "will not"), (re.compile(r"\bcan't\b|\bcannot\b"), "can not"), (re.compile(r"n't\b"), " not"))
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).lower().replace("\u2019", "'")
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    # "what's" -> "what", "Apple's" -> "apple"
+    text = re.sub(r"'s\b", "", text).replace("'", "")
+    words = _NON_WORD.sub(" ", text).split()
+    # Keep a question made only of filler words as it is rather than reducing it to nothing
+    return " ".join(word for word in words if word not in STOPWORDS) or " ".join(words)
+
+
+def question_qualifiers(normalized: str) -> FrozenSet[str]:
+    """Question words, modals and negations in a normalized question; a cached answer must agree on them exactly."""
+    return frozenset(word for word in normalized.split() if word in QUALIFIERS)
+
+
+def question_entities(question: str) -> FrozenSet[str]:
+    """Tickers and numbers in the question; near-duplicates must agree on them exactly."""
+    return frozenset(match.upper().lstrip("$").replace(",", "") for match in _ENTITY.findall(question))
+
+
+def _ngram_counts(normalized: str) -> Dict[int, float]:
+    counts: Counter = Counter()
+    for word in normalized.split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(max(1, len(padded) - n + 1)):
+                counts[zlib.crc32(padded[i:i + n].encode()) % N_FEATURES] += 1
+    # Sublinear term frequency, as repeated n-grams say little about meaning
+    return {feature: 1 + math.log(count) for feature, count in counts.items()}
+
+
+@dataclass
+class ChatAnswer:
+    question: str
+    answer: str
+    created_at: float
+    similarity: float = 1.0
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.created_at)
+
+
+@dataclass
+class _Entry:
+    question: str
+    answer: str
+    created_at: float
+    row: int
+    entities: FrozenSet[str]
+    qualifiers: FrozenSet[str]
+
+
+class ChatAnswerCache:
+    """Size-bounded, TTL-expiring LRU of chat answers with a near-duplicate index."""
+
+    def __init__(self, max_entries: int = CHAT_CACHE_SIZE, ttl: float = CHAT_CACHE_TTL, threshold: float = CHAT_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Term frequencies per cache slot, document frequencies per feature, and the idf-weighted,
+        # L2-normalized rows that lookups multiply against (rebuilt lazily after writes)
+        self._tf = np.zeros((max_entries, N_FEATURES), dtype=np.float32)
+        self._df = np.zeros(N_FEATURES, dtype=np.int32)
+        self._weights: Optional[np.ndarray] = None
+        self._free_rows = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = self.near_hits = self.misses = 0
+
+    def get(self, question: str) -> Optional[ChatAnswer]:
+        normalized = normalize_question(question)
+        with self._lock:
+            self._expire()
+            match = self._lookup(normalized, question_entities(question))
+            outcome = "miss" if match is None else "hit" if match.similarity >= 1.0 else "near_hit"
+            if match is None:
+                self.misses += 1
+            elif outcome == "hit":
+                self.hits += 1
+            else:
+                self.near_hits += 1
+        CACHE_RESULTS.inc(cache="chat", kind="question", outcome=outcome)
+        annotate(chat_cache=outcome)
+        return match
+
+    def _lookup(self, normalized: str, entities: FrozenSet[str]) -> Optional[ChatAnswer]:
+        qualifiers = question_qualifiers(normalized)
+        entry = self._entries.get(normalized)
+        if entry is not None and entry.entities == entities and entry.qualifiers == qualifiers:
+            self._entries.move_to_end(normalized)
+            return ChatAnswer(entry.question, entry.answer, entry.created_at)
+        if not self._entries:
+            return None
+
+        if self._weights is None:
+            self._weights = self._weighted(self._tf)
+        query = np.zeros((1, N_FEATURES), dtype=np.float32)
+        for feature, weight in _ngram_counts(normalized).items():
+            query[0, feature] = weight
+        similarities = self._weights @ self._weighted(query)[0]
+
+        rows = {entry.row: key for key, entry in self._entries.items()}
+        for row in np.argsort(similarities)[::-1][:5]:
+            if similarities[row] < self.threshold:
+                break
+            key = rows.get(int(row))
+            if key is not None and self._entries[key].entities == entities and self._entries[key].qualifiers == qualifiers:
+                entry = self._entries[key]
+                self._entries.move_to_end(key)
+                return ChatAnswer(entry.question, entry.answer, entry.created_at, round(float(similarities[row]), 4))
+        return None
+
+    def _weighted(self, tf: np.ndarray) -> np.ndarray:
+        # Smoothed idf over the cached questions, as in scikit-learn's TfidfVectorizer
+        idf = np.log((1 + len(self._entries)) / (1 + self._df)) + 1
+        weighted = tf * idf.astype(np.float32)
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        return np.divide(weighted, norms, out=np.zeros_like(weighted), where=norms > 0)
+
+    def set(self, question: str, answer: str) -> None:
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        with self._lock:
+            if normalized in self._entries:
+                self._remove(normalized)
+            elif not self._free_rows:
+                self._remove(next(iter(self._entries)))
+            row = self._free_rows.pop()
+            for feature, weight in _ngram_counts(normalized).items():
+                self._tf[row, feature] = weight
+            self._df += self._tf[row] > 0
+            self._entries[normalized] = _Entry(
+                question, answer, time.time(), row, question_entities(question), question_qualifiers(normalized),
+            )
+            self._weights = None
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._df -= self._tf[entry.row] > 0
+        self._tf[entry.row] = 0
+        self._free_rows.append(entry.row)
+        self._weights = None
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        # Entries are kept in use order, so check them all rather than stopping at the first fresh one
+        for key in [key for key, entry in self._entries.items() if entry.created_at < cutoff]:
+            self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "near_hits": self.near_hits, "misses": self.misses}
+
+
+_chat_cache: Optional[ChatAnswerCache] = None
+_chat_cache_lock = threading.Lock()
+
+
+def get_chat_cache() -> ChatAnswerCache:
+    """Process-wide chat answer cache (see CHAT_CACHE_TTL, CHAT_CACHE_SIZE and CHAT_CACHE_THRESHOLD)."""
+    global _chat_cache
+    if _chat_cache is None:
+        with _chat_cache_lock:
+            if _chat_cache is None:
+                _chat_cache = ChatAnswerCache()
+    return _chat_cache
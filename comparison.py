@@ -0,0 +1,154 @@
+"""Multi-ticker comparison in a single agent run.
+
+Comparing AAPL, MSFT and GOOGL used to take three full analyses, each with
+its own tool calls and model round trips, and the reader still had to line
+the reports up by hand. The Comparison analysis type instead takes several
+tickers as one "symbol", for example "AAPL,GOOGL,MSFT". Its data is gathered
+up front:
+
+- one batched `yf.download` for the price history of all tickers, from which
+  returns, volatility and the technical indicators are computed with NumPy;
+- each ticker's key fundamentals, fetched concurrently and cached for a day
+  (screener.py).
+
+The data goes into the prompt as one side-by-side table. A single agent with
+no tools turns it into one `ComparisonReport`.
+"""
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from indicators import latest_indicators
+from report_cache import canonical_symbol
+from screener import SCREEN_PERIOD, compute_metrics, download_bars, fundamentals
+from tracing import span
+
+COMPARISON_MIN_TICKERS = 2
+COMPARISON_MAX_TICKERS = int(os.environ.get("COMPARISON_MAX_TICKERS", 6))
+# Long enough for every metric the screener computes, the 12-1 month return included
+COMPARISON_PERIOD = os.environ.get("COMPARISON_PERIOD", SCREEN_PERIOD)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="comparison")
+
+
+def comparison_symbols(value: Union[str, List[str]]) -> List[str]:
+    """Tickers from a list or a string such as "AAPL, MSFT vs GOOGL", deduplicated and sorted.
+
+    Sorted so that the same set of tickers always makes the same report cache key.
+    """
+    parts = value if isinstance(value, list) else re.split(r"[\s,;]+|\bvs\.?\b", str(value), flags=re.IGNORECASE)
+    return sorted({canonical_symbol(p) for p in parts if isinstance(p, str) and p.strip()})
+
+
+def comparison_key(value: Union[str, List[str]]) -> str:
+    """The "symbol" a comparison is run and cached under, e.g. "AAPL,GOOGL,MSFT"."""
+    return ",".join(comparison_symbols(value))
+
+
+def validate_comparison(value: Union[str, List[str]]) -> Optional[str]:
+    """An error message if `value` does not name an acceptable number of tickers."""
+    count = len(comparison_symbols(value))
+    if count < COMPARISON_MIN_TICKERS:
+        return f"A comparison needs at least {COMPARISON_MIN_TICKERS} different tickers"
+    if count > COMPARISON_MAX_TICKERS:
+        return f"Too many tickers to compare: {count} (max {COMPARISON_MAX_TICKERS})"
+    return None
+
+
+def comparison_data(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Price, return, risk, valuation and indicator data per ticker, for all of them at once."""
+    with span("comparison_data", "prefetch", tickers=len(symbols)):
+        # The fundamentals lookups overlap the price download
+        funds_future = _executor.submit(fundamentals, symbols)
+        bars = download_bars(symbols, COMPARISON_PERIOD)
+        funds = funds_future.result()
+        metrics = compute_metrics(bars, funds)
+        indicators = latest_indicators(symbols, bars)
+    data = {}
+    for i, symbol in enumerate(symbols):
+        data[symbol] = {
+            "fundamentals": funds[i],
+            "metrics": {name: None if np.isnan(values[i]) else float(values[i]) for name, values in metrics.items()},
+            **indicators[symbol],
+        }
+    return data
+
+
+def _percent(value: Optional[float]) -> Optional[str]:
+    return f"{value:+.1%}" if value is not None else None
+
+
+def _ratio(value: Any) -> Optional[str]:
+    return f"{value:.2f}" if isinstance(value, (int, float)) else None
+
+
+def _large(value: Any) -> Optional[str]:
+    if not isinstance(value, (int, float)):
+        return None
+    for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= threshold:
+            return f"{value / threshold:.2f}{suffix}"
+    return f"{value:,.0f}"
+
+
+def _rows(entry: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    f, m, ind, sig = entry["fundamentals"], entry["metrics"], entry["indicators"], entry["signals"]
+    close, target = m["close"], f.get("targetMeanPrice")
+    margin, growth, dividend = f.get("profitMargins"), f.get("revenueGrowth"), f.get("dividendYield")
+    return {
+        "Name": f.get("shortName"),
+        "Sector": f.get("sector"),
+        "Price": f"{close:.2f} {f.get('currency') or 'USD'}" if close is not None else None,
+        "1M return": _percent(m["return_1m"]),
+        "3M return": _percent(m["return_3m"]),
+        "12M return (ex last month)": _percent(m["return_12m_1m"]),
+        "Price vs SMA 50": _percent(m["above_sma_50"]),
+        "Volatility (annualized)": f"{m['volatility']:.1%}" if m["volatility"] is not None else None,
+        "Volume vs 20-day average": f"{m['volume_ratio']:.2f}x" if m["volume_ratio"] is not None else None,
+        "Market cap": _large(f.get("marketCap")),
+        "P/E": _ratio(f.get("trailingPE")),
+        "Forward P/E": _ratio(f.get("forwardPE")),
+        "Price/Book": _ratio(f.get("priceToBook")),
+        "EPS": _ratio(f.get("trailingEps")),
+        "Dividend yield": f"{dividend:.2%}" if isinstance(dividend, (int, float)) else None,
+        "Profit margin": f"{margin:.1%}" if isinstance(margin, (int, float)) else None,
+        "Revenue growth": _percent(growth) if isinstance(growth, (int, float)) else None,
+        "Beta": _ratio(f.get("beta")),
+        "Analyst target (mean)": _ratio(target),
+        "Upside to target": _percent(target / close - 1) if isinstance(target, (int, float)) and close else None,
+        "Analyst consensus": f.get("recommendationKey"),
+        "RSI 14": _ratio(ind.get("rsi_14")),
+        "MACD signal": sig.get("macd"),
+        "Trend (SMA 50/200)": sig.get("trend"),
+        "Bollinger": sig.get("bollinger"),
+    }
+
+
+def format_comparison_context(symbols: List[str], data: Dict[str, Dict[str, Any]]) -> str:
+    """All tickers' data as one table, a column per ticker; rows no ticker has data for are left out."""
+    rows = {symbol: _rows(data[symbol]) for symbol in symbols}
+    lines = ["| Metric | " + " | ".join(symbols) + " |", "|---|" + "---|" * len(symbols)]
+    for name in rows[symbols[0]]:
+        values = [rows[symbol][name] for symbol in symbols]
+        if any(value is not None for value in values):
+            lines.append(f"| {name} | " + " | ".join(value or "-" for value in values) + " |")
+    table = "\n".join(lines)
+    return f'<comparison_data symbols="{",".join(symbols)}" source="Yahoo Finance">\n{table}\n</comparison_data>'
+
+
+def comparison_context(stock_symbol: str, extra: Optional[str] = None) -> str:
+    """The prompt context for a comparison of the tickers in `stock_symbol` (a comparison key)."""
+    symbols = comparison_symbols(stock_symbol)
+    parts = [format_comparison_context(symbols, comparison_data(symbols))]
+    if extra:
+        parts.append(extra)
+    return "\n\n".join(parts)
+
+
+async def acomparison_context(stock_symbol: str, extra: Optional[str] = None) -> str:
+    """Async `comparison_context`: the fetches run on a worker thread, so the event loop is not blocked."""
+    return await asyncio.get_running_loop().run_in_executor(None, comparison_context, stock_symbol, extra)
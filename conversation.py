@@ -0,0 +1,209 @@
+"""Bounded conversation memory for the chat assistant.
+
+Each session keeps its most recent exchanges verbatim plus a rolling summary
+of everything older, all under a fixed token budget, so the context sent with
+every question stays the same size however long the conversation runs.
+Once the recent exchanges outgrow their share of the budget, the oldest ones
+are folded into the summary by a small summarizer agent in the background,
+off the request path. Until that finishes they are simply left out of the
+prompt, which therefore never exceeds the budget.
+
+Sessions live in SQLite so every server worker process sees the same
+conversation, and expire after CHAT_SESSION_TTL seconds without activity.
+"""
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import DEFAULT_CACHE_DIR, SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Token budgets are estimated at ~4 characters per token
+CHAT_MEMORY_TOKENS = int(os.environ.get("CHAT_MEMORY_TOKENS", 2000))
+CHAT_SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", 500))
+# Longer answers (reports full of tables) are clipped before they are remembered
+CHAT_TURN_TOKENS = int(os.environ.get("CHAT_TURN_TOKENS", 400))
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", 24 * 3600))
+
+# Expired sessions are deleted from the store every this many recorded exchanges
+PURGE_EVERY = 200
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def clip(text: str, tokens: int) -> str:
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _exchange_tokens(exchange: Dict[str, str]) -> int:
+    return estimate_tokens(exchange["user"]) + estimate_tokens(exchange["assistant"])
+
+
+def _format_exchanges(exchanges: List[Dict[str, str]]) -> str:
+    return "\n".join(f"User: {e['user']}\nAssistant: {e['assistant']}" for e in exchanges)
+
+
+def summarize_with_agent(summary: str, exchanges: List[Dict[str, str]], max_tokens: int) -> str:
+    from agents import new_agent
+
+    prompt = (
+        f"<summary>\n{summary or '(empty)'}\n</summary>\n<new_exchanges>\n{_format_exchanges(exchanges)}\n</new_exchanges>\n\n"
+        f"Update the summary with the new exchanges in at most {max_tokens * 3 // 4} words."
+    )
+    return new_agent("summary_agent").run(prompt).content
+
+
+class ConversationMemory:
+    """Per-session sliding window of recent exchanges plus a rolling summary of older ones.
+
+    A session is stored as {"summary", "exchanges", "folded"} where "folded"
+    counts the exchanges already merged into the summary; it lets a background
+    fold detect that another one got there first.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        summarize: Callable[[str, List[Dict[str, str]], int], str] = summarize_with_agent,
+        budget: int = CHAT_MEMORY_TOKENS,
+        summary_budget: int = CHAT_SUMMARY_TOKENS,
+        turn_budget: int = CHAT_TURN_TOKENS,
+        session_ttl: float = CHAT_SESSION_TTL,
+    ):
+        path = path or os.environ.get("CONVERSATION_STORE_PATH", os.path.join(DEFAULT_CACHE_DIR, "conversations.sqlite3"))
+        self._store = SQLiteStore(path, table="conversations")
+        self._summarize = summarize
+        self.summary_budget = summary_budget
+        self.recent_budget = budget - summary_budget
+        self.turn_budget = turn_budget
+        self.session_ttl = session_ttl
+        self._folding: set = set()
+        self._records = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarize")
+
+    def _load(self, session_id: str) -> Dict[str, Any]:
+        entry = self._store.get(session_id, ttl=self.session_ttl)
+        return entry.value if entry is not None else {"summary": "", "exchanges": [], "folded": 0}
+
+    def has_context(self, session_id: Optional[str]) -> bool:
+        if not session_id:
+            return False
+        session = self._load(session_id)
+        return bool(session["summary"] or session["exchanges"])
+
+    def context(self, session_id: Optional[str]) -> Optional[str]:
+        """The session's summary and as many recent exchanges as fit the budget, as prompt blocks."""
+        if not session_id:
+            return None
+        session = self._load(session_id)
+        recent, used = [], 0
+        for exchange in reversed(session["exchanges"]):
+            used += _exchange_tokens(exchange)
+            if used > self.recent_budget:
+                break
+            recent.insert(0, exchange)
+        blocks = []
+        if session["summary"]:
+            blocks.append(f"<conversation_summary>\n{session['summary']}\n</conversation_summary>")
+        if recent:
+            blocks.append(f"<recent_conversation>\n{_format_exchanges(recent)}\n</recent_conversation>")
+        return "\n".join(blocks) or None
+
+    def prompt(self, session_id: Optional[str], question: str) -> str:
+        context = self.context(session_id)
+        return f"{context}\n\n{question}" if context else question
+
+    def record(self, session_id: Optional[str], question: str, answer: str) -> None:
+        """Append an exchange and, if the window is now over budget, fold the oldest ones into the summary."""
+        if not session_id:
+            return
+        exchange = {"user": clip(question, self.turn_budget), "assistant": clip(answer, self.turn_budget)}
+
+        def append(session: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            session = session or {"summary": "", "exchanges": [], "folded": 0}
+            session["exchanges"].append(exchange)
+            return session
+
+        session = self._store.update(session_id, append).value
+        with self._lock:
+            self._records += 1
+            purge = self._records % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+        if sum(_exchange_tokens(e) for e in session["exchanges"]) > self.recent_budget:
+            self._schedule_fold(session_id)
+
+    def _schedule_fold(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._folding:
+                return
+            self._folding.add(session_id)
+        self._executor.submit(self._fold, session_id)
+
+    def _fold(self, session_id: str) -> None:
+        try:
+            session = self._load(session_id)
+            exchanges, used, keep = session["exchanges"], 0, 0
+            # Keep the newest exchanges that fill half the window, so a fold is not needed after every turn
+            for exchange in reversed(exchanges):
+                used += _exchange_tokens(exchange)
+                if used > self.recent_budget // 2 and keep:
+                    break
+                keep += 1
+            old = exchanges[:len(exchanges) - keep]
+            if not old:
+                return
+            try:
+                summary = self._summarize(session["summary"], old, self.summary_budget)
+            except Exception as e:
+                logger.warning(f"Could not summarize conversation {session_id}: {e}")
+                # Fall back to remembering just the questions rather than growing without bound
+                summary = "\n".join(filter(None, [session["summary"], "Earlier questions: " + "; ".join(e["user"] for e in old)]))
+            summary = clip((summary or "").strip(), self.summary_budget)
+
+            def apply(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+                if current is None or current["folded"] != session["folded"]:
+                    # Cleared or folded elsewhere in the meantime; leave it alone
+                    return current
+                return {"summary": summary, "exchanges": current["exchanges"][len(old):], "folded": current["folded"] + len(old)}
+
+            self._store.update(session_id, apply)
+        except Exception as e:
+            logger.error(f"Error folding conversation {session_id}: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._folding.discard(session_id)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._store.get(session_id, ttl=self.session_ttl)
+        return entry.value if entry is not None else None
+
+    def clear(self, session_id: str) -> None:
+        self._store.delete(session_id)
+
+    def purge(self) -> int:
+        return self._store.purge(self.session_ttl)
+
+
+_memory: Optional[ConversationMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    """Process-wide conversation memory; set CONVERSATION_STORE_PATH to choose where sessions are kept."""
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = ConversationMemory()
+    return _memory
@@ -0,0 +1,195 @@
+"""Vectorized technical indicators and the agent tool that exposes them.
+
+All indicator functions take 2-D float arrays shaped (tickers, bars), oldest bar
+first, and compute every ticker at once with NumPy. Tickers with shorter
+histories are NaN-padded at the start; each indicator is NaN until enough
+valid bars exist for it.
+"""
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+from agno.tools import Toolkit
+
+from cached_tools import get_tool_cache
+from market_data import download_history
+from report_cache import canonical_symbol
+
+INDICATOR_TTL = 15 * 60
+INDICATOR_PERIOD = "1y"
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    window_sums = sums.copy()
+    window_sums[:, window:] -= sums[:, :-window]
+    window_counts = counts.copy()
+    window_counts[:, window:] -= counts[:, :-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = window_sums / window
+    result[window_counts < window] = np.nan
+    return result
+
+
+def ema(values: np.ndarray, span: Optional[int] = None, alpha: Optional[float] = None) -> np.ndarray:
+    """Exponential moving average, seeded with each ticker's first valid value.
+
+    The recursion runs over bars, but each step updates every ticker at once.
+    """
+    alpha = alpha if alpha is not None else 2.0 / (span + 1)
+    result = np.full_like(values, np.nan)
+    current = np.full(values.shape[0], np.nan)
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        updated = np.where(np.isnan(current), x, alpha * x + (1 - alpha) * current)
+        current = np.where(np.isnan(x), current, updated)
+        result[:, t] = current
+    return result
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    delta = np.diff(close, axis=1, prepend=np.nan)
+    gains = np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0))
+    losses = np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0))
+    # Wilder's smoothing is an EMA with alpha = 1 / window
+    avg_gain = ema(gains, alpha=1.0 / window)
+    avg_loss = ema(losses, alpha=1.0 / window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rs = avg_gain / avg_loss
+        result = 100 - 100 / (1 + rs)
+    result = np.where(avg_loss == 0, 100.0, result)
+    result[np.isnan(avg_gain)] = np.nan
+    # Require a full window of changes before reporting a value
+    result[_valid_count(delta) < window] = np.nan
+    return result
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    line = ema(close, fast) - ema(close, slow)
+    line[_valid_count(close) < slow] = np.nan
+    signal_line = ema(line, signal)
+    return {"macd": line, "signal": signal_line, "histogram": line - signal_line}
+
+
+def bollinger_bands(close: np.ndarray, window: int = 20, num_std: float = 2.0) -> Dict[str, np.ndarray]:
+    middle = sma(close, window)
+    variance = sma(close ** 2, window) - middle ** 2
+    std = np.sqrt(np.clip(variance, 0, None))
+    return {"middle": middle, "upper": middle + num_std * std, "lower": middle - num_std * std}
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    previous_close = np.roll(close, 1, axis=1)
+    previous_close[:, 0] = np.nan
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    result = ema(true_range, alpha=1.0 / window)
+    result[_valid_count(true_range) < window] = np.nan
+    return result
+
+
+def _valid_count(values: np.ndarray) -> np.ndarray:
+    return np.cumsum(~np.isnan(values), axis=1)
+
+
+def compute_indicators(bars: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Compute the full indicator set for (tickers, bars) arrays keyed by OHLCV field."""
+    close, high, low, volume = bars["Close"], bars["High"], bars["Low"], bars["Volume"]
+    result = {
+        "sma_20": sma(close, 20),
+        "sma_50": sma(close, 50),
+        "sma_200": sma(close, 200),
+        "ema_12": ema(close, 12),
+        "ema_26": ema(close, 26),
+        "rsi_14": rsi(close, 14),
+        "atr_14": atr(high, low, close, 14),
+        "volume_avg_20": sma(volume, 20),
+    }
+    result.update({f"macd_{k}" if k != "macd" else "macd": v for k, v in macd(close).items()})
+    result.update({f"bollinger_{k}": v for k, v in bollinger_bands(close).items()})
+    return result
+
+
+def _last_valid(values: np.ndarray) -> np.ndarray:
+    """Last non-NaN value per row (NaN when a row has none)."""
+    valid = ~np.isnan(values)
+    last_index = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    result = values[np.arange(values.shape[0]), last_index]
+    result[~valid.any(axis=1)] = np.nan
+    return result
+
+
+def signals(latest: Dict[str, float]) -> Dict[str, str]:
+    def known(*keys):
+        return all(latest.get(k) is not None for k in keys)
+
+    result = {}
+    if known("rsi_14"):
+        result["rsi"] = "Sell (overbought)" if latest["rsi_14"] > 70 else "Buy (oversold)" if latest["rsi_14"] < 30 else "Neutral"
+    if known("macd", "macd_signal"):
+        result["macd"] = "Buy (above signal)" if latest["macd"] > latest["macd_signal"] else "Sell (below signal)"
+    if known("close", "sma_50", "sma_200"):
+        result["trend"] = "Bullish" if latest["close"] > latest["sma_50"] > latest["sma_200"] else "Bearish" if latest["close"] < latest["sma_50"] < latest["sma_200"] else "Mixed"
+    if known("close", "bollinger_upper", "bollinger_lower"):
+        result["bollinger"] = "Sell (above upper band)" if latest["close"] > latest["bollinger_upper"] else "Buy (below lower band)" if latest["close"] < latest["bollinger_lower"] else "Inside bands"
+    if known("volume", "volume_avg_20") and latest["volume_avg_20"]:
+        result["volume"] = "Unusually high" if latest["volume"] > 2 * latest["volume_avg_20"] else "Normal"
+    return result
+
+
+def latest_indicators(symbols: List[str], bars: Dict[str, np.ndarray]) -> Dict[str, Dict]:
+    """Latest value of every indicator plus simple buy/sell signals, per symbol."""
+    series = compute_indicators(bars)
+    series["close"] = bars["Close"]
+    series["volume"] = bars["Volume"]
+    latest = {name: _last_valid(values) for name, values in series.items()}
+    report = {}
+    for i, symbol in enumerate(symbols):
+        values = {name: (None if np.isnan(v[i]) else round(float(v[i]), 4)) for name, v in latest.items()}
+        report[symbol] = {"indicators": values, "signals": signals(values)}
+    return report
+
+
+def history_to_arrays(history, symbols: List[str]) -> Dict[str, np.ndarray]:
+    """Turn a `yf.download(..., group_by="ticker")` frame into (tickers, bars) arrays per field."""
+    arrays = {field: np.full((len(symbols), len(history.index)), np.nan) for field in FIELDS}
+    for i, symbol in enumerate(symbols):
+        if symbol not in history.columns.get_level_values(0):
+            continue
+        for field in FIELDS:
+            arrays[field][i] = history[symbol][field].to_numpy(dtype=float)
+    return arrays
+
+
+class TechnicalIndicatorTools(Toolkit):
+    def __init__(self, **kwargs):
+        super().__init__(name="technical_indicator_tools", tools=[self.compute_technical_indicators], **kwargs)
+
+    def compute_technical_indicators(self, symbols: str) -> str:
+        """Use this function to compute technical indicators with buy/sell signals for one or more stocks.
+
+        Computes SMA(20/50/200), EMA(12/26), RSI(14), MACD(12,26,9), Bollinger Bands(20,2), ATR(14)
+        and 20-day average volume from one year of daily prices.
+
+        Args:
+            symbols (str): One stock symbol or several separated by commas, e.g. "AAPL" or "AAPL,MSFT".
+
+        Returns:
+            str: JSON mapping each symbol to its latest indicator values and signals.
+        """
+        tickers = list(dict.fromkeys(canonical_symbol(s) for s in symbols.split(",") if s.strip()))
+        if not tickers:
+            return "Error: no symbols given"
+
+        def compute() -> str:
+            history = download_history(tickers, period=INDICATOR_PERIOD)
+            if history is None or history.empty:
+                return f"Could not fetch price history for {', '.join(tickers)}"
+            return json.dumps(latest_indicators(tickers, history_to_arrays(history, tickers)))
+
+        try:
+            return get_tool_cache().get_or_call("compute_technical_indicators", {"symbols": tickers}, INDICATOR_TTL, compute)
+        except Exception as e:
+            return f"Error computing technical indicators for {', '.join(tickers)}: {e}"
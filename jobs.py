@@ -0,0 +1,174 @@
+"""Bounded background job execution with single-flight coalescing.
+
+Jobs run on a fixed-size thread pool so the number of concurrent agent runs is
+bounded by configuration (i.e. LLM quota) rather than by HTTP threads. A job
+submitted while an identical one (same key) is still queued or running is not
+executed again; the caller gets the in-flight job and shares its result.
+Jobs waiting for a worker start in priority order (lower first), and in
+submission order within a priority.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    key: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    # The exception behind `error`, so callers can tell failures apart
+    exception: Optional[BaseException] = field(default=None, repr=False)
+    waiters: int = 1
+    priority: int = 0
+    # What the job runs (e.g. an analysis type), for callers estimating the wait behind queued jobs
+    kind: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "waiters": self.waiters,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, retention: float = 3600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs: Dict[str, Job] = {}
+        self._inflight: Dict[str, Job] = {}
+        # Jobs waiting for a worker, as (priority, seq, job, fn)
+        self._queue: List[Tuple[int, int, Job, Callable[[], Any]]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, fn: Callable[[], Any], priority: int = 0, kind: Optional[str] = None) -> Tuple[Job, bool]:
+        """Run `fn` in the pool unless a job with `key` is in flight; returns (job, coalesced)."""
+        with self._lock:
+            self._prune()
+            job = self._inflight.get(key)
+            if job is not None:
+                job.waiters += 1
+                return job, True
+            if len(self._inflight) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._inflight)} analysis jobs already pending")
+            job = Job(key=key, priority=priority, kind=kind)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            entry = (priority, next(self._seq), job, fn)
+            heapq.heappush(self._queue, entry)
+        try:
+            # One pool task per job, but each runs whichever queued job comes first when it gets a worker
+            self._executor.submit(self._run_next)
+        except RuntimeError as e:
+            # The pool has been shut down
+            with self._lock:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+            self._finish(job, e)
+        return job, False
+
+    def find(self, key: str) -> Optional[Job]:
+        """The queued or running job for `key`, if any."""
+        return self._inflight.get(key)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def pending(self) -> int:
+        return len(self._inflight)
+
+    def queued(self, max_priority: Optional[int] = None) -> List[Job]:
+        """Jobs waiting for a worker, first to start first; only those at `max_priority` or ahead of it if given."""
+        with self._lock:
+            entries = sorted(self._queue)
+        return [job for priority, _, job, _ in entries if max_priority is None or priority <= max_priority]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        if not wait:
+            # The cancelled pool tasks would have run the jobs still queued; fail those so waiters wake up
+            with self._lock:
+                cancelled = [job for _, _, job, _ in self._queue]
+                self._queue.clear()
+            for job in cancelled:
+                self._finish(job, RuntimeError("Shutting down; the job was cancelled"))
+
+    def _run_next(self) -> None:
+        with self._lock:
+            if not self._queue:
+                # Failed by shutdown() while this task was being handed to a worker
+                return
+            _, _, job, fn = heapq.heappop(self._queue)
+        self._run(job, fn)
+
+    def _run(self, job: Job, fn: Callable[[], Any]) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn()
+            job.status = SUCCEEDED
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.key}) failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.exception = e
+            job.status = FAILED
+        finally:
+            self._finish(job)
+
+    def _finish(self, job: Job, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            job.error = str(error)
+            job.exception = error
+            job.status = FAILED
+        job.finished_at = time.time()
+        with self._lock:
+            self._inflight.pop(job.key, None)
+        job.done.set()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
@@ -1,617 +1,29 @@
 import streamlit as st
 import os
+import uuid
 from dotenv import load_dotenv
-from agno.agent import Agent
-from agno.models.groq import Groq
-from agno.tools.yfinance import YFinanceTools
-from agno.tools.duckduckgo import DuckDuckGoTools
-from agno.models.google import Gemini
+from agents import analysis_agent_name, analysis_prompt, new_agent
+from chat_cache import get_chat_cache
+from comparison import comparison_key, validate_comparison
+from conversation import get_conversation_memory
+from prefetch import analysis_context
+from prewarm import SEED_TICKERS
+from report_cache import ReportCache, canonical_symbol, report_ttl
+from report_schema import render_markdown, report_content
 
 
 # Load environment variables
 load_dotenv()
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
-# Modern UI with Glassmorphism
-css = """
-<style>
-    /* Modern Glassmorphism Color Palette */
-    :root {
-        --main-bg: #0f1729;
-        --glass-bg: rgba(21, 30, 54, 0.6);
-        --glass-card: rgba(25, 34, 60, 0.4);
-        --glass-hover: rgba(30, 41, 71, 0.7);
-        --accent-primary: #6366f1;
-        --accent-secondary: #8b5cf6;
-        --accent-tertiary: #ec4899;
-        --text-primary: #f1f5f9;
-        --text-secondary: #cbd5e1;
-        --text-tertiary: #94a3b8;
-        --success: #10b981;
-        --warning: #f59e0b;
-        --danger: #ef4444;
-        --border: rgba(255, 255, 255, 0.08);
-        --shadow: rgba(0, 0, 0, 0.1);
-        --glow: rgba(99, 102, 241, 0.5);
-    }
-    
-    /* Base styling with glassmorphism */
-    body {
-        background: linear-gradient(135deg, var(--main-bg), #131c38) !important;
-        color: var(--text-primary);
-        font-family: 'Plus Jakarta Sans', 'Inter', sans-serif;
-        background-attachment: fixed;
-    }
-    
-    .main {
-        background: transparent !important;
-    }
-    
-    /* Typography */
-    h1, h2, h3, h4, h5, h6 {
-        font-family: 'Plus Jakarta Sans', 'Inter', sans-serif;
-        font-weight: 700;
-        color: var(--text-primary);
-        letter-spacing: -0.02em;
-    }
-    
-    p, div, li, span {
-        font-family: 'Plus Jakarta Sans', 'Inter', sans-serif;
-        color: var(--text-secondary);
-        line-height: 1.6;
-    }
-    
-    /* Glassmorphism cards */
-    .glass-card {
-        background: var(--glass-card);
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        border-radius: 16px;
-        padding: 24px;
-        margin-bottom: 24px;
-        border: 1px solid var(--border);
-        box-shadow: 0 8px 32px var(--shadow);
-        transition: all 0.3s ease;
-    }
-    
-    .glass-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 12px 40px var(--shadow), 0 0 15px var(--glow);
-        border-color: rgba(99, 102, 241, 0.3);
-    }
-    
-    /* Gradient accents */
-    .gradient-text {
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-tertiary));
-        -webkit-background-clip: text;
-        background-clip: text;
-        color: transparent;
-        font-weight: 700;
-    }
-    
-    .gradient-border {
-        position: relative;
-        border-radius: 16px;
-        overflow: hidden;
-    }
-    
-    .gradient-border::before {
-        content: "";
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        bottom: 0;
-        border-radius: 16px;
-        padding: 1px;
-        background: linear-gradient(45deg, var(--accent-primary), var(--accent-tertiary));
-        -webkit-mask: linear-gradient(#fff 0 0) content-box, linear-gradient(#fff 0 0);
-        -webkit-mask-composite: xor;
-        mask-composite: exclude;
-        pointer-events: none;
-    }
-    
-    /* Sidebar */
-    .css-1d391kg, .css-1e5imcs, [data-testid="stSidebar"] {
-        background-color: var(--glass-bg) !important;
-        backdrop-filter: blur(10px) !important;
-        -webkit-backdrop-filter: blur(10px) !important;
-        border-right: 1px solid var(--border) !important;
-    }
-    
-    /* Buttons */
-    .stButton > button {
-        background: var(--glass-card) !important;
-        color: var(--text-primary) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        padding: 0.6rem 1.2rem !important;
-        font-weight: 600 !important;
-        transition: all 0.2s ease !important;
-        backdrop-filter: blur(8px) !important;
-        -webkit-backdrop-filter: blur(8px) !important;
-    }
-    
-    .stButton > button:hover {
-        background: linear-gradient(45deg, rgba(99, 102, 241, 0.08), rgba(236, 72, 153, 0.08)) !important;
-        border-color: rgba(99, 102, 241, 0.6) !important;
-        transform: translateY(-2px) !important;
-        box-shadow: 0 5px 15px rgba(99, 102, 241, 0.2) !important;
-    }
-    
-    .primary-button > button {
-        background: linear-gradient(45deg, var(--accent-primary), var(--accent-secondary)) !important;
-        color: white !important;
-        border: none !important;
-    }
-    
-    /* Input fields */
-    .stTextInput > div > div > input {
-        background-color: var(--glass-card) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        color: var(--text-primary) !important;
-        padding: 12px 16px !important;
-        backdrop-filter: blur(8px) !important;
-        -webkit-backdrop-filter: blur(8px) !important;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: var(--accent-primary) !important;
-        box-shadow: 0 0 0 2px var(--glow) !important;
-    }
-    
-    /* Select boxes */
-    .stSelectbox > div > div > div {
-        background-color: var(--glass-card) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 8px !important;
-        color: var(--text-primary) !important;
-        backdrop-filter: blur(8px) !important;
-        -webkit-backdrop-filter: blur(8px) !important;
-    }
-    
-    .stSelectbox > div > div > div:focus {
-        border-color: var(--accent-primary) !important;
-        box-shadow: 0 0 0 2px var(--glow) !important;
-    }
-    
-    /* Tables */
-    table {
-        width: 100%;
-        border-collapse: separate !important;
-        border-spacing: 0 !important;
-        border-radius: 12px !important;
-        overflow: hidden !important;
-        margin: 1em 0 !important;
-        border: 1px solid var(--border) !important;
-        background: var(--glass-card) !important;
-        backdrop-filter: blur(10px) !important;
-        -webkit-backdrop-filter: blur(10px) !important;
-    }
-    
-    thead tr th {
-        background-color: rgba(30, 41, 71, 0.5) !important;
-        color: var(--text-primary) !important;
-        font-weight: 600 !important;
-        text-transform: none !important;
-        font-size: 0.875rem !important;
-        padding: 14px 18px !important;
-        border-bottom: 1px solid var(--border) !important;
-    }
-    
-    tbody tr td {
-        background-color: transparent !important;
-        color: var(--text-secondary) !important;
-        padding: 14px 18px !important;
-        border-bottom: 1px solid var(--border) !important;
-        font-size: 0.875rem !important;
-    }
-    
-    tbody tr:last-child td {
-        border-bottom: none !important;
-    }
-    
-    tbody tr:hover td {
-        background-color: rgba(30, 41, 71, 0.3) !important;
-    }
-    
-    /* Finance-specific indicators */
-    .positive {
-        color: var(--success) !important;
-        font-weight: 600 !important;
-    }
-    
-    .negative {
-        color: var(--danger) !important;
-        font-weight: 600 !important;
-    }
-    
-    .neutral {
-        color: var(--warning) !important;
-        font-weight: 600 !important;
-    }
-    
-    /* Badge styling */
-    .badge {
-        display: inline-flex;
-        align-items: center;
-        padding: 0.3em 0.8em;
-        font-size: 0.75rem;
-        font-weight: 600;
-        border-radius: 20px;
-        background: var(--glass-card);
-        backdrop-filter: blur(5px);
-        -webkit-backdrop-filter: blur(5px);
-    }
-    
-    .badge-buy {
-        background: rgba(16, 185, 129, 0.1);
-        color: var(--success);
-        border: 1px solid rgba(16, 185, 129, 0.3);
-    }
-    
-    .badge-sell {
-        background: rgba(239, 68, 68, 0.1);
-        color: var(--danger);
-        border: 1px solid rgba(239, 68, 68, 0.3);
-    }
-    
-    .badge-hold {
-        background: rgba(245, 158, 11, 0.1);
-        color: var(--warning);
-        border: 1px solid rgba(245, 158, 11, 0.3);
-    }
-    
-    /* Gradient divider */
-    .gradient-divider {
-        height: 1px;
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-tertiary), transparent);
-        margin: 1.5rem 0;
-        opacity: 0.7;
-    }
-    
-    /* Ticker symbol */
-    .ticker {
-        font-family: 'JetBrains Mono', 'SF Mono', 'Roboto Mono', monospace;
-        font-weight: 700;
-        color: var(--accent-primary);
-        background: rgba(99, 102, 241, 0.1);
-        padding: 4px 8px;
-        border-radius: 6px;
-    }
-    
-    /* Price display */
-    .price {
-        font-family: 'Plus Jakarta Sans', 'Inter', sans-serif;
-        font-size: 2rem;
-        font-weight: 700;
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-tertiary));
-        -webkit-background-clip: text;
-        background-clip: text;
-        color: transparent;
-    }
-    
-    /* Progress bar styling */
-    .stProgress > div > div > div {
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-tertiary)) !important;
-    }
-    
-    /* Scrollbar styling */
-    ::-webkit-scrollbar {
-        width: 8px;
-        height: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: rgba(21, 30, 54, 0.2);
-        border-radius: 10px;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: rgba(99, 102, 241, 0.3);
-        border-radius: 10px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: rgba(99, 102, 241, 0.5);
-    }
-    
-    /* Stat cards with glassmorphism */
-    .stat-group {
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
-        gap: 16px;
-        margin-top: 16px;
-    }
-    
-    .stat-card {
-        background: var(--glass-card);
-        border-radius: 12px;
-        padding: 20px;
-        backdrop-filter: blur(8px);
-        -webkit-backdrop-filter: blur(8px);
-        border: 1px solid var(--border);
-        transition: all 0.3s ease;
-    }
-    
-    .stat-card:hover {
-        transform: translateY(-3px);
-        box-shadow: 0 8px 20px rgba(0, 0, 0, 0.12), 0 0 10px var(--glow);
-        border-color: rgba(99, 102, 241, 0.3);
-    }
-    
-    .stat-label {
-        font-size: 0.75rem;
-        color: var(--text-tertiary);
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-        margin-bottom: 8px;
-        font-weight: 600;
-    }
-    
-    .stat-value {
-        font-size: 1.75rem;
-        font-weight: 700;
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-tertiary));
-        -webkit-background-clip: text;
-        background-clip: text;
-        color: transparent;
-        line-height: 1.2;
-    }
-    
-    /* Chat interface */
-    .chat-container {
-        margin-top: 24px;
-        display: flex;
-        flex-direction: column;
-    }
-    
-    .chat-message {
-        display: flex;
-        margin-bottom: 20px;
-    }
-    
-    .chat-message-ai {
-        flex-direction: row;
-    }
-    
-    .chat-message-user {
-        flex-direction: row-reverse;
-    }
-    
-    .chat-avatar {
-        width: 40px;
-        height: 40px;
-        border-radius: 50%;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-weight: 600;
-        flex-shrink: 0;
-    }
-    
-    .chat-avatar-ai {
-        background: linear-gradient(135deg, var(--accent-primary), var(--accent-secondary));
-        color: white;
-        margin-right: 14px;
-    }
-    
-    .chat-avatar-user {
-        background: linear-gradient(135deg, var(--accent-secondary), var(--accent-tertiary));
-        color: white;
-        margin-left: 14px;
-    }
-    
-    .chat-bubble {
-        padding: 16px 20px;
-        border-radius: 12px;
-        max-width: 80%;
-        box-shadow: 0 4px 10px rgba(0, 0, 0, 0.1);
-    }
-    
-    .chat-bubble-ai {
-        background: var(--glass-card);
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        border: 1px solid var(--border);
-        color: var(--text-primary);
-    }
-    
-    .chat-bubble-user {
-        background: linear-gradient(135deg, rgba(99, 102, 241, 0.2), rgba(139, 92, 246, 0.2));
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        color: var(--text-primary);
-        border: 1px solid rgba(99, 102, 241, 0.3);
-    }
-    
-    /* Spinner animation */
-    .loading-spinner {
-        display: inline-block;
-        width: 24px;
-        height: 24px;
-        border: 2px solid rgba(99, 102, 241, 0.1);
-        border-radius: 50%;
-        border-top-color: var(--accent-primary);
-        animation: spin 0.8s ease-in-out infinite;
-    }
-    
-    @keyframes spin {
-        to { transform: rotate(360deg); }
-    }
-    
-    /* Navigation pills */
-    .nav-pills {
-        display: flex;
-        gap: 8px;
-        margin-bottom: 24px;
-        padding: 4px;
-        background: var(--glass-bg);
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        border-radius: 12px;
-        border: 1px solid var(--border);
-    }
-    
-    .nav-pill {
-        padding: 8px 16px;
-        border-radius: 8px;
-        font-weight: 600;
-        font-size: 0.9rem;
-        transition: all 0.2s ease;
-        cursor: pointer;
-    }
-    
-    .nav-pill-active {
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-secondary));
-        color: white;
-        box-shadow: 0 4px 8px rgba(99, 102, 241, 0.25);
-    }
-    
-    /* Logo and brand */
-    .logo {
-        font-weight: 700;
-        font-size: 1.3rem;
-        display: flex;
-        align-items: center;
-    }
-    
-    .logo-icon {
-        margin-right: 10px;
-        font-size: 1.4rem;
-        background: linear-gradient(90deg, var(--accent-primary), var(--accent-tertiary));
-        -webkit-background-clip: text;
-        background-clip: text;
-        color: transparent;
-    }
-    
-    /* Quick action buttons */
-    .quick-actions {
-        display: flex;
-        gap: 10px;
-        flex-wrap: wrap;
-        margin: 16px 0;
-    }
-    
-    .quick-action {
-        background: var(--glass-card);
-        backdrop-filter: blur(8px);
-        -webkit-backdrop-filter: blur(8px);
-        border: 1px solid var(--border);
-        border-radius: 12px;
-        padding: 12px 18px;
-        font-size: 0.9rem;
-        font-weight: 600;
-        color: var(--text-primary);
-        transition: all 0.2s ease;
-        cursor: pointer;
-        display: flex;
-        align-items: center;
-        gap: 8px;
-    }
-    
-    .quick-action:hover {
-        background: linear-gradient(45deg, rgba(99, 102, 241, 0.08), rgba(139, 92, 246, 0.08));
-        transform: translateY(-2px);
-        border-color: rgba(99, 102, 241, 0.4);
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1), 0 0 5px var(--glow);
-    }
-    
-    .quick-action-icon {
-        color: var(--accent-primary);
-    }
-    
-    /* Feedback tags */
-    .feedback-tag {
-        display: inline-flex;
-        align-items: center;
-        padding: 4px 10px;
-        background: var(--glass-card);
-        border-radius: 20px;
-        font-size: 0.75rem;
-        font-weight: 600;
-        margin-right: 8px;
-        margin-bottom: 8px;
-        cursor: pointer;
-        transition: all 0.2s ease;
-        border: 1px solid var(--border);
-    }
-    
-    .feedback-tag:hover {
-        background: linear-gradient(90deg, rgba(99, 102, 241, 0.08), rgba(139, 92, 246, 0.08));
-        border-color: rgba(99, 102, 241, 0.4);
-    }
-    
-    /* Search bar */
-    .search-container {
-        position: relative;
-        margin: 16px 0;
-    }
-    
-    .search-input {
-        width: 100%;
-        padding: 14px 20px;
-        padding-left: 45px;
-        border-radius: 12px;
-        background: var(--glass-card);
-        backdrop-filter: blur(8px);
-        -webkit-backdrop-filter: blur(8px);
-        border: 1px solid var(--border);
-        color: var(--text-primary);
-        font-size: 1rem;
-        transition: all 0.2s ease;
-    }
-    
-    .search-input:focus {
-        border-color: rgba(99, 102, 241, 0.5);
-        box-shadow: 0 0 0 3px var(--glow);
-        outline: none;
-    }
-    
-    .search-icon {
-        position: absolute;
-        left: 15px;
-        top: 50%;
-        transform: translateY(-50%);
-        color: var(--text-tertiary);
-    }
-    
-    /* Help tooltips */
-    .tooltip {
-        position: relative;
-        display: inline-block;
-        cursor: help;
-    }
-    
-    .tooltip-text {
-        visibility: hidden;
-        position: absolute;
-        bottom: 125%;
-        left: 50%;
-        transform: translateX(-50%);
-        background: var(--glass-bg);
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        border: 1px solid var(--border);
-        color: var(--text-primary);
-        padding: 10px 14px;
-        border-radius: 8px;
-        width: 200px;
-        font-size: 0.75rem;
-        z-index: 1;
-        opacity: 0;
-        transition: all 0.2s ease;
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-    }
-    
-    .tooltip:hover .tooltip-text {
-        visibility: visible;
-        opacity: 1;
-    }
-</style>
-"""
+# Glassmorphism theme, kept in static/style.css
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+
+
+@st.cache_resource
+def load_css():
+    with open(STYLESHEET, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
 
 # Streamlit Page Config
 st.set_page_config(
@@ -620,8 +32,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Inject custom CSS
-st.markdown(css, unsafe_allow_html=True)
+# Inject custom CSS; the file is read once per process and fragment reruns never resend it
+st.html(load_css())
 
 # --- Header ---
 st.markdown("""
@@ -643,44 +55,8 @@ st.markdown("""
 
 # --- Define AI Agents ---
 
-## Web Search Agent
-web_search_agent = Agent(
-    name="Web Search Agent",
-    role="Search the web for the latest information",
-    model=Gemini(id="gemini-2.0-flash"),
-    tools=[DuckDuckGoTools()],
-    instructions=[
-        "ALWAYS present information in tabular format where possible",
-        "Always include sources with dates of publication",
-        "Structure your output with clear headings and bullet points",
-        "For financial news, categorize information by market impact (Positive/Neutral/Negative) in a table format",
-        "Include a summary of key takeaways at the end in a table format"
-    ],
-    show_tool_calls=True,
-    markdown=True,
-)
-
-## Financial Agent
-finance_agent = Agent(
-    name="Finance AI Agent",
-    model=Gemini(id="gemini-2.0-flash"),
-    tools=[
-        YFinanceTools(stock_price=True, analyst_recommendations=True, stock_fundamentals=True, company_news=True),
-    ],
-    instructions=[
-        "ALWAYS present ALL data in tabular format - no exceptions",
-        "Present analyst recommendations with consensus ratings in a table (Strong Buy/Buy/Hold/Sell/Strong Sell)",
-        "Include target price ranges and average price targets in a dedicated table",
-        "Provide technical indicators with clear buy/sell signals in a table format",
-        "Format all price data with appropriate currency symbols",
-        "Present 'Timing Guidance' section with short-term, medium-term, and long-term outlooks in a table",
-        "Add a 'Risk Assessment' section in tabular format highlighting potential downsides",
-        "Structure output with clear headings: Summary, Price Data, Fundamentals, Analyst Views, Technical Analysis, Timing Guidance, Risk Assessment",
-        "Even summary information must be presented in a table format"
-    ],
-    show_tool_calls=True,
-    markdown=True,
-)
+# web_search_agent, finance_agent and multi_ai_agent live in agents.py and are built once per process,
+# so Streamlit reruns reuse the same agents and model clients.
 
 ## Chatbot Agent with Web Search Capability
 # chatbot_agent = Agent(
@@ -719,29 +95,6 @@ finance_agent = Agent(
 # )
 
 
-# Combined Multi-Agent System
-multi_ai_agent = Agent(
-    team=[finance_agent, web_search_agent],
-    model=Groq(id="meta-llama/llama-4-maverick-17b-128e-instruct"),
-    instructions=[
-        "ALWAYS present ALL information in table format - this is mandatory",
-        "Structure output with clear sections using markdown headings, with each section containing at least one table",
-        "First use the Finance Agent to get detailed stock data",
-        "Then use the Web Search Agent for recent news and market sentiment",
-        "Present ALL data in tables - never use paragraphs where tables can be used instead",
-        "Include a 'Stock Fundamentals' table with key metrics and comparisons to industry averages",
-        "Provide 'Analyst Consensus' table with specific ratings, target prices and timeframes",
-        "Add 'Technical Analysis' table with key indicators and clear buy/sell signals",
-        "Include 'Entry Points' table suggesting optimal buying opportunities based on technical patterns",
-        "Add 'Investment Timeframe' table (Short-term trader vs. Long-term investor recommendations)",
-        "Include 'Risk Assessment' table highlighting potential downside scenarios",
-        "End with 'Action Plan' table summarizing recommendations with clear timing guidance",
-        "Always cite sources for all external information in a dedicated sources table"
-    ],
-    show_tool_calls=True,
-    markdown=True,
-)
-
 # --- Streamlit UI ---
 # Create a container for the main content
 main_container = st.container()
@@ -749,7 +102,23 @@ main_container = st.container()
 # Simplified tabbed interface with fewer options
 tabs = st.tabs(["📊 Market Analysis", "💬 AI Assistant"])
 
-with tabs[0]:  # Market Analysis Tab
+# Reports shared across sessions; session memo avoids even the cache lookup on reruns
+@st.cache_resource
+def get_report_cache():
+    return ReportCache()
+
+if 'analysis_results' not in st.session_state:
+    st.session_state.analysis_results = {}
+if 'stock_symbol' not in st.session_state:
+    st.session_state.stock_symbol = "AAPL"
+
+def select_stock(symbol):
+    st.session_state.stock_symbol = symbol
+    st.session_state.analyze_requested = True
+
+# Each tab is a fragment: interacting with one reruns only that tab, not the whole page
+@st.fragment
+def analysis_panel():
     col1, col2 = st.columns([3, 1])
     
     with col1:
@@ -763,38 +132,52 @@ with tabs[0]:  # Market Analysis Tab
         
     with col2:
         # Stock lookup - simplified
-        stock_symbol = st.text_input("Enter Ticker Symbol", value="AAPL", placeholder="E.g., AAPL, MSFT")
+        stock_symbol = canonical_symbol(st.text_input("Enter Ticker Symbol", key="stock_symbol", placeholder="E.g., AAPL, MSFT"))
         
         # Simplified analysis options
         analysis_type = st.selectbox(
             "Analysis Type",
-            ["Complete Analysis", "News Impact"]
+            ["Complete Analysis", "News Impact", "Comparison"]
         )
+        if analysis_type == "Comparison" and stock_symbol:
+            # Several tickers, e.g. "AAPL, MSFT, GOOGL", compared in one report
+            error = validate_comparison(stock_symbol)
+            if error:
+                st.warning(error)
+            stock_symbol = None if error else comparison_key(stock_symbol)
         
         analyze_button = st.button("Analyze", use_container_width=True)
     
     # Popular stocks as quick buttons - simplified
     st.markdown("<p style='margin-top: 16px; font-size: 0.9rem;'>Popular stocks:</p>", unsafe_allow_html=True)
     
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.button("AAPL", use_container_width=True)
-    with col2:
-        st.button("MSFT", use_container_width=True)
-    with col3:
-        st.button("GOOGL", use_container_width=True)
-    with col4:
-        st.button("TSLA", use_container_width=True)
+    # The same tickers the API server pre-warms (PREWARM_TICKERS)
+    for col, symbol in zip(st.columns(4), SEED_TICKERS[:4]):
+        with col:
+            st.button(symbol, use_container_width=True, on_click=select_stock, args=(symbol,))
+    
+    analyze_requested = analyze_button or st.session_state.pop('analyze_requested', False)
+    
+    # Look up a previous result for this (ticker, analysis type) before considering a new run
+    result_key = (stock_symbol, analysis_type)
+    result = st.session_state.analysis_results.get(result_key)
+    if result is not None and result.age > report_ttl(analysis_type):
+        result = None
+    if result is None and stock_symbol:
+        result = get_report_cache().get(stock_symbol, analysis_type)
     
     # Display analysis results
-    if analyze_button or stock_symbol:
+    if stock_symbol and (result is not None or analyze_requested):
         with st.spinner('Analyzing market data...'):
             try:
-                # Determine analysis type and create prompt
-                if analysis_type == "Complete Analysis":
-                    prompt = f"Provide comprehensive analysis for {stock_symbol} including current price, analyst recommendations, technical indicators, and investment outlook."
-                else:
-                    prompt = f"Find and summarize the latest news for {stock_symbol} with market impact assessment."
+                # Only call the agents on an explicit request when nothing fresh is cached
+                if result is None:
+                    # Generate analysis
+                    context = analysis_context(stock_symbol, analysis_type)
+                    response = new_agent(analysis_agent_name(analysis_type=analysis_type)).run(analysis_prompt(stock_symbol, analysis_type, context))
+                    result = get_report_cache().set(stock_symbol, analysis_type, report_content(response.content))
+                
+                st.session_state.analysis_results[result_key] = result
                 
                 # Result header
                 st.markdown(f"""
@@ -803,16 +186,18 @@ with tabs[0]:  # Market Analysis Tab
                     <div class="gradient-divider"></div>
                 """, unsafe_allow_html=True)
                 
-                # Generate analysis
-                response = multi_ai_agent.run(prompt)
-                st.markdown(response.content)
+                st.caption(f"Generated {int(result.age // 60)} min ago")
+                st.markdown(render_markdown(result.value))
                 
                 st.markdown("</div>", unsafe_allow_html=True)
                 
             except Exception as e:
                 st.error(f"Error: {e}")
+    elif stock_symbol:
+        st.info(f"Click Analyze to generate a {analysis_type} report for {stock_symbol}.")
 
-with tabs[1]:  # AI Assistant Tab
+@st.fragment
+def chat_panel():
     st.markdown("""
     <div class="glass-card">
         <h2>AI Financial Assistant</h2>
@@ -829,53 +214,60 @@ with tabs[1]:  # AI Assistant Tab
     with col2:
         st.button("Crypto market outlook", use_container_width=True)
     
-    # Input and send button - simplified
-    user_question = st.text_input("Ask anything about finance", placeholder="e.g., How do interest rates affect stocks?")
-    send_button = st.button("Send", use_container_width=True)
-    
     # Initialize chat history in session state if not already there
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
+    # The full history is only displayed; the model gets the bounded conversation memory of this session
+    if 'chat_session_id' not in st.session_state:
+        st.session_state.chat_session_id = uuid.uuid4().hex
     
-    # Process user question
-    if send_button and user_question:
-        with st.spinner('Processing...'):
-            try:
-                # Add user message to history
-                st.session_state.chat_history.append({"role": "user", "content": user_question})
-                
-                # Get AI response
-                gemini_chat_model = Gemini(id="gemini-2.0-flash")
-                ai_response = gemini_chat_model.chat(user_question)
-                
-                # Add AI response to history
-                st.session_state.chat_history.append({"role": "ai", "content": ai_response.content})
-                
-            except Exception as e:
-                st.error(f"Error: {e}")
-    
-    # Display chat history - simplified
-    if st.session_state.chat_history:
-        st.markdown('<div class="glass-card" style="padding: 20px;">', unsafe_allow_html=True)
-        
+    # Display chat history. Each fragment rerun re-emits every message; only the fragment reruns, not the whole page
+    history = st.container()
+    with history:
         for message in st.session_state.chat_history:
-            if message["role"] == "user":
-                st.markdown(f"""
-                <div style="background: rgba(99, 102, 241, 0.1); padding: 10px 16px; border-radius: 8px; margin-bottom: 12px; border: 1px solid rgba(99, 102, 241, 0.2); text-align: right;">
-                    <strong>You:</strong> {message["content"]}
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div style="background: var(--glass-card); padding: 10px 16px; border-radius: 8px; margin-bottom: 16px; border: 1px solid var(--border);">
-                    <strong>AI:</strong>
-                """, unsafe_allow_html=True)
-                
-                st.markdown(message["content"])
-                
-                st.markdown("</div>", unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+            show_chat_message(message)
+    
+    user_question = st.chat_input("Ask anything about finance, e.g. How do interest rates affect stocks?")
+    
+    # Process user question, appending the new messages below the history without another rerun
+    if user_question:
+        with history:
+            question = {"role": "user", "content": user_question}
+            show_chat_message(question)
+            with st.chat_message("assistant", avatar="✨"):
+                with st.spinner('Processing...'):
+                    try:
+                        # Get AI response with the earlier conversation as context. Only the first question of a
+                        # conversation can reuse the answer to the same or a near-identical earlier question.
+                        memory = get_conversation_memory()
+                        followup = memory.has_context(st.session_state.chat_session_id)
+                        cached = None if followup else get_chat_cache().get(user_question)
+                        if cached is not None:
+                            answer = cached.answer
+                        else:
+                            answer = new_agent("chat_agent").run(memory.prompt(st.session_state.chat_session_id, user_question)).content
+                            if not followup:
+                                get_chat_cache().set(user_question, answer)
+                        memory.record(st.session_state.chat_session_id, user_question, answer)
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+                        return
+                st.markdown(answer)
+            
+            # Add both messages to history
+            st.session_state.chat_history.extend([question, {"role": "ai", "content": answer}])
+
+def show_chat_message(message):
+    if message["role"] == "user":
+        st.chat_message("user", avatar="👤").markdown(message["content"])
+    else:
+        st.chat_message("assistant", avatar="✨").markdown(message["content"])
+
+with tabs[0]:  # Market Analysis Tab
+    analysis_panel()
+
+with tabs[1]:  # AI Assistant Tab
+    chat_panel()
 
 # Simple footer
 st.markdown("""
@@ -893,12 +285,3 @@ st.markdown("""
 if 'current_time' not in st.session_state:
     from datetime import datetime
     st.session_state.current_time = datetime.now().strftime("%H:%M:%S")
-
-# Add spinner style for animations
-st.markdown("""
-<style>
-@keyframes spinner {
-    to {transform: rotate(360deg);}
-}
-</style>
-""", unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Bulk market-data prefetching with yfinance.
+
+One `yf.download` call fetches recent bars for a whole list of tickers, which
+is far cheaper than per-ticker tool calls made one at a time by the agents.
+"""
+import json
+import logging
+import math
+from typing import Dict, Iterable, List
+
+from cache import LRUCache
+from report_cache import canonical_symbol
+
+logger = logging.getLogger(__name__)
+
+QUOTE_TTL = 60
+_quotes = LRUCache(max_size=2048)
+
+
+def download_history(tickers: List[str], period: str = "5d", interval: str = "1d"):
+    """Download OHLCV bars for all tickers in one request, grouped by ticker."""
+    # Imported on first use: yfinance and pandas add about half a second to startup
+    import yfinance as yf
+    return yf.download(
+        tickers,
+        period=period,
+        interval=interval,
+        group_by="ticker",
+        threads=True,
+        progress=False,
+        auto_adjust=True,
+    )
+
+
+def _snapshot(bars) -> Dict[str, float]:
+    bars = bars.dropna(subset=["Close"])
+    if bars.empty:
+        return {}
+    last = bars.iloc[-1]
+    snapshot = {
+        "as_of": str(bars.index[-1].date()),
+        "close": round(float(last["Close"]), 4),
+        "volume": int(last["Volume"]) if not math.isnan(last["Volume"]) else None,
+    }
+    if len(bars) > 1:
+        previous = float(bars.iloc[-2]["Close"])
+        snapshot["previous_close"] = round(previous, 4)
+        snapshot["change_pct"] = round((snapshot["close"] / previous - 1) * 100, 2) if previous else None
+    return snapshot
+
+
+def prefetch_quotes(tickers: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    """Return a recent price snapshot per ticker, fetching all uncached tickers in one batch."""
+    symbols = list(dict.fromkeys(canonical_symbol(t) for t in tickers if t and t.strip()))
+    quotes = {}
+    missing = []
+    for symbol in symbols:
+        entry = _quotes.get(symbol, ttl=QUOTE_TTL)
+        if entry is not None:
+            quotes[symbol] = entry.value
+        else:
+            missing.append(symbol)
+    if not missing:
+        return quotes
+
+    try:
+        history = download_history(missing)
+    except Exception as e:
+        logger.warning(f"Bulk download failed for {missing}: {e}")
+        return quotes
+    if history is None or history.empty:
+        return quotes
+
+    for symbol in missing:
+        try:
+            snapshot = _snapshot(history[symbol])
+        except KeyError:
+            continue
+        if snapshot:
+            _quotes.set(symbol, snapshot)
+            quotes[symbol] = snapshot
+    return quotes
+
+
+# Prefetch datasets (prefetch.py) that a quote snapshot makes redundant
+QUOTE_DATASETS = ("get_current_stock_price",)
+
+
+def format_quote_context(symbol: str, quote: Dict[str, float]) -> str:
+    return f"Latest daily market data for {symbol} (already retrieved, do not re-fetch): {json.dumps(quote)}"
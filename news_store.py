@@ -0,0 +1,319 @@
+"""Incremental news ingestion for News Impact analyses.
+
+A News Impact refresh used to re-fetch and re-assess every recent article,
+although usually only one or two are new. The `NewsStore` remembers, per
+ticker in SQLite, which articles have already been assessed (by a hash of
+their URL, or of their title when there is none) and the publication time of
+the newest one, its high-water mark.
+
+A refresh fetches the ticker's news deterministically (yfinance company news
+and one DuckDuckGo news search, both through the cached toolkits) and keeps
+only the articles the store has not seen. If there are none, the previous
+report stands. Otherwise only those articles go to a small update agent,
+and its assessment is merged into the previous report. The merged report
+is what gets cached. A full analysis gets the fetched articles in its prompt
+instead. Only the articles a prompt contained are recorded as seen, and only
+once the report is stored, so a failed run assesses them again next time.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from cache import DEFAULT_CACHE_DIR, CacheEntry, SQLiteStore, offload
+from cached_tools import ERROR_PREFIXES
+from prefetch import PREFETCH_TIMEOUT, format_prefetch_context
+
+logger = logging.getLogger(__name__)
+
+NEWS_INCREMENTAL = os.environ.get("NEWS_INCREMENTAL", "1").lower() in ("1", "true", "yes")
+NEWS_STORIES = int(os.environ.get("NEWS_STORIES", 10))
+# Articles remembered per ticker; older ones are still excluded by the high-water mark
+NEWS_STORE_MAX_ARTICLES = int(os.environ.get("NEWS_STORE_MAX_ARTICLES", 200))
+# Unseen articles published this long before the high-water mark still count as new (feeds index late)
+NEWS_LATE_GRACE = float(os.environ.get("NEWS_LATE_GRACE", 3600))
+# News items and sources kept in a merged report
+NEWS_REPORT_MAX_ITEMS = int(os.environ.get("NEWS_REPORT_MAX_ITEMS", 12))
+# Articles put in a full analysis's prompt, newest first; the rest are left for later updates
+NEWS_PROMPT_MAX_ARTICLES = int(os.environ.get("NEWS_PROMPT_MAX_ARTICLES", 20))
+# A full analysis older than this is redone rather than updated again, so merged assessments do not drift
+NEWS_BASELINE_MAX_AGE = float(os.environ.get("NEWS_BASELINE_MAX_AGE", 24 * 3600))
+
+
+@dataclass
+class Article:
+    title: str
+    url: Optional[str] = None
+    source: Optional[str] = None
+    published: Optional[float] = None
+    summary: Optional[str] = None
+
+    @property
+    def id(self) -> str:
+        basis = self.url.split("#", 1)[0].rstrip("/").lower() if self.url else " ".join(self.title.lower().split())
+        return hashlib.sha1(basis.encode()).hexdigest()[:16]
+
+    @property
+    def date(self) -> Optional[str]:
+        return datetime.fromtimestamp(self.published).strftime("%Y-%m-%d %H:%M") if self.published else None
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def parse_company_news(raw: str) -> List[Article]:
+    """Articles from `get_company_news` output, in either of the shapes yfinance has returned."""
+    articles = []
+    for item in json.loads(raw):
+        content = item.get("content") or item
+        title = content.get("title")
+        if not title:
+            continue
+        articles.append(Article(
+            title=title,
+            url=(content.get("canonicalUrl") or content.get("clickThroughUrl") or {}).get("url") or content.get("link"),
+            source=(content.get("provider") or {}).get("displayName") or content.get("publisher"),
+            published=_timestamp(content.get("pubDate") or content.get("providerPublishTime")),
+            summary=content.get("summary"),
+        ))
+    return articles
+
+
+def parse_search_news(raw: str) -> List[Article]:
+    return [
+        Article(title=r["title"], url=r.get("url") or r.get("href"), source=r.get("source"),
+                published=_timestamp(r.get("date")), summary=r.get("body"))
+        for r in json.loads(raw) if r.get("title")
+    ]
+
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="news")
+_toolkits = None
+_toolkits_lock = threading.Lock()
+
+
+def _get_toolkits():
+    global _toolkits
+    if _toolkits is None:
+        with _toolkits_lock:
+            if _toolkits is None:
+                from toolkits import CachedDuckDuckGoTools, CachedYFinanceTools
+                _toolkits = (CachedYFinanceTools(stock_price=True, company_news=True), CachedDuckDuckGoTools())
+    return _toolkits
+
+
+def _articles(raw: Any, parse) -> List[Article]:
+    if raw is None:
+        # Timed out or raised; `_result` has logged why
+        return []
+    if not isinstance(raw, str) or raw.startswith(ERROR_PREFIXES):
+        logger.warning(f"News fetch failed: {str(raw)[:200]}")
+        return []
+    return parse(raw)
+
+
+def _submit(stock_symbol: str, price: Optional[str] = None) -> Dict[str, Future]:
+    finance, search = _get_toolkits()
+    if price is not None:
+        known = Future()
+        known.set_result(price)
+    return {
+        "price": known if price is not None else _executor.submit(finance.get_current_stock_price, stock_symbol),
+        "company_news": _executor.submit(finance.get_company_news, stock_symbol, NEWS_STORIES),
+        "search_news": _executor.submit(search.duckduckgo_news, f"{stock_symbol} stock news"),
+    }
+
+
+def _result(stock_symbol: str, name: str, future: Future) -> Any:
+    if not future.done():
+        logger.warning(f"Fetching {name} for {stock_symbol} timed out")
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        logger.warning(f"Fetching {name} for {stock_symbol} failed: {e}")
+        return None
+
+
+def _delta(stock_symbol: str, previous: Optional[CacheEntry], futures: Dict[str, Future]) -> "NewsDelta":
+    articles = _articles(_result(stock_symbol, "company news", futures["company_news"]), parse_company_news)
+    articles += _articles(_result(stock_symbol, "news search", futures["search_news"]), parse_search_news)
+    # The same story from both sources, or twice from one, is one article
+    articles = list({article.id: article for article in articles}.values())
+    price = _result(stock_symbol, "price", futures["price"])
+    price = price if isinstance(price, str) and not price.startswith(ERROR_PREFIXES) else None
+
+    store = get_news_store()
+    # Measured from the last full analysis, not the cache entry: every merged report is stored anew
+    baseline_at = store.state(stock_symbol).get("baseline_at")
+    fresh = baseline_at is not None and time.time() - baseline_at < NEWS_BASELINE_MAX_AGE
+    baseline = previous.value if fresh and previous is not None and isinstance(previous.value, dict) else None
+    if baseline is None:
+        # A full analysis assesses what its prompt shows; recording those afterwards makes it the baseline
+        shown = sorted(articles, key=lambda a: a.published or 0, reverse=True)[:NEWS_PROMPT_MAX_ARTICLES]
+        return NewsDelta(stock_symbol, articles, shown, None, price, store)
+    return NewsDelta(stock_symbol, articles, store.unseen(stock_symbol, articles), baseline, price, store)
+
+
+def news_delta(stock_symbol: str, previous: Optional[CacheEntry], timeout: float = PREFETCH_TIMEOUT, price: Optional[str] = None) -> "NewsDelta":
+    """Fetch the ticker's price (unless given) and news, and work out what is new since the `previous` News Impact report."""
+    futures = _submit(stock_symbol, price)
+    wait(futures.values(), timeout=timeout)
+    return _delta(stock_symbol, previous, futures)
+
+
+async def anews_delta(stock_symbol: str, previous: Optional[CacheEntry], timeout: float = PREFETCH_TIMEOUT, price: Optional[str] = None) -> "NewsDelta":
+    """Async `news_delta`: the fetches run on the news pool, but waiting does not hold a thread."""
+    futures = _submit(stock_symbol, price)
+    await asyncio.wait([asyncio.wrap_future(f) for f in futures.values()], timeout=timeout)
+    # Reads the news store
+    return await offload(_delta, stock_symbol, previous, futures)
+
+
+class NewsStore:
+    """Per-ticker record of assessed articles, the high-water mark and when the last full analysis ran, shared across processes."""
+
+    def __init__(self, path: Optional[str] = None, max_articles: int = NEWS_STORE_MAX_ARTICLES):
+        path = path or os.environ.get("NEWS_STORE_PATH", os.path.join(DEFAULT_CACHE_DIR, "news.sqlite3"))
+        self._store = SQLiteStore(path, table="news")
+        self.max_articles = max_articles
+
+    def state(self, stock_symbol: str) -> Dict[str, Any]:
+        entry = self._store.get(stock_symbol)
+        return entry.value if entry is not None else {"articles": {}, "high_water": None, "baseline_at": None}
+
+    def unseen(self, stock_symbol: str, articles: List[Article]) -> List[Article]:
+        state = self.state(stock_symbol)
+        high_water = state["high_water"]
+        return [
+            article for article in articles
+            if article.id not in state["articles"]
+            and (high_water is None or article.published is None or article.published > high_water - NEWS_LATE_GRACE)
+        ]
+
+    def record(self, stock_symbol: str, articles: List[Article], baseline: bool = False) -> None:
+        """Mark `articles` as assessed and advance the high-water mark; `baseline` if a full analysis assessed them."""
+        def merge(current: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            state = current or {"articles": {}, "high_water": None}
+            seen = state["articles"]
+            for article in articles:
+                seen[article.id] = {"title": article.title, "url": article.url, "published": article.published}
+            if len(seen) > self.max_articles:
+                newest = sorted(seen.items(), key=lambda item: item[1]["published"] or 0, reverse=True)
+                seen = dict(newest[:self.max_articles])
+            times = [a.published for a in articles if a.published is not None]
+            if state["high_water"] is not None:
+                times.append(state["high_water"])
+            baseline_at = time.time() if baseline else state.get("baseline_at")
+            return {"articles": seen, "high_water": max(times) if times else None, "baseline_at": baseline_at}
+
+        self._store.update(stock_symbol, merge)
+
+    def clear(self, stock_symbol: str) -> None:
+        self._store.delete(stock_symbol)
+
+
+def _article_lines(articles: List[Article]) -> str:
+    return "\n".join(
+        f"- {a.date or '-'} | {a.source or '-'} | {a.title}" + (f" | {a.summary[:300]}" if a.summary else "")
+        for a in articles
+    )
+
+
+@dataclass
+class NewsDelta:
+    """A ticker's fetched articles, the ones not assessed yet and the report they would update."""
+
+    stock_symbol: str
+    articles: List[Article]
+    # The articles the run assesses: the unseen ones for an update, the newest fetched ones for a full analysis
+    unseen: List[Article]
+    # The previous News Impact report (a StockReport dict), or None when a full analysis is needed
+    baseline: Optional[Dict[str, Any]] = None
+    price: Optional[str] = None
+    store: Optional[NewsStore] = field(default=None, repr=False)
+
+    @property
+    def incremental(self) -> bool:
+        return self.baseline is not None
+
+    def context(self, extra: Optional[str] = None) -> str:
+        """The prompt context for a full analysis: the latest price and the articles it is recorded as having assessed."""
+        parts = [format_prefetch_context(self.stock_symbol, {"get_current_stock_price": self.price})] if self.price else []
+        parts.append(f'<news_articles symbol="{self.stock_symbol}">\n{_article_lines(self.unseen)}\n</news_articles>')
+        if extra:
+            parts.append(extra)
+        return "\n\n".join(parts)
+
+    def prompt(self) -> str:
+        previous = "\n".join(
+            f"- {item.get('date') or '-'} | {item['headline']} | {item.get('impact', 'Neutral')}" for item in self.baseline.get("news", [])
+        )
+        new = _article_lines(self.unseen)
+        return (
+            f"Update the news impact assessment for {self.stock_symbol}.\n\n"
+            f"<previous_assessment>\n{self.baseline.get('summary', '')}\n{previous}\n</previous_assessment>\n\n"
+            f"<new_articles>\n{new}\n</new_articles>"
+        )
+
+    def merge(self, update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """The baseline report with `update` (a NewsUpdate dict, None if nothing was new) and the latest price."""
+        report = dict(self.baseline)
+        if update is not None:
+            if not isinstance(update, dict):
+                raise ValueError(f"News update for {self.stock_symbol} is not a NewsUpdate: {str(update)[:200]}")
+            report["summary"] = update.get("summary") or report.get("summary", "")
+            headlines = {item["headline"] for item in update.get("news", [])}
+            news = update.get("news", []) + [item for item in report.get("news", []) if item["headline"] not in headlines]
+            report["news"] = news[:NEWS_REPORT_MAX_ITEMS]
+            if update.get("risks"):
+                names = {risk["risk"] for risk in update["risks"]}
+                report["risks"] = update["risks"] + [risk for risk in report.get("risks", []) if risk["risk"] not in names]
+            sources = [{"title": a.title, "url": a.url, "date": a.date} for a in self.unseen]
+            known = {s.get("url") or s["title"] for s in sources}
+            sources += [s for s in report.get("sources", []) if (s.get("url") or s["title"]) not in known]
+            report["sources"] = [{k: v for k, v in s.items() if v is not None} for s in sources[:NEWS_REPORT_MAX_ITEMS]]
+        try:
+            price = float(self.price) if self.price else None
+        except ValueError:
+            price = None
+        if price is not None and report.get("price"):
+            # The day's change and range came from an earlier quote, so they go with it
+            report["price"] = {k: v for k, v in report["price"].items() if k not in ("change_percent", "day_low", "day_high")}
+            report["price"]["price"] = round(price, 2)
+        return report
+
+    def commit(self) -> None:
+        """Record the articles the run assessed; call once the report built from them is stored."""
+        # A full analysis is recorded even without articles, as it starts a new baseline period
+        if self.store is not None and (self.unseen or not self.incremental):
+            self.store.record(self.stock_symbol, self.unseen, baseline=not self.incremental)
+
+
+_news_store: Optional[NewsStore] = None
+_news_store_lock = threading.Lock()
+
+
+def get_news_store() -> NewsStore:
+    """Process-wide news store; set NEWS_STORE_PATH to choose where it is kept."""
+    global _news_store
+    if _news_store is None:
+        with _news_store_lock:
+            if _news_store is None:
+                _news_store = NewsStore()
+    return _news_store
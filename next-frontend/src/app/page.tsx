@@ -46,7 +46,7 @@ export default function Home() {
       const response = await fetch('http://127.0.0.1:5001/analyze', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ stock_symbol: trimmed, analysis_type: analysisType }),
+        body: JSON.stringify({ stock_symbol: trimmed, analysis_type: analysisType, format: 'markdown' }),
       });
       if (!response.ok) {
         const errData = await response.json().catch(() => ({}));
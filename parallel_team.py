@@ -0,0 +1,135 @@
+"""Parallel execution of the analysis team.
+
+`multi_ai_agent` lets the Groq leader delegate to the Finance Agent and then to
+the Web Search Agent, one after the other. Their work is independent, so
+`ParallelTeam` runs both members concurrently (each with its own timeout) and
+then asks a leader agent only to synthesize their reports. It mirrors the
+`Agent.run`/`Agent.arun` interface so callers can use either interchangeably.
+"""
+import asyncio
+import contextvars
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Tuple, Union
+
+from agno.agent import Agent
+from agno.run.response import RunResponse
+
+from streaming import arun_chunks, emit, run_chunks
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="team-member")
+
+
+@dataclass
+class Member:
+    agent: Agent
+    # Template for the member's task; {request} is the original request
+    task: str = "{request}"
+    timeout: float = 90
+    # Strip prefetched <market_data> blocks from this member's task
+    strip_market_data: bool = False
+
+
+def _strip_market_data(text: str) -> str:
+    return re.sub(r"<market_data\b.*?</market_data>\s*", "", text, flags=re.DOTALL).strip()
+
+
+class ParallelTeam:
+    def __init__(self, leader: Agent, members: List[Member]):
+        self.leader = leader
+        self.members = members
+
+    def _member_task(self, member: Member, message: str) -> str:
+        request = _strip_market_data(message) if member.strip_market_data else message
+        return member.task.format(request=request)
+
+    def run_members(self, message: str) -> Dict[str, str]:
+        """Run all members concurrently and return their outputs keyed by member name."""
+        with span("team_members", "team", members=[m.agent.name for m in self.members]):
+            return self._run_members(message)
+
+    def _run_members(self, message: str) -> Dict[str, str]:
+        started = time.monotonic()
+        futures = {}
+        for member in self.members:
+            emit("progress", {"tool": member.agent.name, "stage": f"Running {member.agent.name}", "status": "started"})
+            # Copy the context so tool progress and trace spans from member threads reach the current listener and trace
+            context = contextvars.copy_context()
+            futures[member.agent.name] = (
+                member,
+                _executor.submit(context.run, member.agent.run, self._member_task(member, message)),
+            )
+
+        outputs = {}
+        for name, (member, future) in futures.items():
+            try:
+                # Timeouts are measured from the common start, not from when we begin waiting
+                remaining = max(0.0, started + member.timeout - time.monotonic())
+                content = future.result(timeout=remaining).content
+                status = "completed"
+            except FutureTimeoutError:
+                logger.warning(f"{name} timed out after {member.timeout}s")
+                content = f"{name} did not respond within {member.timeout:g} seconds."
+                status = "timed_out"
+            except Exception as e:
+                logger.error(f"{name} failed: {e}", exc_info=True)
+                content = f"{name} failed: {e}"
+                status = "failed"
+            outputs[name] = content if isinstance(content, str) else str(content)
+            emit("progress", {"tool": name, "stage": f"Running {name}", "status": status})
+        return outputs
+
+    async def arun_members(self, message: str) -> Dict[str, str]:
+        """Async `run_members`: members run as concurrent tasks on the current event loop."""
+        with span("team_members", "team", members=[m.agent.name for m in self.members]):
+            results = await asyncio.gather(*(self._arun_member(member, message) for member in self.members))
+        return dict(results)
+
+    async def _arun_member(self, member: Member, message: str) -> Tuple[str, str]:
+        name = member.agent.name
+        emit("progress", {"tool": name, "stage": f"Running {name}", "status": "started"})
+        try:
+            content = (await asyncio.wait_for(member.agent.arun(self._member_task(member, message)), timeout=member.timeout)).content
+            status = "completed"
+        except asyncio.TimeoutError:
+            logger.warning(f"{name} timed out after {member.timeout}s")
+            content = f"{name} did not respond within {member.timeout:g} seconds."
+            status = "timed_out"
+        except Exception as e:
+            logger.error(f"{name} failed: {e}", exc_info=True)
+            content = f"{name} failed: {e}"
+            status = "failed"
+        emit("progress", {"tool": name, "stage": f"Running {name}", "status": status})
+        return name, content if isinstance(content, str) else str(content)
+
+    def synthesis_prompt(self, message: str, outputs: Dict[str, str]) -> str:
+        reports = "\n\n".join(f'<member_report name="{name}">\n{output}\n</member_report>' for name, output in outputs.items())
+        return f"{message}\n\nYour team has already gathered the following reports:\n\n{reports}"
+
+    def run(self, message: str, *, stream: bool = False, **kwargs) -> Union[RunResponse, Iterator[RunResponse]]:
+        if stream:
+            return self._run_stream(message, **kwargs)
+        outputs = self.run_members(message)
+        return self.leader.run(self.synthesis_prompt(message, outputs), **kwargs)
+
+    def _run_stream(self, message: str, **kwargs) -> Iterator[RunResponse]:
+        outputs = self.run_members(message)
+        yield from run_chunks(self.leader.run(self.synthesis_prompt(message, outputs), stream=True, **kwargs))
+
+    async def arun(self, message: str, *, stream: bool = False, **kwargs) -> Union[RunResponse, AsyncIterator[RunResponse]]:
+        if stream:
+            return self._arun_stream(message, **kwargs)
+        outputs = await self.arun_members(message)
+        return await self.leader.arun(self.synthesis_prompt(message, outputs), **kwargs)
+
+    async def _arun_stream(self, message: str, **kwargs) -> AsyncIterator[RunResponse]:
+        outputs = await self.arun_members(message)
+        async for chunk in arun_chunks(await self.leader.arun(self.synthesis_prompt(message, outputs), stream=True, **kwargs)):
+            yield chunk
@@ -0,0 +1,116 @@
+"""Deterministic market-data prefetch for analysis prompts.
+
+Instead of letting the model discover, one tool-call round trip at a time, that
+it needs the price, fundamentals, analyst recommendations, news and technical
+indicators, all of them are fetched concurrently up front and handed to the
+model as structured context. Fetches go through the cached toolkits, so they
+also warm the tool cache for any follow-up tool calls the agents still make.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Optional
+
+from cached_tools import ERROR_PREFIXES
+from indicators import TechnicalIndicatorTools
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_MARKET_DATA", "1").lower() in ("1", "true", "yes")
+PREFETCH_TIMEOUT = float(os.environ.get("PREFETCH_TIMEOUT", 20))
+
+# Datasets fetched per analysis type, as tool function names
+PREFETCH_DATASETS = {
+    "Complete Analysis": ("get_current_stock_price", "get_stock_fundamentals", "get_analyst_recommendations", "get_company_news", "compute_technical_indicators"),
+    "News Impact": ("get_current_stock_price", "get_company_news"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="prefetch")
+_fetchers: Optional[Dict[str, Callable[[str], str]]] = None
+_fetchers_lock = threading.Lock()
+
+
+def get_fetchers() -> Dict[str, Callable[[str], str]]:
+    """Tool functions by name; built on first use, since the yfinance toolkit is slow to import."""
+    global _fetchers
+    if _fetchers is None:
+        with _fetchers_lock:
+            if _fetchers is None:
+                from toolkits import CachedYFinanceTools
+                tools = [CachedYFinanceTools(enable_all=True), TechnicalIndicatorTools()]
+                _fetchers = {name: function.entrypoint for toolkit in tools for name, function in toolkit.functions.items()}
+    return _fetchers
+
+
+def prefetch_stock_data(stock_symbol: str, datasets: Iterable[str], timeout: float = PREFETCH_TIMEOUT) -> Dict[str, str]:
+    """Fetch the given datasets concurrently; datasets that fail or time out are left out."""
+    fetchers = get_fetchers()
+    futures = {name: _executor.submit(fetchers[name], stock_symbol) for name in datasets}
+    wait(futures.values(), timeout=timeout)
+    return _collect(stock_symbol, futures)
+
+
+async def aprefetch_stock_data(stock_symbol: str, datasets: Iterable[str], timeout: float = PREFETCH_TIMEOUT) -> Dict[str, str]:
+    """Async `prefetch_stock_data`: the fetches still run on the prefetch pool, but waiting does not hold a thread."""
+    fetchers = get_fetchers()
+    futures = {name: _executor.submit(fetchers[name], stock_symbol) for name in datasets}
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(f) for f in futures.values()], timeout=timeout)
+    return _collect(stock_symbol, futures)
+
+
+def _collect(stock_symbol: str, futures: Dict[str, Future]) -> Dict[str, str]:
+    data = {}
+    for name, future in futures.items():
+        if not future.done():
+            logger.warning(f"Prefetch of {name} for {stock_symbol} timed out")
+            continue
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.warning(f"Prefetch of {name} for {stock_symbol} failed: {e}")
+            continue
+        if isinstance(result, str) and not result.startswith(ERROR_PREFIXES):
+            data[name] = result
+    return data
+
+
+def format_prefetch_context(stock_symbol: str, data: Dict[str, str]) -> str:
+    sections = "\n".join(f'<dataset name="{name}">\n{value}\n</dataset>' for name, value in data.items())
+    return f'<market_data symbol="{stock_symbol}">\n{sections}\n</market_data>'
+
+
+def analysis_context(stock_symbol: str, analysis_type: str, extra: Optional[str] = None, skip: Iterable[str] = ()) -> Optional[str]:
+    """Build the prompt context for an analysis: prefetched datasets plus any caller-supplied context.
+
+    Datasets in `skip` are not fetched, e.g. because `extra` already has that data.
+    """
+    if analysis_type == "Comparison":
+        # Imported here: comparison.py builds on the screener, which imports this module
+        from comparison import comparison_context
+        return comparison_context(stock_symbol, extra)
+    data = {}
+    if PREFETCH_ENABLED and analysis_type in PREFETCH_DATASETS:
+        data = prefetch_stock_data(stock_symbol, [d for d in PREFETCH_DATASETS[analysis_type] if d not in skip])
+    return _join_context(stock_symbol, data, extra)
+
+
+async def aanalysis_context(stock_symbol: str, analysis_type: str, extra: Optional[str] = None, skip: Iterable[str] = ()) -> Optional[str]:
+    if analysis_type == "Comparison":
+        from comparison import acomparison_context
+        return await acomparison_context(stock_symbol, extra)
+    data = {}
+    if PREFETCH_ENABLED and analysis_type in PREFETCH_DATASETS:
+        data = await aprefetch_stock_data(stock_symbol, [d for d in PREFETCH_DATASETS[analysis_type] if d not in skip])
+    return _join_context(stock_symbol, data, extra)
+
+
+def _join_context(stock_symbol: str, data: Dict[str, str], extra: Optional[str]) -> Optional[str]:
+    parts = []
+    if data:
+        parts.append(format_prefetch_context(stock_symbol, data))
+    if extra:
+        parts.append(extra)
+    return "\n\n".join(parts) or None
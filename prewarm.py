@@ -0,0 +1,223 @@
+"""Background pre-warming of reports for popular tickers.
+
+A few tickers get most of the traffic, so their reports are regenerated ahead
+of demand instead of on the first request after they expire. The hot set is
+the seed tickers (the quick-pick buttons in main.py, or PREWARM_TICKERS) plus
+the most requested (ticker, analysis type) pairs, counted with exponential
+decay. Requests only bump an in-memory count; the pre-warm thread flushes the
+counts to SQLite on every pass, so every server worker contributes to the same
+demand without a write transaction on the request path.
+
+Every PREWARM_INTERVAL seconds the `Prewarmer` thread refreshes the market
+data of the hot tickers through the cached tools, then regenerates each hot
+report whose remaining lifetime has dropped below its lead time, one at a
+time so pre-warming never takes more than one analysis slot.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache import DEFAULT_CACHE_DIR, SQLiteStore
+from prefetch import PREFETCH_DATASETS, PREFETCH_ENABLED, prefetch_stock_data
+from report_cache import ReportCache, canonical_symbol, report_ttl
+from tracing import PREWARMS, span
+
+logger = logging.getLogger(__name__)
+
+PREWARM_ENABLED = os.environ.get("PREWARM", "1").lower() in ("1", "true", "yes")
+SEED_TICKERS = [canonical_symbol(t) for t in os.environ.get("PREWARM_TICKERS", "AAPL,MSFT,GOOGL,TSLA").split(",") if t.strip()]
+PREWARM_ANALYSIS_TYPES = [t.strip() for t in os.environ.get("PREWARM_ANALYSIS_TYPES", "Complete Analysis,News Impact").split(",") if t.strip()]
+PREWARM_INTERVAL = float(os.environ.get("PREWARM_INTERVAL", 60))
+# Observed pairs added to the seeds, and the decayed request count they need to qualify
+PREWARM_TOP_N = int(os.environ.get("PREWARM_TOP_N", 8))
+PREWARM_MIN_DEMAND = float(os.environ.get("PREWARM_MIN_DEMAND", 3))
+DEMAND_HALF_LIFE = float(os.environ.get("PREWARM_DEMAND_HALF_LIFE", 6 * 3600))
+# Distinct pairs counted in memory between flushes
+DEMAND_MAX_PENDING = int(os.environ.get("PREWARM_DEMAND_MAX_PENDING", 10000))
+# A report is regenerated once less than this fraction of its TTL (and at least two intervals) is left
+PREWARM_LEAD = float(os.environ.get("PREWARM_LEAD", 0.2))
+
+
+class DemandTracker:
+    """Exponentially decayed request counts per (ticker, analysis type), shared across processes.
+
+    `record` only updates this process's pending counts; `flush` adds them to the shared store.
+    """
+
+    def __init__(self, path: Optional[str] = None, half_life: float = DEMAND_HALF_LIFE):
+        path = path or os.environ.get("DEMAND_STORE_PATH", os.path.join(DEFAULT_CACHE_DIR, "demand.sqlite3"))
+        self._store = SQLiteStore(path, table="demand")
+        self.half_life = half_life
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, since: float, now: float) -> float:
+        return score * math.pow(0.5, max(0.0, now - since) / self.half_life)
+
+    def _add(self, current: Optional[Dict[str, float]], score: float, at: float) -> Dict[str, float]:
+        """`current` counts plus `score` counted at `at`, both decayed to the later of the two times."""
+        if current is None:
+            return {"score": score, "updated": at}
+        now = max(at, current["updated"])
+        return {"score": self._decayed(current["score"], current["updated"], now) + self._decayed(score, at, now), "updated": now}
+
+    def record(self, stock_symbol: str, analysis_type: str) -> None:
+        key = ReportCache.key(stock_symbol, analysis_type)
+        now = time.time()
+        with self._lock:
+            # Bounded in case nothing flushes (pre-warming off); demand is only a hint
+            if key in self._pending or len(self._pending) < DEMAND_MAX_PENDING:
+                self._pending[key] = self._add(self._pending.get(key), 1.0, now)
+
+    def flush(self) -> int:
+        """Add the pending counts to the shared store; returns how many pairs were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        written = 0
+        for key, counts in pending.items():
+            try:
+                self._store.update(key, lambda current, counts=counts: self._add(current, counts["score"], counts["updated"]))
+                written += 1
+            except Exception as e:
+                # Keep the count for the next flush
+                logger.warning(f"Could not record demand for {key}: {e}")
+                with self._lock:
+                    self._pending[key] = self._add(self._pending.get(key), counts["score"], counts["updated"])
+        return written
+
+    def top(self, n: int, min_score: float = 0.0) -> List[Tuple[str, str, float]]:
+        """The `n` most requested (ticker, analysis type, score) triples, most requested first, unflushed counts included."""
+        now = time.time()
+        with self._lock:
+            counts = [(key, dict(value)) for key, value in self._pending.items()]
+        counts += [(key, entry.value) for key, entry in self._store.items()]
+        scores: Dict[str, float] = {}
+        for key, value in counts:
+            scores[key] = scores.get(key, 0.0) + self._decayed(value["score"], value["updated"], now)
+        scored = []
+        for key, score in scores.items():
+            if score >= min_score:
+                stock_symbol, analysis_type = key.split("|", 1)
+                scored.append((stock_symbol, analysis_type, round(score, 2)))
+        scored.sort(key=lambda item: item[2], reverse=True)
+        return scored[:n]
+
+    def purge(self) -> int:
+        # After ten half-lives a pair's score is below a thousandth of what it was
+        return self._store.purge(10 * self.half_life)
+
+
+class Prewarmer:
+    """Background thread keeping hot reports fresh; `refresh(symbol, analysis_type)` regenerates one report."""
+
+    def __init__(
+        self,
+        refresh: Callable[[str, str], Any],
+        report_cache: ReportCache,
+        demand: Optional["DemandTracker"] = None,
+        seeds: Optional[List[str]] = None,
+        analysis_types: Optional[List[str]] = None,
+        interval: float = PREWARM_INTERVAL,
+        top_n: int = PREWARM_TOP_N,
+        lead: float = PREWARM_LEAD,
+    ):
+        self.refresh = refresh
+        self.report_cache = report_cache
+        self.demand = demand or get_demand_tracker()
+        self.seeds = SEED_TICKERS if seeds is None else seeds
+        self.analysis_types = PREWARM_ANALYSIS_TYPES if analysis_types is None else analysis_types
+        self.interval = interval
+        self.top_n = top_n
+        self.lead = lead
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def hot_set(self) -> List[Tuple[str, str]]:
+        pairs = [(symbol, analysis_type) for symbol in self.seeds for analysis_type in self.analysis_types]
+        for symbol, analysis_type, _ in self.demand.top(self.top_n, PREWARM_MIN_DEMAND):
+            if analysis_type in PREFETCH_DATASETS:
+                pairs.append((symbol, analysis_type))
+        return list(dict.fromkeys(pairs))
+
+    def due(self, stock_symbol: str, analysis_type: str) -> bool:
+        entry = self.report_cache.peek(stock_symbol, analysis_type)
+        if entry is None:
+            return True
+        ttl = report_ttl(analysis_type)
+        return entry.age >= ttl - max(self.lead * ttl, 2 * self.interval)
+
+    def run_once(self) -> Dict[str, Any]:
+        """One pass: flush request demand, warm market data, then regenerate the hot reports that are due."""
+        self.demand.flush()
+        pairs = self.hot_set()
+        summary: Dict[str, Any] = {"hot": len(pairs), "refreshed": [], "failed": [], "started_at": time.time()}
+        with span("prewarm", "prewarm", new_trace=True, hot=len(pairs)):
+            if PREFETCH_ENABLED:
+                for symbol in dict.fromkeys(symbol for symbol, _ in pairs):
+                    datasets = dict.fromkeys(d for s, t in pairs if s == symbol for d in PREFETCH_DATASETS.get(t, ()))
+                    prefetch_stock_data(symbol, datasets)
+            for symbol, analysis_type in pairs:
+                if self._stop.is_set():
+                    break
+                if not self.due(symbol, analysis_type):
+                    continue
+                try:
+                    self.refresh(symbol, analysis_type)
+                    summary["refreshed"].append(f"{symbol} ({analysis_type})")
+                    PREWARMS.inc(outcome="refreshed")
+                except Exception as e:
+                    logger.warning(f"Pre-warming {symbol} ({analysis_type}) failed: {e}")
+                    summary["failed"].append(f"{symbol} ({analysis_type})")
+                    PREWARMS.inc(outcome="failed")
+        self.demand.purge()
+        summary["finished_at"] = time.time()
+        self.last_run = summary
+        if summary["refreshed"] or summary["failed"]:
+            logger.info(f"Pre-warmed {len(summary['refreshed'])} of {len(pairs)} hot reports, {len(summary['failed'])} failed")
+        return summary
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Pre-warm pass failed: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+        self.demand.flush()
+
+    def start(self) -> "Prewarmer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+            self._thread.start()
+            logger.info(f"Pre-warming {', '.join(self.seeds)} and up to {self.top_n} popular reports every {self.interval:g}s")
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval": self.interval,
+            "hot": [{"stock_symbol": s, "analysis_type": t} for s, t in self.hot_set()],
+            "demand": [{"stock_symbol": s, "analysis_type": t, "score": score} for s, t, score in self.demand.top(self.top_n * 2)],
+            "last_run": self.last_run,
+        }
+
+
+_demand: Optional[DemandTracker] = None
+_demand_lock = threading.Lock()
+
+
+def get_demand_tracker() -> DemandTracker:
+    """Process-wide demand tracker; set DEMAND_STORE_PATH to choose where counts are kept."""
+    global _demand
+    if _demand is None:
+        with _demand_lock:
+            if _demand is None:
+                _demand = DemandTracker()
+    return _demand
@@ -0,0 +1,63 @@
+"""Cache for generated analysis reports.
+
+Reports are keyed on the canonical ticker plus the analysis type. Freshness is
+decided at read time, so a report written overnight automatically goes stale
+sooner once the US market opens.
+"""
+import os
+from datetime import datetime, time as dtime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from cache import DEFAULT_CACHE_DIR, CacheEntry, LRUCache, SQLiteStore, TieredCache
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+# TTLs in seconds: (outside market hours, during market hours)
+REPORT_TTLS = {
+    "Complete Analysis": (6 * 3600, 30 * 60),
+    "News Impact": (60 * 60, 10 * 60),
+    "Comparison": (6 * 3600, 30 * 60),
+}
+DEFAULT_TTL = (60 * 60, 15 * 60)
+
+
+def canonical_symbol(stock_symbol: str) -> str:
+    return stock_symbol.strip().upper()
+
+
+def is_market_hours(now: Optional[datetime] = None) -> bool:
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def report_ttl(analysis_type: str, now: Optional[datetime] = None) -> int:
+    closed_ttl, open_ttl = REPORT_TTLS.get(analysis_type, DEFAULT_TTL)
+    return open_ttl if is_market_hours(now) else closed_ttl
+
+
+class ReportCache:
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256):
+        path = path or os.environ.get("REPORT_CACHE_PATH", os.path.join(DEFAULT_CACHE_DIR, "reports.sqlite3"))
+        self._cache = TieredCache(LRUCache(max_entries), SQLiteStore(path, table="reports"))
+
+    @staticmethod
+    def key(stock_symbol: str, analysis_type: str) -> str:
+        return f"{canonical_symbol(stock_symbol)}|{analysis_type}"
+
+    def get(self, stock_symbol: str, analysis_type: str) -> Optional[CacheEntry]:
+        return self._cache.get(self.key(stock_symbol, analysis_type), ttl=report_ttl(analysis_type))
+
+    def peek(self, stock_symbol: str, analysis_type: str) -> Optional[CacheEntry]:
+        """The newest stored report whatever its age, read from disk so writes by other processes count."""
+        key = self.key(stock_symbol, analysis_type)
+        store = self._cache.store
+        return store.get(key) if store is not None else self._cache.memory.get(key)
+
+    def set(self, stock_symbol: str, analysis_type: str, content: str) -> CacheEntry:
+        return self._cache.set(self.key(stock_symbol, analysis_type), content)
+
+    def invalidate(self, stock_symbol: str, analysis_type: str) -> None:
+        self._cache.delete(self.key(stock_symbol, analysis_type))
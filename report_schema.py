@@ -0,0 +1,217 @@
+"""Typed schema for analysis reports and its markdown rendering.
+
+With REPORT_FORMAT=json (agents.py) the report agents answer with a
+`StockReport` instead of markdown tables. Only the data is generated, which
+takes a fraction of the output tokens, and the stored report can be
+validated, cached and compared field by field. `render_markdown` turns it
+into the same kind of tabular report for clients that want to display one.
+"""
+from typing import Any, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field, ValidationError
+
+Signal = Literal["Strong Buy", "Buy", "Hold", "Sell", "Strong Sell"]
+Impact = Literal["Positive", "Neutral", "Negative"]
+Level = Literal["Low", "Medium", "High"]
+
+
+class PriceData(BaseModel):
+    price: Optional[float] = None
+    currency: str = "USD"
+    change_percent: Optional[float] = Field(None, description="Change since the previous close, in percent")
+    day_low: Optional[float] = None
+    day_high: Optional[float] = None
+    week_52_low: Optional[float] = None
+    week_52_high: Optional[float] = None
+    market_cap: Optional[str] = Field(None, description="e.g. 3.2T")
+
+
+class Metric(BaseModel):
+    name: str
+    value: str
+    benchmark: Optional[str] = Field(None, description="Industry average or other comparison")
+
+
+class AnalystConsensus(BaseModel):
+    rating: Optional[Signal] = None
+    analysts: Optional[int] = Field(None, description="Number of analysts covering the stock")
+    buy: Optional[int] = Field(None, description="Buy and Strong Buy ratings")
+    hold: Optional[int] = None
+    sell: Optional[int] = Field(None, description="Sell and Strong Sell ratings")
+    target_low: Optional[float] = None
+    target_mean: Optional[float] = None
+    target_high: Optional[float] = None
+    timeframe: Optional[str] = Field(None, description="Horizon of the price targets, e.g. 12 months")
+
+
+class Indicator(BaseModel):
+    name: str
+    value: str
+    signal: Optional[Signal] = None
+
+
+class NewsItem(BaseModel):
+    headline: str
+    date: Optional[str] = None
+    source: Optional[str] = None
+    impact: Impact = "Neutral"
+    summary: Optional[str] = Field(None, description="One sentence on why it matters for the stock")
+
+
+class Risk(BaseModel):
+    risk: str
+    severity: Level = "Medium"
+    detail: Optional[str] = None
+
+
+class Action(BaseModel):
+    horizon: str = Field(..., description="Short-term, Medium-term or Long-term")
+    recommendation: Signal
+    entry_price: Optional[float] = Field(None, description="Suggested entry point, if any")
+    timing: Optional[str] = Field(None, description="When to act and on what trigger")
+
+
+class Source(BaseModel):
+    title: str
+    url: Optional[str] = None
+    date: Optional[str] = None
+
+
+class StockReport(BaseModel):
+    symbol: str
+    summary: str = Field(..., description="Two or three sentences with the overall view")
+    price: Optional[PriceData] = None
+    fundamentals: List[Metric] = Field(default_factory=list)
+    analyst_consensus: Optional[AnalystConsensus] = None
+    technicals: List[Indicator] = Field(default_factory=list)
+    news: List[NewsItem] = Field(default_factory=list)
+    risks: List[Risk] = Field(default_factory=list)
+    action_plan: List[Action] = Field(default_factory=list)
+    sources: List[Source] = Field(default_factory=list)
+
+
+class NewsUpdate(BaseModel):
+    """The assessment of newly published articles, merged into a stored News Impact report (news_store.py)."""
+
+    summary: str = Field(..., description="Two or three sentences with the overall news picture, previous and new")
+    news: List[NewsItem] = Field(default_factory=list, description="One item per new article")
+    risks: List[Risk] = Field(default_factory=list, description="Risks the new articles raise, if any")
+
+
+class ComparisonMetric(BaseModel):
+    name: str
+    values: Dict[str, str] = Field(..., description="The metric's value for each ticker, keyed by symbol")
+    leader: Optional[str] = Field(None, description="Symbol that looks best on this metric, if any")
+
+
+class Ranking(BaseModel):
+    symbol: str
+    recommendation: Signal
+    rationale: str = Field(..., description="One sentence on why it ranks here")
+
+
+class ComparisonReport(BaseModel):
+    """One report comparing several tickers side by side (the Comparison analysis type, comparison.py)."""
+
+    symbols: List[str]
+    summary: str = Field(..., description="Two or three sentences on how the stocks compare")
+    metrics: List[ComparisonMetric] = Field(default_factory=list)
+    rankings: List[Ranking] = Field(default_factory=list, description="Most attractive first")
+    risks: List[Risk] = Field(default_factory=list)
+    verdict: str = Field(..., description="Which stock is preferred, and for what kind of investor")
+    sources: List[Source] = Field(default_factory=list)
+
+
+def report_content(content: Any) -> Union[str, Dict[str, Any]]:
+    """What to store for an agent's answer: the report as a dict, or the text if it is not a report."""
+    if isinstance(content, BaseModel):
+        return content.model_dump(mode="json", exclude_none=True)
+    return content if isinstance(content, str) else str(content)
+
+
+def _number(value: Optional[float], currency: str = "") -> str:
+    if value is None:
+        return "-"
+    prefix = "$" if currency == "USD" else ""
+    suffix = f" {currency}" if currency and currency != "USD" else ""
+    return f"{prefix}{value:,.2f}{suffix}"
+
+
+def _table(headers: List[str], rows: List[List[Any]]) -> str:
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    for row in rows:
+        cells = ("-" if cell is None or cell == "" else str(cell).replace("|", "\\|").replace("\n", " ") for cell in row)
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def render_comparison(report: ComparisonReport) -> str:
+    sections = [f"## {' vs '.join(report.symbols)} Comparison", report.summary]
+    if report.metrics:
+        sections.append("### Side by Side\n\n" + _table(
+            ["Metric"] + report.symbols + ["Leader"],
+            [[m.name] + [m.values.get(symbol) for symbol in report.symbols] + [m.leader] for m in report.metrics]))
+    if report.rankings:
+        sections.append("### Ranking\n\n" + _table(
+            ["Rank", "Symbol", "Recommendation", "Rationale"],
+            [[i, r.symbol, r.recommendation, r.rationale] for i, r in enumerate(report.rankings, start=1)]))
+    if report.risks:
+        sections.append("### Risk Assessment\n\n" + _table(
+            ["Risk", "Severity", "Detail"], [[r.risk, r.severity, r.detail] for r in report.risks]))
+    sections.append("### Verdict\n\n" + report.verdict)
+    if report.sources:
+        sections.append("### Sources\n\n" + _table(
+            ["Source", "Date"], [[f"[{s.title}]({s.url})" if s.url else s.title, s.date] for s in report.sources]))
+    return "\n\n".join(sections) + "\n"
+
+
+def render_markdown(report: Union[StockReport, ComparisonReport, Dict[str, Any], str]) -> str:
+    """Render a report as markdown; text (reports stored before REPORT_FORMAT=json) is returned as is."""
+    if isinstance(report, str):
+        return report
+    if isinstance(report, dict):
+        try:
+            report = (ComparisonReport if "symbols" in report else StockReport).model_validate(report)
+        except ValidationError:
+            return _table(["Field", "Value"], [[key, value] for key, value in report.items()])
+    if isinstance(report, ComparisonReport):
+        return render_comparison(report)
+
+    sections = [f"## {report.symbol} Analysis", report.summary]
+    currency = report.price.currency if report.price is not None else "USD"
+    if report.price is not None:
+        p = report.price
+        change = f"{p.change_percent:+.2f}%" if p.change_percent is not None else None
+        day_range = f"{_number(p.day_low, currency)} - {_number(p.day_high, currency)}" if p.day_low is not None else None
+        year_range = f"{_number(p.week_52_low, currency)} - {_number(p.week_52_high, currency)}" if p.week_52_low is not None else None
+        rows = [["Price", _number(p.price, currency)], ["Change", change], ["Day Range", day_range],
+                ["52-Week Range", year_range], ["Market Cap", p.market_cap]]
+        sections.append("### Price Data\n\n" + _table(["Metric", "Value"], [row for row in rows if row[1]]))
+    if report.fundamentals:
+        sections.append("### Stock Fundamentals\n\n" + _table(
+            ["Metric", "Value", "Comparison"], [[m.name, m.value, m.benchmark] for m in report.fundamentals]))
+    if report.analyst_consensus is not None:
+        a = report.analyst_consensus
+        counts = [a.buy, a.hold, a.sell]
+        rows = [["Consensus", a.rating], ["Analysts", a.analysts],
+                ["Buy / Hold / Sell", " / ".join(str(c or 0) for c in counts) if any(c is not None for c in counts) else None],
+                ["Target Low", a.target_low and _number(a.target_low, currency)], ["Target Mean", a.target_mean and _number(a.target_mean, currency)],
+                ["Target High", a.target_high and _number(a.target_high, currency)], ["Timeframe", a.timeframe]]
+        sections.append("### Analyst Consensus\n\n" + _table(["Metric", "Value"], [row for row in rows if row[1]]))
+    if report.technicals:
+        sections.append("### Technical Analysis\n\n" + _table(
+            ["Indicator", "Value", "Signal"], [[t.name, t.value, t.signal] for t in report.technicals]))
+    if report.news:
+        sections.append("### News Impact\n\n" + _table(
+            ["Date", "Headline", "Source", "Impact", "Why It Matters"], [[n.date, n.headline, n.source, n.impact, n.summary] for n in report.news]))
+    if report.risks:
+        sections.append("### Risk Assessment\n\n" + _table(
+            ["Risk", "Severity", "Detail"], [[r.risk, r.severity, r.detail] for r in report.risks]))
+    if report.action_plan:
+        sections.append("### Action Plan\n\n" + _table(
+            ["Horizon", "Recommendation", "Entry Point", "Timing"],
+            [[a.horizon, a.recommendation, a.entry_price and _number(a.entry_price, currency), a.timing] for a in report.action_plan]))
+    if report.sources:
+        sections.append("### Sources\n\n" + _table(
+            ["Source", "Date"], [[f"[{s.title}]({s.url})" if s.url else s.title, s.date] for s in report.sources]))
+    return "\n\n".join(sections) + "\n"
@@ -0,0 +1,365 @@
+"""Latency-aware routing and hedged requests across model providers.
+
+`RoutedModel` is an agno model that fronts several real models (Groq and
+Gemini here). Each provider round trip goes to the fastest healthy candidate
+according to a shared `LatencyStats` window of recent p95 latencies and error
+rates, fails over to the next candidate on a provider error, and in "hedge"
+mode fires a duplicate request at the next candidate once the first has been
+outstanding for longer than its own p95. Whichever answers first wins.
+
+Providers format tool-call history differently, so once a run has executed a
+tool call it stays on the provider that requested it until the run ends.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from tracing import MODEL_ROUTES
+
+logger = logging.getLogger(__name__)
+
+# "off" pins every agent to its preferred model, "route" picks the fastest healthy one,
+# "hedge" also duplicates slow requests to the runner-up
+ROUTING_MODE = os.environ.get("MODEL_ROUTING", "route")
+STATS_WINDOW = float(os.environ.get("MODEL_STATS_WINDOW", 300))
+MIN_SAMPLES = int(os.environ.get("MODEL_MIN_SAMPLES", 5))
+MAX_ERROR_RATE = float(os.environ.get("MODEL_MAX_ERROR_RATE", 0.5))
+# Never hedge sooner than this, even if a provider's p95 is tiny
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 1.0))
+
+_END = object()
+
+
+def model_key(model: Model) -> str:
+    return f"{model.provider}:{model.id}" if getattr(model, "provider", None) else model.id
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LatencyStats:
+    """Sliding window of call outcomes per model, shared by every routed model in the process.
+
+    Latencies are kept per call kind: "invoke" is the full response time of a
+    non-streamed call, "stream" the time to the first chunk of a streamed one.
+    """
+
+    def __init__(self, window: float = STATS_WINDOW, max_samples: int = 500):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[float, float, bool]]] = {}
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+
+    def record(self, key: str, kind: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            samples = self._samples.setdefault((key, kind), deque(maxlen=self._max_samples))
+            samples.append((time.monotonic(), seconds, ok))
+
+    def _recent(self, key: str, kind: str) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            samples = self._samples.get((key, kind), ())
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            return list(samples)
+
+    def p95(self, key: str, kind: str) -> Optional[float]:
+        """p95 latency of successful calls, or None until there are MIN_SAMPLES of them."""
+        latencies = [seconds for _, seconds, ok in self._recent(key, kind) if ok]
+        return _percentile(latencies, 0.95) if len(latencies) >= MIN_SAMPLES else None
+
+    def error_rate(self, key: str) -> float:
+        outcomes = [ok for kind in ("invoke", "stream") for _, _, ok in self._recent(key, kind)]
+        return outcomes.count(False) / len(outcomes) if len(outcomes) >= MIN_SAMPLES else 0.0
+
+    def healthy(self, key: str) -> bool:
+        return self.error_rate(key) < MAX_ERROR_RATE
+
+    def rank(self, models: List[Model], kind: str) -> List[Model]:
+        """Healthy models first, then by p95; models without enough samples are tried first so they get some."""
+        def sort_key(indexed: Tuple[int, Model]):
+            index, model = indexed
+            p95 = self.p95(model_key(model), kind)
+            return (not self.healthy(model_key(model)), p95 or 0.0, index)
+        return [model for _, model in sorted(enumerate(models), key=sort_key)]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            keys = {key for key, _ in self._samples}
+        result = {}
+        for key in sorted(keys):
+            result[key] = {"healthy": self.healthy(key), "error_rate": round(self.error_rate(key), 3)}
+            for kind in ("invoke", "stream"):
+                latencies = [seconds for _, seconds, ok in self._recent(key, kind) if ok]
+                result[key][kind] = {
+                    "samples": len(latencies),
+                    "p50": round(_percentile(latencies, 0.5), 3) if latencies else None,
+                    "p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+                }
+        return result
+
+
+_stats = LatencyStats()
+
+
+def get_latency_stats() -> LatencyStats:
+    return _stats
+
+
+@dataclass
+class Routed:
+    """A raw provider response tagged with the model that produced it, so parsing goes to the right provider."""
+    model: Model
+    raw: Any
+
+
+def _spawn(fn: Callable[[], Any]) -> Future:
+    """Run `fn` on its own thread in a copy of the caller's context (so its spans join the caller's trace)."""
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def worker():
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=worker, daemon=True).start()
+    return future
+
+
+@dataclass
+class RoutedModel(Model):
+    id: str = "routed"
+    name: str = "Router"
+    provider: str = "Router"
+    # In order of preference; ties (e.g. no samples yet) go to the earlier model
+    candidates: List[Model] = field(default_factory=list)
+    mode: str = ROUTING_MODE
+    stats: LatencyStats = field(default_factory=get_latency_stats)
+
+    # Model the current run is pinned to after a tool call, and the model behind the latest response
+    _pinned: Optional[Model] = None
+    _last: Optional[Model] = None
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.id = "|".join(model.id for model in self.candidates)
+
+    # --- Candidate selection ---
+
+    def _ranked(self, messages: List[Message], kind: str) -> List[Model]:
+        if not any(message.role == self.tool_message_role for message in messages):
+            # A run without tool results yet is free to move between providers
+            self._pinned = None
+        if self._pinned is not None:
+            return [self._pinned]
+        if self.mode == "off":
+            return self.candidates[:1]
+        return self.stats.rank(self.candidates, kind)
+
+    def _hedge_delay(self, model: Model, kind: str) -> Optional[float]:
+        if self.mode != "hedge":
+            return None
+        p95 = self.stats.p95(model_key(model), kind)
+        return max(p95, HEDGE_MIN_DELAY) if p95 is not None else None
+
+    def _served(self, model: Model, outcome: str) -> None:
+        self._last = model
+        MODEL_ROUTES.inc(model=model_key(model), outcome=outcome)
+
+    # --- Sync calls ---
+
+    def _call(self, candidates: List[Model], kind: str, start: Callable[[Model], Any], discard: Callable[[Any], None] = lambda result: None) -> Tuple[Model, Any]:
+        """Return the first successful `start(model)`, failing over on errors and hedging past the p95.
+
+        `discard` releases the result of a hedge that lost the race (e.g. closes its stream).
+        """
+        remaining = list(candidates)
+        delay = self._hedge_delay(remaining[0], kind)
+        if delay is None or len(remaining) == 1:
+            return self._call_in_order(remaining, kind, start)
+
+        pending: Dict[Future, Tuple[Model, float]] = {}
+
+        def launch() -> None:
+            model = remaining.pop(0)
+            pending[_spawn(lambda: start(model))] = (model, time.perf_counter())
+
+        launch()
+        error: Optional[BaseException] = None
+        while pending:
+            done, _ = wait(pending, timeout=delay if remaining else None, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Hedging {kind} request to {model_key(remaining[0])} after {delay:.2f}s")
+                MODEL_ROUTES.inc(model=model_key(remaining[0]), outcome="hedge_sent")
+                launch()
+                continue
+            for future in done:
+                model, started = pending.pop(future)
+                self.stats.record(model_key(model), kind, time.perf_counter() - started, future.exception() is None)
+                if future.exception() is None:
+                    for loser, (loser_model, loser_started) in pending.items():
+                        # A sync request cannot be interrupted; record its latency and release it once it lands
+                        loser.add_done_callback(self._late_result(loser_model, kind, loser_started, discard))
+                    self._served(model, self._outcome(model, candidates, error))
+                    return model, future.result()
+                error = future.exception()
+                logger.warning(f"{model_key(model)} failed: {error}")
+            if not pending and remaining:
+                launch()
+        raise error
+
+    def _call_in_order(self, candidates: List[Model], kind: str, start: Callable[[Model], Any]) -> Tuple[Model, Any]:
+        for attempt, model in enumerate(candidates):
+            started = time.perf_counter()
+            try:
+                result = start(model)
+            except Exception as e:
+                self.stats.record(model_key(model), kind, time.perf_counter() - started, False)
+                if attempt == len(candidates) - 1:
+                    raise
+                logger.warning(f"{model_key(model)} failed, failing over to {model_key(candidates[attempt + 1])}: {e}")
+                continue
+            self.stats.record(model_key(model), kind, time.perf_counter() - started, True)
+            self._served(model, "first_choice" if attempt == 0 else "failover")
+            return model, result
+        raise RuntimeError("No candidate models configured")
+
+    @staticmethod
+    def _outcome(model: Model, candidates: List[Model], error: Optional[BaseException]) -> str:
+        if model is candidates[0]:
+            return "first_choice"
+        return "failover" if error is not None else "hedge"
+
+    def _late_result(self, model: Model, kind: str, started: float, discard: Callable[[Any], None]) -> Callable[[Future], None]:
+        def record(future: Future) -> None:
+            self.stats.record(model_key(model), kind, time.perf_counter() - started, future.exception() is None)
+            if future.exception() is None:
+                discard(future.result())
+        return record
+
+    def invoke(self, messages: List[Message], **kwargs) -> Routed:
+        model, response = self._call(self._ranked(messages, "invoke"), "invoke", lambda m: m.invoke(messages=messages, **kwargs))
+        return Routed(model, response)
+
+    def invoke_stream(self, messages: List[Message], **kwargs) -> Iterator[Routed]:
+        def start(model: Model):
+            # Each candidate's stream is always advanced inside its own context, so its span stays consistent
+            context = contextvars.copy_context()
+            stream = context.run(model.invoke_stream, messages=messages, **kwargs)
+            return stream, context.run(next, stream, _END), context
+
+        def discard(result) -> None:
+            stream, _, context = result
+            context.run(stream.close)
+
+        model, (stream, chunk, context) = self._call(self._ranked(messages, "stream"), "stream", start, discard)
+        try:
+            while chunk is not _END:
+                yield Routed(model, chunk)
+                chunk = context.run(next, stream, _END)
+        finally:
+            context.run(stream.close)
+
+    # --- Async calls ---
+
+    async def _acall(self, candidates: List[Model], kind: str, start: Callable[[Model], Awaitable[Any]], discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> Tuple[Model, Any]:
+        """Async `_call`: candidates run as tasks and the losing hedge is cancelled."""
+        remaining = list(candidates)
+        delay = self._hedge_delay(remaining[0], kind)
+        pending: Dict[asyncio.Task, Tuple[Model, float]] = {}
+
+        def launch() -> None:
+            model = remaining.pop(0)
+            pending[asyncio.create_task(start(model))] = (model, time.perf_counter())
+
+        launch()
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                hedging = delay is not None and bool(remaining)
+                done, _ = await asyncio.wait(pending, timeout=delay if hedging else None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging {kind} request to {model_key(remaining[0])} after {delay:.2f}s")
+                    MODEL_ROUTES.inc(model=model_key(remaining[0]), outcome="hedge_sent")
+                    launch()
+                    continue
+                winner: Optional[Tuple[Model, Any]] = None
+                for task in done:
+                    model, started = pending.pop(task)
+                    self.stats.record(model_key(model), kind, time.perf_counter() - started, task.exception() is None)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        logger.warning(f"{model_key(model)} failed: {error}")
+                    elif winner is None:
+                        winner = model, task.result()
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    for loser_model, loser_started in pending.values():
+                        # The loser took at least as long as the winner; that is all we will learn about it
+                        self.stats.record(model_key(loser_model), kind, time.perf_counter() - loser_started, True)
+                    self._served(winner[0], self._outcome(winner[0], candidates, error))
+                    return winner
+                if not pending and remaining:
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, messages: List[Message], **kwargs) -> Routed:
+        model, response = await self._acall(self._ranked(messages, "invoke"), "invoke", lambda m: m.ainvoke(messages=messages, **kwargs))
+        return Routed(model, response)
+
+    async def ainvoke_stream(self, messages: List[Message], **kwargs) -> AsyncIterator[Routed]:
+        async def step(stream):
+            return await anext(stream, _END)
+
+        async def start(model: Model):
+            context = contextvars.copy_context()
+            stream = model.ainvoke_stream(messages=messages, **kwargs)
+            try:
+                return stream, await asyncio.create_task(step(stream), context=context), context
+            except asyncio.CancelledError:
+                await asyncio.create_task(stream.aclose(), context=context)
+                raise
+
+        async def discard(result) -> None:
+            stream, _, context = result
+            await asyncio.create_task(stream.aclose(), context=context)
+
+        model, (stream, chunk, context) = await self._acall(self._ranked(messages, "stream"), "stream", start, discard)
+        try:
+            while chunk is not _END:
+                yield Routed(model, chunk)
+                chunk = await asyncio.create_task(step(stream), context=context)
+        finally:
+            await asyncio.create_task(stream.aclose(), context=context)
+
+    # --- Parsing goes to whichever provider produced the response ---
+
+    def parse_provider_response(self, response: Routed, **kwargs) -> ModelResponse:
+        return response.model.parse_provider_response(response.raw, **kwargs)
+
+    def parse_provider_response_delta(self, response: Routed) -> ModelResponse:
+        return response.model.parse_provider_response_delta(response.raw)
+
+    def format_function_call_results(self, messages: List[Message], function_call_results: List[Message], **kwargs) -> None:
+        # Tool results are formatted for, and the rest of the run sent to, the provider that asked for them
+        self._pinned = self._last or self.candidates[0]
+        self._pinned.format_function_call_results(messages, function_call_results, **kwargs)
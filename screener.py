@@ -0,0 +1,330 @@
+"""Local pre-screening of a ticker universe, before any model call.
+
+Running the agents over a whole index to find the interesting names costs
+hours and real money. The screener scores every ticker locally instead:
+
+- price history for the universe comes from a few batched `yf.download`
+  calls (SCREEN_BATCH_SIZE tickers each);
+- key fundamentals (P/E, forward P/E, price/book) come from each ticker's
+  yfinance info, fetched concurrently and cached for a day, since yfinance
+  has no bulk call for them;
+- momentum, valuation, volatility and volume-anomaly scores are computed for
+  all tickers at once with NumPy, as cross-sectional z-scores, and combined
+  with weights into one score.
+
+Only the top N then go to the agents for full reports (/screen with
+`analyze`, or `--analyze` here).
+
+    python screener.py --universe sp500 --top 10
+    python screener.py --tickers AAPL,MSFT,NVDA,AMD,INTC --top 3 --analyze
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from cache import DEFAULT_CACHE_DIR, LRUCache, SQLiteStore
+from cached_tools import ERROR_PREFIXES, get_tool_cache
+from indicators import FIELDS, history_to_arrays, sma
+from market_data import download_history
+from prewarm import SEED_TICKERS
+from report_cache import canonical_symbol
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+SCREEN_BATCH_SIZE = int(os.environ.get("SCREEN_BATCH_SIZE", 100))
+# Two years, not one: a "1y" download has only ~250 trading days, too few for the 12-1 month return (YEAR bars)
+SCREEN_PERIOD = os.environ.get("SCREEN_PERIOD", "2y")
+SCREEN_MAX_TICKERS = int(os.environ.get("SCREEN_MAX_TICKERS", 600))
+# Most tickers that can go on to a full agent report in one screen
+SCREEN_MAX_TOP = int(os.environ.get("SCREEN_MAX_TOP", 25))
+# Screens of the same universe within this many seconds reuse the downloaded data
+SCREEN_TTL = float(os.environ.get("SCREEN_TTL", 15 * 60))
+FUNDAMENTALS_TTL = 24 * 3600
+FUNDAMENTALS_WORKERS = int(os.environ.get("SCREEN_FUNDAMENTALS_WORKERS", 16))
+UNIVERSE_TTL = 7 * 24 * 3600
+SP500_URL = os.environ.get("SP500_URL", "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies")
+
+# Kept from each ticker's yfinance info; comparison.py shows them side by side
+FUNDAMENTAL_FIELDS = (
+    "shortName", "sector", "industry", "currency", "marketCap", "trailingPE", "forwardPE", "priceToBook", "trailingEps",
+    "dividendYield", "profitMargins", "revenueGrowth", "beta", "targetMeanPrice", "recommendationKey",
+)
+DEFAULT_WEIGHTS = {"momentum": 0.35, "valuation": 0.25, "volatility": 0.2, "volume": 0.2}
+# Trading days per window
+MONTH, QUARTER, YEAR = 21, 63, 252
+
+_metrics = LRUCache(max_size=16)
+_universes: Optional[SQLiteStore] = None
+_universes_lock = threading.Lock()
+
+
+def _universe_store() -> SQLiteStore:
+    global _universes
+    if _universes is None:
+        with _universes_lock:
+            if _universes is None:
+                _universes = SQLiteStore(os.path.join(DEFAULT_CACHE_DIR, "universes.sqlite3"), table="universes")
+    return _universes
+
+
+def _fetch_sp500() -> List[str]:
+    import pandas as pd
+    table = pd.read_html(SP500_URL, attrs={"id": "constituents"})[0]
+    # Yahoo writes share classes with a dash (BRK-B), the index list with a dot (BRK.B)
+    return [str(symbol).replace(".", "-") for symbol in table["Symbol"]]
+
+
+UNIVERSES = {"sp500": _fetch_sp500, "seeds": lambda: list(SEED_TICKERS)}
+
+
+def load_universe(universe: Union[str, List[str]]) -> List[str]:
+    """Tickers for a universe name (see UNIVERSES) or an explicit list."""
+    if isinstance(universe, list):
+        symbols = [canonical_symbol(t) for t in universe if isinstance(t, str) and t.strip()]
+    else:
+        if universe not in UNIVERSES:
+            raise ValueError(f"Unknown universe '{universe}' (known: {', '.join(UNIVERSES)})")
+        entry = _universe_store().get(universe, ttl=UNIVERSE_TTL)
+        if entry is not None:
+            symbols = entry.value
+        else:
+            symbols = [canonical_symbol(t) for t in UNIVERSES[universe]()]
+            _universe_store().set(universe, symbols)
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        raise ValueError("The universe has no tickers")
+    if len(symbols) > SCREEN_MAX_TICKERS:
+        raise ValueError(f"Universe too large: {len(symbols)} tickers (max {SCREEN_MAX_TICKERS})")
+    return symbols
+
+
+def download_bars(symbols: List[str], period: str = SCREEN_PERIOD) -> Dict[str, np.ndarray]:
+    """(tickers, bars) OHLCV arrays for all symbols, from one `yf.download` per batch."""
+    parts = []
+    for start in range(0, len(symbols), SCREEN_BATCH_SIZE):
+        batch = symbols[start:start + SCREEN_BATCH_SIZE]
+        with span("download", "tool", tickers=len(batch)):
+            history = download_history(batch, period=period)
+        if history is None or history.empty:
+            logger.warning(f"No price history for {len(batch)} tickers starting with {batch[0]}")
+            continue
+        parts.append((batch, history))
+    if not parts:
+        raise RuntimeError("Could not download price history for the universe")
+    # Batches can end on different days; align them on the union of their dates
+    index = sorted(set().union(*(history.index for _, history in parts)))
+    bars = {field: np.full((len(symbols), len(index)), np.nan) for field in FIELDS}
+    row = {symbol: i for i, symbol in enumerate(symbols)}
+    for batch, history in parts:
+        arrays = history_to_arrays(history.reindex(index), batch)
+        rows = [row[symbol] for symbol in batch]
+        for field, values in arrays.items():
+            bars[field][rows] = values
+    return bars
+
+
+def fetch_fundamentals(symbol: str) -> Dict[str, Optional[float]]:
+    """The FUNDAMENTAL_FIELDS of one ticker's info, cached for a day."""
+    import yfinance as yf
+
+    def fetch() -> str:
+        try:
+            info = yf.Ticker(symbol).info
+        except Exception as e:
+            return f"Error fetching fundamentals for {symbol}: {e}"
+        return json.dumps({key: info.get(key) for key in FUNDAMENTAL_FIELDS})
+
+    raw = get_tool_cache().get_or_call("screen_fundamentals", {"symbol": symbol}, FUNDAMENTALS_TTL, fetch)
+    return {} if raw.startswith(ERROR_PREFIXES) else json.loads(raw)
+
+
+def fundamentals(symbols: List[str]) -> List[Dict[str, Any]]:
+    with span("fundamentals", "tool", tickers=len(symbols)):
+        with ThreadPoolExecutor(max_workers=min(FUNDAMENTALS_WORKERS, len(symbols)), thread_name_prefix="screen") as executor:
+            return list(executor.map(fetch_fundamentals, symbols))
+
+
+def _last(values: np.ndarray, lag: int = 0) -> np.ndarray:
+    """Per row, the value `lag` bars before the last bar with data (NaN if there is none)."""
+    valid = ~np.isnan(values)
+    last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1) - lag
+    result = values[np.arange(values.shape[0]), np.clip(last, 0, None)]
+    result[(last < 0) | ~valid.any(axis=1)] = np.nan
+    return result
+
+
+def compute_metrics(bars: Dict[str, np.ndarray], funds: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Raw screening metrics per ticker, all tickers at once."""
+    close, volume = bars["Close"], bars["Volume"]
+    # Tickers with little or no history give all-NaN slices; they come out as NaN, which is what we want
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        last_close = _last(close)
+        returns = np.diff(np.log(close), axis=1)
+        recent = returns[:, -QUARTER:]
+        counts = np.sum(~np.isnan(recent), axis=1)
+        volatility = np.where(counts >= MONTH, np.nanstd(recent, axis=1) * np.sqrt(YEAR), np.nan)
+        volume_avg = _last(sma(volume, MONTH), 1)
+
+        def positive(key: str) -> np.ndarray:
+            values = np.array([f.get(key) if isinstance(f.get(key), (int, float)) else np.nan for f in funds], dtype=float)
+            return np.where(values > 0, values, np.nan)
+
+        return {
+            "close": last_close,
+            "return_1m": last_close / _last(close, MONTH) - 1,
+            "return_3m": last_close / _last(close, QUARTER) - 1,
+            # 12-month return excluding the last month, the usual momentum measure
+            "return_12m_1m": _last(close, MONTH) / _last(close, YEAR - 1) - 1,
+            "above_sma_50": last_close / _last(sma(close, 50)) - 1,
+            "volatility": volatility,
+            "volume_ratio": _last(volume) / volume_avg,
+            "pe": positive("trailingPE"),
+            "forward_pe": positive("forwardPE"),
+            "price_to_book": positive("priceToBook"),
+        }
+
+
+def zscore(values: np.ndarray) -> np.ndarray:
+    """Robust cross-sectional z-scores (median and MAD), clipped to +-3; missing values score 0."""
+    with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(values) if np.isfinite(values).any() else np.nan
+        mad = np.nanmedian(np.abs(values - median)) * 1.4826 if np.isfinite(median) else np.nan
+        z = (values - median) / mad if mad and np.isfinite(mad) else np.zeros_like(values)
+    return np.nan_to_num(np.clip(z, -3, 3), nan=0.0)
+
+
+def _mean(*columns: np.ndarray) -> np.ndarray:
+    return np.mean(np.vstack(columns), axis=0)
+
+
+def compute_scores(metrics: Dict[str, np.ndarray], weights: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """Component scores (higher is more interesting) and their weighted total."""
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    with np.errstate(invalid="ignore"):
+        scores = {
+            "momentum": _mean(zscore(metrics["return_12m_1m"]), zscore(metrics["return_3m"]), zscore(metrics["above_sma_50"])),
+            # Cheaper is better: low earnings and book multiples score high
+            "valuation": -_mean(zscore(np.log(metrics["pe"])), zscore(np.log(metrics["forward_pe"])), zscore(np.log(metrics["price_to_book"]))),
+            "volatility": -zscore(metrics["volatility"]),
+            # Unusual volume in either direction is worth a look
+            "volume": np.abs(zscore(np.log(metrics["volume_ratio"]))),
+        }
+    total = sum(weights.get(name, 0.0) * values for name, values in scores.items())
+    scores["score"] = total / (sum(abs(w) for w in weights.values()) or 1.0)
+    return scores
+
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def screen(
+    universe: Union[str, List[str]] = "sp500",
+    top_n: int = 10,
+    weights: Optional[Dict[str, float]] = None,
+    with_fundamentals: bool = True,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    """Score every ticker in `universe` and return the `top_n` best, most interesting first."""
+    symbols = load_universe(universe)
+    key = json.dumps({"symbols": symbols, "fundamentals": with_fundamentals})
+    with span("screen", "screen", tickers=len(symbols)):
+        entry = None if refresh else _metrics.get(key, ttl=SCREEN_TTL)
+        if entry is not None:
+            metrics, funds = entry.value
+        else:
+            bars = download_bars(symbols)
+            funds = fundamentals(symbols) if with_fundamentals else [{} for _ in symbols]
+            metrics = compute_metrics(bars, funds)
+            _metrics.set(key, (metrics, funds))
+        scores = compute_scores(metrics, weights)
+
+    # Tickers without a price cannot be judged and are left out
+    ranked = [i for i in np.argsort(-scores["score"], kind="stable") if np.isfinite(metrics["close"][i])]
+    results = []
+    for rank, i in enumerate(ranked[:max(1, top_n)], start=1):
+        results.append({
+            "rank": rank,
+            "stock_symbol": symbols[i],
+            "name": funds[i].get("shortName"),
+            "sector": funds[i].get("sector"),
+            "score": _round(scores["score"][i], 3),
+            "scores": {name: _round(values[i], 3) for name, values in scores.items() if name != "score"},
+            "metrics": {name: _round(values[i]) for name, values in metrics.items()},
+        })
+    return {
+        "universe": universe if isinstance(universe, str) else "custom",
+        "screened": len(symbols),
+        "priced": len(ranked),
+        "weights": {**DEFAULT_WEIGHTS, **(weights or {})},
+        "results": results,
+    }
+
+
+def parse_weights(text: Optional[str]) -> Optional[Dict[str, float]]:
+    """`momentum=0.5,valuation=0.5` style weights."""
+    if not text:
+        return None
+    weights = {}
+    for part in text.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() not in DEFAULT_WEIGHTS:
+            raise ValueError(f"Unknown weight '{name.strip()}' (known: {', '.join(DEFAULT_WEIGHTS)})")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--universe", default="sp500", help=f"Named universe ({', '.join(UNIVERSES)})")
+    source.add_argument("--tickers", help="Comma-separated tickers to screen instead of a named universe")
+    parser.add_argument("--top", type=int, default=10, help="How many tickers to keep")
+    parser.add_argument("--weights", help="Score weights, e.g. momentum=0.5,valuation=0.3,volatility=0.2,volume=0")
+    parser.add_argument("--no-fundamentals", action="store_true", help="Skip the per-ticker fundamentals (no valuation score)")
+    parser.add_argument("--analyze", action="store_true", help="Run a full agent report for each of the top tickers")
+    parser.add_argument("--analysis-type", default="Complete Analysis")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    universe = [t for t in args.tickers.split(",") if t.strip()] if args.tickers else args.universe
+    result = screen(universe, min(args.top, SCREEN_MAX_TOP) if args.analyze else args.top, parse_weights(args.weights), not args.no_fundamentals)
+    if args.analyze:
+        # Imported here: the server reads the API keys and builds its caches on import
+        import server
+        items = [(r["stock_symbol"], args.analysis_type) for r in result["results"]]
+        reports = {(r["stock_symbol"], r["analysis_type"]): r for r in server.analyze_items(items, markdown=not args.json)}
+        for r in result["results"]:
+            r["report"] = reports.get((r["stock_symbol"], args.analysis_type))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Screened {result['screened']} tickers ({result['priced']} priced), top {len(result['results'])}:\n")
+    print(f"{'#':>3} {'ticker':<8}{'score':>7}{'mom':>7}{'value':>7}{'vol':>7}{'volume':>8}{'3m ret':>9}{'P/E':>8}")
+    for r in result["results"]:
+        s, m = r["scores"], r["metrics"]
+        ret = f"{m['return_3m']:+.1%}" if m["return_3m"] is not None else "-"
+        pe = f"{m['pe']:.1f}" if m["pe"] is not None else "-"
+        print(f"{r['rank']:>3} {r['stock_symbol']:<8}{r['score']:>7.2f}{s['momentum']:>7.2f}{s['valuation']:>7.2f}{s['volatility']:>7.2f}{s['volume']:>8.2f}{ret:>9}{pe:>8}")
+    for r in result["results"]:
+        report = r.get("report")
+        if report is None:
+            continue
+        print(f"\n{'=' * 80}\n{r['stock_symbol']}\n")
+        print(report["data"] if report["status"] == "success" else f"Failed: {report['message']}")
+
+
+if __name__ == "__main__":
+    main()
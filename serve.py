@@ -0,0 +1,485 @@
+"""Async production server for the API in server.py.
+
+`python server.py` runs Flask's development server, where every in-flight
+analysis (20-60 seconds, almost all of it waiting on Groq and Gemini) pins an
+OS thread. This serves the same API on Tornado instead:
+
+- /analyze, /chat, /analyze/stream and /chat/stream are async handlers that
+  await the agents' `arun`, so concurrent model calls wait on one event loop
+  per process instead of one thread each;
+- every other route (batch, jobs, cache stats, metrics) is handed to the Flask
+  app on a bounded thread pool;
+- `--workers` pre-forks that many processes sharing the listening socket;
+- SIGTERM/SIGINT stop accepting connections, give in-flight requests up to
+  `--shutdown-timeout` seconds to finish, then exit.
+
+The async handlers run report, chat and conversation store calls, which use
+SQLite, on the loop's default executor (`cache.offload`), so a write waiting
+for a lock does not stall the worker's other connections.
+
+Caches, job status and /metrics are per worker process. The first worker
+also runs the pre-warmer (prewarm.py) that keeps popular reports fresh.
+Before forking, the parent imports the provider SDKs and tool libraries that
+a single process loads on first use (`agents.preload`), so workers start
+ready and share those modules' memory.
+
+    python serve.py --port 5001 --workers 4
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.process
+import tornado.web
+import tornado.wsgi
+from tornado import httputil
+from tornado.ioloop import IOLoop
+from werkzeug.wsgi import ClosingIterator
+
+import server
+from admission import Overloaded
+from cache import offload
+from agents import analysis_agent_name, analysis_prompt, new_agent, preload
+from conversation import get_conversation_memory
+from jobs import JobQueueFull
+from prewarm import PREWARM_ENABLED
+from streaming import astream_agent_run, sse_event
+from tracing import attach, start_span
+
+logger = logging.getLogger("serve")
+
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 16))
+# agno runs sync tools (yfinance, DuckDuckGo, team delegation) of async runs on the loop's default executor
+TOOL_THREADS = int(os.environ.get("TOOL_THREADS", 64))
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", 120))
+# Upper bound on analyses running at once per worker, to keep provider rate limits in reach
+MAX_CONCURRENT_ANALYSES = int(os.environ.get("MAX_CONCURRENT_ANALYSES", 64))
+
+
+class InFlight:
+    """Counts requests being handled, on the event loop and in the WSGI threads."""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def add(self, n: int) -> None:
+        with self._lock:
+            self._count += n
+
+    async def drain(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._count and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        return self._count == 0
+
+
+in_flight = InFlight()
+_analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+_running_analyses: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
+
+async def run_coalesced(key: str, factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+    """Identical in-flight analyses share one run, like JobManager does for the thread pool."""
+    task = _running_analyses.get(key)
+    coalesced = task is not None
+    if task is None:
+        async def limited():
+            async with _analysis_slots:
+                return await factory()
+
+        task = asyncio.ensure_future(limited())
+        _running_analyses[key] = task
+        task.add_done_callback(lambda _: _running_analyses.pop(key, None))
+    # Shield the shared run from any single waiter being cancelled
+    return await asyncio.shield(task), coalesced
+
+
+class APIHandler(tornado.web.RequestHandler):
+    """JSON helpers, CORS, tracing and HTTP metrics matching the Flask app's."""
+
+    name = "unknown"
+
+    def set_default_headers(self):
+        self.set_header("Access-Control-Allow-Origin", "*")
+
+    def options(self, *args):
+        self.set_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.set_header("Access-Control-Allow-Headers", self.request.headers.get("Access-Control-Request-Headers", "Content-Type"))
+        self.set_status(204)
+
+    def prepare(self):
+        in_flight.add(1)
+        self.started = time.perf_counter()
+        self.trace_span = start_span(self.name, "request", new_trace=True, method=self.request.method, path=self.request.path)
+        # Each request runs in its own asyncio task, so the span stays active for just this request
+        attach(self.trace_span)
+        self.set_header("X-Trace-Id", self.trace_span.trace_id)
+
+    def on_finish(self):
+        in_flight.add(-1)
+        if hasattr(self, "trace_span"):
+            server.finish_request_trace(self.trace_span, self.started, self.get_status())
+
+    def body(self) -> Optional[Dict[str, Any]]:
+        if self.request.method != "POST":
+            return {k: self.get_query_argument(k) for k in self.request.query_arguments}
+        try:
+            data = json.loads(self.request.body or b"null")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def flag(self, name: str, data: Optional[Dict[str, Any]]) -> bool:
+        value = self.get_query_argument(name, None)
+        if value is None and self.request.method == "POST":
+            value = (data or {}).get(name)
+        return str(value).lower() in ("1", "true", "yes")
+
+    def markdown_requested(self, data: Optional[Dict[str, Any]]) -> bool:
+        value = self.get_query_argument("format", None)
+        if value is None and self.request.method == "POST":
+            value = (data or {}).get("format")
+        return str(value).lower() == "markdown"
+
+    def send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(payload))
+
+    def send_overloaded(self, e: Overloaded, status: int = 429) -> None:
+        self.set_header("Retry-After", str(e.retry_after))
+        self.send_json({"status": "error", "message": str(e), "retry_after": e.retry_after}, status)
+
+    def start_sse(self) -> None:
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.set_header("X-Accel-Buffering", "no")
+
+    async def send_event(self, event: str, data: Dict[str, Any]) -> None:
+        self.write(sse_event(event, data))
+        await self.flush()
+
+
+class AnalyzeHandler(APIHandler):
+    name = "analyze_stock_endpoint"
+
+    async def post(self):
+        data = self.body()
+        stock_symbol, analysis_type, error = server.validate_analysis_request(data)
+        if error:
+            return self.send_json({"status": "error", "message": error}, 400)
+
+        refresh = self.flag("refresh", data)
+        markdown = self.markdown_requested(data)
+        cached = None if refresh else await offload(server.report_cache.get, stock_symbol, analysis_type)
+        server.record_report_cache(stock_symbol, analysis_type, "refresh" if refresh else "hit" if cached is not None else "miss")
+        if cached is not None:
+            return self.send_json(server.render_report(server.analysis_payload(stock_symbol, analysis_type, cached, "hit"), markdown))
+
+        key = server.report_cache.key(stock_symbol, analysis_type)
+        # Shed before starting a run, unless the request would just join one already in flight
+        if key not in _running_analyses and server.job_manager.find(key) is None:
+            try:
+                server.admission.check(analysis_type)
+            except Overloaded as e:
+                return self.send_overloaded(e)
+
+        if self.flag("async", data):
+            # Background jobs stay on the JobManager so /jobs/<id> can report on them
+            try:
+                job, coalesced = server.submit_analysis(stock_symbol, analysis_type, refresh)
+            except JobQueueFull as e:
+                return self.send_overloaded(server.queue_full(e, analysis_type), 503)
+            self.set_header("Location", f"/jobs/{job.id}")
+            return self.send_json({"status": "accepted", "job_id": job.id, "job_status": job.status, "coalesced": coalesced}, 202)
+
+        try:
+            result, coalesced = await run_coalesced(key, lambda: server.run_analysis_async(stock_symbol, analysis_type, refresh))
+        except Overloaded as e:
+            return self.send_overloaded(e)
+        except Exception as e:
+            logger.error(f"Error during analysis for {stock_symbol}: {e}", exc_info=True)
+            return self.send_json({"status": "error", "message": str(e)}, 500)
+        self.send_json({**server.render_report(result, markdown), "coalesced": coalesced})
+
+
+class AnalyzeStreamHandler(APIHandler):
+    name = "analyze_stream_endpoint"
+
+    async def get(self):
+        data = self.body()
+        stock_symbol, analysis_type, error = server.validate_analysis_request(data)
+        if error:
+            return self.send_json({"status": "error", "message": error}, 400)
+        refresh = self.flag("refresh", data)
+        markdown = self.markdown_requested(data)
+
+        cached = None if refresh else await offload(server.report_cache.get, stock_symbol, analysis_type)
+        server.record_report_cache(stock_symbol, analysis_type, "refresh" if refresh else "hit" if cached is not None else "miss")
+        if cached is None:
+            try:
+                server.admission.check(analysis_type)
+            except Overloaded as e:
+                return self.send_overloaded(e)
+        self.start_sse()
+        if cached is not None:
+            return await self.send_event("done", server.render_report(server.analysis_payload(stock_symbol, analysis_type, cached, "hit"), markdown))
+
+        agent_name = analysis_agent_name(analysis_type=analysis_type)
+        logger.info(f"Streaming {agent_name} for: {stock_symbol} ({analysis_type})")
+        await self.send_event("progress", {"stage": "Prefetching market data", "status": "started"})
+        delta = await server.anews_update_delta(stock_symbol, analysis_type)
+        if delta is None or not delta.incremental:
+            prompt = analysis_prompt(stock_symbol, analysis_type, await server.afull_run_context(stock_symbol, analysis_type, delta))
+        await self.send_event("progress", {"stage": "Prefetching market data", "status": "completed"})
+        if delta is not None and delta.incremental:
+            run = server.anews_update_events(delta)
+        else:
+            run = server.admission.astream(analysis_type, lambda: astream_agent_run(new_agent(agent_name), prompt))
+        async for event, payload in run:
+            if event == "complete":
+                entry = await offload(server.report_cache.set, stock_symbol, analysis_type, payload["content"])
+                if delta is not None:
+                    await offload(delta.commit)
+                await self.send_event("done", server.render_report(server.analysis_payload(stock_symbol, analysis_type, entry, "refresh" if refresh else "miss"), markdown))
+            elif event == "error":
+                logger.error(f"Error during streamed analysis for {stock_symbol}: {payload['message']}")
+                await self.send_event("error", {"status": "error", **payload})
+            else:
+                await self.send_event(event, payload)
+
+    post = get
+
+
+class ChatHandler(APIHandler):
+    name = "chat_endpoint"
+
+    def parse_chat_request(self) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
+        """Returns (body, session_id, error_message) for /chat and /chat/stream."""
+        data = self.body()
+        if not data:
+            return None, None, "Invalid JSON payload"
+        if not data.get("user_question"):
+            return None, None, "Missing 'user_question' in request"
+        session_id, error = server.parse_session_id(data)
+        return data, session_id, error
+
+    async def post(self):
+        data, session_id, error = self.parse_chat_request()
+        if error:
+            return self.send_json({"status": "error", "message": error}, 400)
+        user_question = data["user_question"]
+        refresh = self.flag("refresh", data)
+        memory = get_conversation_memory()
+        followup = await offload(memory.has_context, session_id)
+        cached = await offload(server.cached_chat_answer, user_question, refresh, followup)
+        if cached is not None:
+            await offload(memory.record, session_id, user_question, cached.answer)
+            return self.send_json(server.chat_payload(user_question, cached.answer, cached, session_id=session_id))
+        try:
+            logger.info(f"Processing chat question: {user_question}")
+            # A fresh agent per request: concurrent runs on one agent would share its run state
+            prompt = await offload(memory.prompt, session_id, user_question)
+            async with server.admission.aadmit("chat"):
+                response = await new_agent("chat_agent").arun(prompt)
+        except Overloaded as e:
+            return self.send_overloaded(e)
+        except Exception as e:
+            logger.error(f"Error during chat processing: {e}", exc_info=True)
+            return self.send_json({"status": "error", "message": str(e)}, 500)
+        await offload(server.save_chat_answer, user_question, response.content, session_id, followup)
+        self.send_json(server.chat_payload(user_question, response.content, cache_status="refresh" if refresh else "miss", session_id=session_id))
+
+
+class ChatStreamHandler(ChatHandler):
+    name = "chat_stream_endpoint"
+
+    async def get(self):
+        data, session_id, error = self.parse_chat_request()
+        if error:
+            return self.send_json({"status": "error", "message": error}, 400)
+        user_question = data["user_question"]
+        refresh = self.flag("refresh", data)
+        memory = get_conversation_memory()
+        followup = await offload(memory.has_context, session_id)
+        cached = await offload(server.cached_chat_answer, user_question, refresh, followup)
+        if cached is None:
+            try:
+                server.admission.check("chat")
+            except Overloaded as e:
+                return self.send_overloaded(e)
+        self.start_sse()
+        if cached is not None:
+            await offload(memory.record, session_id, user_question, cached.answer)
+            return await self.send_event("done", server.chat_payload(user_question, cached.answer, cached, session_id=session_id))
+        logger.info(f"Streaming chat question: {user_question}")
+        prompt = await offload(memory.prompt, session_id, user_question)
+        async for event, payload in server.admission.astream("chat", lambda: astream_agent_run(new_agent("chat_agent"), prompt)):
+            if event == "complete":
+                await offload(server.save_chat_answer, user_question, payload["content"], session_id, followup)
+                await self.send_event("done", server.chat_payload(user_question, payload["content"], cache_status="refresh" if refresh else "miss", session_id=session_id))
+            elif event == "error":
+                logger.error(f"Error during streamed chat processing: {payload['message']}")
+                await self.send_event("error", {"status": "error", **payload})
+            else:
+                await self.send_event(event, payload)
+
+    post = get
+
+
+class StreamingWSGIContainer(tornado.wsgi.WSGIContainer):
+    """`WSGIContainer` that sends each chunk as the app produces it.
+
+    The stock container buffers the whole body, which would hold back the
+    NDJSON stream of /analyze/batch until the last result.
+    """
+
+    async def handle_request(self, request: httputil.HTTPServerRequest) -> None:
+        data: Dict[str, Any] = {}
+
+        def start_response(status, headers, exc_info=None):
+            data["status"], data["headers"] = status, headers
+            return lambda chunk: None
+
+        loop = IOLoop.current()
+        # Flask keeps its request context in context variables, so every step of one response
+        # (call, iteration, close) runs in the same context even when it lands on another thread
+        context = contextvars.copy_context()
+
+        def run(fn, *args):
+            return loop.run_in_executor(self.executor, context.run, fn, *args)
+
+        app_response = await run(self.wsgi_application, self.environ(request), start_response)
+        chunks = iter(app_response)
+
+        def next_chunk() -> Optional[bytes]:
+            return next(chunks, None)
+
+        connection = request.connection
+        status_code = 500
+        try:
+            chunk = await run(next_chunk)
+            status_code_str, reason = data["status"].split(" ", 1)
+            status_code = int(status_code_str)
+            headers = httputil.HTTPHeaders()
+            for key, value in data["headers"]:
+                headers.add(key, value)
+            connection.write_headers(httputil.ResponseStartLine("HTTP/1.1", status_code, reason), headers, chunk=chunk or b"")
+            while chunk is not None:
+                chunk = await run(next_chunk)
+                if chunk:
+                    await connection.write(chunk)
+        finally:
+            if hasattr(app_response, "close"):
+                await run(app_response.close)
+        connection.finish()
+        self._log(status_code, request)
+
+
+def track_in_flight(wsgi_app):
+    def app(environ, start_response):
+        in_flight.add(1)
+        try:
+            response = wsgi_app(environ, start_response)
+        except BaseException:
+            in_flight.add(-1)
+            raise
+        return ClosingIterator(response, lambda: in_flight.add(-1))
+    return app
+
+
+def make_app(wsgi_threads: int = WSGI_THREADS) -> tornado.web.Application:
+    executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="wsgi")
+    flask_app = StreamingWSGIContainer(track_in_flight(server.app.wsgi_app), executor=executor)
+    return tornado.web.Application([
+        (r"/analyze", AnalyzeHandler),
+        (r"/analyze/stream", AnalyzeStreamHandler),
+        (r"/chat", ChatHandler),
+        (r"/chat/stream", ChatStreamHandler),
+        (r".*", tornado.web.FallbackHandler, {"fallback": flask_app}),
+    ])
+
+
+async def serve(
+    sockets,
+    shutdown_timeout: float = SHUTDOWN_TIMEOUT,
+    wsgi_threads: int = WSGI_THREADS,
+    prewarm: bool = True,
+    started: Optional[float] = None,
+) -> None:
+    http_server = tornado.httpserver.HTTPServer(make_app(wsgi_threads), xheaders=True)
+    http_server.add_sockets(sockets)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="tool"))
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+    ready = f" ({time.perf_counter() - started:.2f}s after start)" if started is not None else ""
+    logger.info(f"Worker {os.getpid()} serving on {', '.join(str(s.getsockname()) for s in sockets)}{ready}")
+    if prewarm and PREWARM_ENABLED:
+        server.prewarmer.start()
+
+    await stopping.wait()
+    logger.info(f"Worker {os.getpid()} shutting down; waiting for {in_flight.count} in-flight requests")
+    http_server.stop()
+    server.prewarmer.stop()
+    if not await in_flight.drain(shutdown_timeout):
+        logger.warning(f"Worker {os.getpid()} exiting with {in_flight.count} requests still in flight")
+    await http_server.close_all_connections()
+    server.job_manager.shutdown()
+
+
+def forward_signal(signum, frame):
+    # The parent only forwards termination to the workers (its own process group) and waits for them
+    signal.signal(signum, signal.SIG_IGN)
+    os.killpg(0, signum)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (0 = one per CPU)")
+    parser.add_argument("--wsgi-threads", type=int, default=WSGI_THREADS, help="Threads per worker for routes served by Flask")
+    parser.add_argument("--shutdown-timeout", type=float, default=SHUTDOWN_TIMEOUT)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=None,
+                        help="Import provider SDKs and tool libraries at startup (default: only when forking workers)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s")
+
+    if args.preload if args.preload is not None else args.workers != 1:
+        started = time.perf_counter()
+        preload()
+        logger.info(f"Preloaded provider SDKs and tool libraries in {time.perf_counter() - started:.2f}s")
+
+    sockets = tornado.netutil.bind_sockets(args.port, args.host)
+    task_id = None
+    if args.workers != 1:
+        signal.signal(signal.SIGTERM, forward_signal)
+        signal.signal(signal.SIGINT, forward_signal)
+        # Returns only in the workers; the parent restarts crashed workers and exits once all have stopped
+        task_id = tornado.process.fork_processes(args.workers)
+    # Timed from here: in a worker that is the fork
+    started = time.perf_counter()
+    # One pre-warmer per server, not per worker; a restarted worker keeps its task id
+    asyncio.run(serve(sockets, args.shutdown_timeout, args.wsgi_threads, prewarm=task_id in (None, 0), started=started))
+
+
+if __name__ == "__main__":
+    main()
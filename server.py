@@ -1,142 +1,604 @@
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS # Import CORS
-from agno.agent import Agent 
-from agno.models.groq import Groq
-from agno.tools.yfinance import YFinanceTools
-from agno.tools.duckduckgo import DuckDuckGoTools
-from agno.models.google import Gemini
+from admission import Overloaded, get_admission_controller
+from agents import ANALYSIS_PROMPTS, GOOGLE_API_KEY, GROQ_API_KEY, STRUCTURED_REPORTS, analysis_agent_name, analysis_prompt, new_agent
+from cache import offload
+from cached_tools import get_tool_cache
+from chat_cache import get_chat_cache
+from comparison import COMPARISON_MAX_TICKERS, COMPARISON_MIN_TICKERS, comparison_key, validate_comparison
+from conversation import SESSION_ID_PATTERN, get_conversation_memory
+from jobs import JobManager, JobQueueFull
+from market_data import QUOTE_DATASETS, format_quote_context, prefetch_quotes
+from news_store import NEWS_INCREMENTAL, anews_delta, news_delta
+from prefetch import aanalysis_context, analysis_context
+from prewarm import PREWARM_ENABLED, Prewarmer, get_demand_tracker
+from report_cache import ReportCache, canonical_symbol
+from report_schema import render_markdown, report_content
+from routing import get_latency_stats
+from screener import SCREEN_MAX_TOP, parse_weights, screen
+from streaming import astream_agent_run, sse_event, stream_agent_run
+from tracing import CACHE_RESULTS, HTTP_REQUEST_SECONDS, activate, annotate, attach, detach, finish_span, render_prometheus, span, start_span
 
 # Load environment variables
 load_dotenv()
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 
 if not GROQ_API_KEY or not GOOGLE_API_KEY:
     raise ValueError("API keys (GROQ_API_KEY, GOOGLE_API_KEY) not found in .env file or environment variables.")
 
 app = Flask(__name__)
 CORS(app)
-# --- Initialize AI Agents (Identical to your Streamlit app) ---
-
-# Web Search Agent
-web_search_agent = Agent(
-    name="Web Search Agent",
-    role="Search the web for the latest information",
-    model=Gemini(api_key=GOOGLE_API_KEY, id="gemini-2.0-flash"), # Use appropriate model ID
-    tools=[DuckDuckGoTools()],
-    instructions=[
-        "ALWAYS present information in tabular format where possible",
-        "Always include sources with dates of publication",
-        "Structure your output with clear headings and bullet points",
-        "For financial news, categorize information by market impact (Positive/Neutral/Negative) in a table format",
-        "Include a summary of key takeaways at the end in a table format"
-    ],
-    show_tool_calls=True, # This might print to console, not affect API response content
-    markdown=True,
+report_cache = ReportCache()
+# Bounded pool for multi-agent runs; identical in-flight (ticker, analysis type) requests share one run
+job_manager = JobManager(
+    max_workers=int(os.environ.get("ANALYSIS_WORKERS", 4)),
+    max_pending=int(os.environ.get("ANALYSIS_MAX_PENDING", 32)),
 )
+# Agents and model clients come from the shared registry in agents.py and are built on first use
+# Every agent run waits for a slot here; excess requests are turned away with 429 (admission.py)
+admission = get_admission_controller()
+# Jobs waiting for a worker are work ahead of a new request too
+admission.backlog = lambda priority: [job.kind for job in job_manager.queued(priority)]
 
-# Financial Agent
-finance_agent = Agent(
-    name="Finance AI Agent",
-    model=Gemini(api_key=GOOGLE_API_KEY, id="gemini-2.0-flash"), # Use appropriate model ID
-    tools=[
-        YFinanceTools(stock_price=True, analyst_recommendations=True, stock_fundamentals=True, company_news=True),
-    ],
-    instructions=[
-        "ALWAYS present ALL data in tabular format - no exceptions",
-        "Present analyst recommendations with consensus ratings in a table (Strong Buy/Buy/Hold/Sell/Strong Sell)",
-        "Include target price ranges and average price targets in a dedicated table",
-        "Provide technical indicators with clear buy/sell signals in a table format",
-        "Format all price data with appropriate currency symbols",
-        "Present 'Timing Guidance' section with short-term, medium-term, and long-term outlooks in a table",
-        "Add a 'Risk Assessment' section in tabular format highlighting potential downsides",
-        "Structure output with clear headings: Summary, Price Data, Fundamentals, Analyst Views, Technical Analysis, Timing Guidance, Risk Assessment",
-        "Even summary information must be presented in a table format"
-    ],
-    show_tool_calls=True,
-    markdown=True,
-)
+# Every request gets a root trace span; model calls, agent runs and tool calls made while
+# handling it (including streamed responses) become its children
+@app.before_request
+def start_request_trace():
+    if request.endpoint in ('metrics_endpoint', 'health_endpoint'):
+        return
+    g.request_started = time.perf_counter()
+    g.trace_span = start_span(request.endpoint or "unknown", "request", new_trace=True, method=request.method, path=request.path)
+    g.trace_token = attach(g.trace_span)
 
-# Combined Multi-Agent System
-multi_ai_agent = Agent(
-    team=[finance_agent, web_search_agent],
-    model=Groq(api_key=GROQ_API_KEY, id="meta-llama/llama-4-maverick-17b-128e-instruct"), # Use appropriate model ID e.g., "mixtral-8x7b-32768" or "llama3-8b-8192"
-    instructions=[
-        "ALWAYS present ALL information in table format - this is mandatory",
-        "Structure output with clear sections using markdown headings, with each section containing at least one table",
-        "First use the Finance Agent to get detailed stock data",
-        "Then use the Web Search Agent for recent news and market sentiment",
-        "Present ALL data in tables - never use paragraphs where tables can be used instead",
-        "Include a 'Stock Fundamentals' table with key metrics and comparisons to industry averages",
-        "Provide 'Analyst Consensus' table with specific ratings, target prices and timeframes",
-        "Add 'Technical Analysis' table with key indicators and clear buy/sell signals",
-        "Include 'Entry Points' table suggesting optimal buying opportunities based on technical patterns",
-        "Add 'Investment Timeframe' table (Short-term trader vs. Long-term investor recommendations)",
-        "Include 'Risk Assessment' table highlighting potential downside scenarios",
-        "End with 'Action Plan' table summarizing recommendations with clear timing guidance",
-        "Always cite sources for all external information in a dedicated sources table"
-    ],
-    show_tool_calls=True,
-    markdown=True,
-)
+@app.after_request
+def add_trace_header(response):
+    if 'trace_span' in g:
+        g.status_code = response.status_code
+        response.headers["X-Trace-Id"] = g.trace_span.trace_id
+    return response
 
-# Gemini Chat Model for AI Assistant
-# Note: The original code used Gemini(id="gemini-2.0-flash") which might be an outdated or specific identifier.
-# Using a common one like "gemini-1.5-flash-latest" or "gemini-pro" for chat.
-# Ensure your agno.models.google.Gemini class has a 'chat' method if you intend to use it like that.
-# If 'chat' isn't a method, you might need to use .run() with a specific role.
-# For simplicity, let's assume it has a .chat() or similar method for direct chat interaction.
-# If not, we'll use the .run() method with a simple prompt.
-
-try:
-    # Attempt to initialize the Gemini model specifically for chat
-    # This assumes your Gemini class can be instantiated this way and has a 'chat' method
-    gemini_chat_model = Gemini(api_key=GOOGLE_API_KEY, id="gemini-2.0-flash") # Or "gemini-pro"
-except Exception as e:
-    app.logger.error(f"Could not initialize dedicated gemini_chat_model: {e}")
-    app.logger.info("Falling back to using a general agent for chat if specific chat model fails.")
-    # Fallback or alternative if direct chat model init fails or no 'chat' method
-    # For example, create another agent instance for chat
-    chatbot_agent_for_direct_chat = Agent(
-        name="Simple Chatbot",
-        model=Gemini(api_key=GOOGLE_API_KEY, id="gemini-2.0-flash"),
-        instructions=["You are a helpful financial assistant. Answer the user's question directly and concisely.", "Present information clearly. Use tables if appropriate for complex data."],
-        markdown=True
+@app.teardown_request
+def end_request_trace(error):
+    token = g.pop('trace_token', None)
+    if token is None:
+        return
+    detach(token)
+    if error is not None:
+        g.trace_span.error = f"{type(error).__name__}: {error}"
+    # Streamed responses finish their trace once the body has been sent (see sse_response)
+    if not g.get('trace_streamed'):
+        finish_request_trace(g.trace_span, g.request_started, g.get('status_code', 500))
+
+def finish_request_trace(trace_span, started, status_code):
+    finish_span(trace_span)
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        endpoint=trace_span.name, method=trace_span.attributes["method"], status=status_code,
     )
-    gemini_chat_model = None # Explicitly nullify if we use the agent below
 
-@app.route('/analyze', methods=['POST'])
-def analyze_stock_endpoint():
-    data = request.get_json()
+def record_report_cache(stock_symbol, analysis_type, outcome):
+    CACHE_RESULTS.inc(cache="report", kind=analysis_type, outcome=outcome)
+    annotate(report_cache=outcome)
+    # Request frequency decides which reports the pre-warmer keeps fresh
+    get_demand_tracker().record(stock_symbol, analysis_type)
+
+def analysis_payload(stock_symbol, analysis_type, entry, cache_status):
+    return {
+        "status": "success",
+        "stock_symbol": stock_symbol,
+        "analysis_type": analysis_type,
+        "data": entry.value,
+        "format": "markdown" if isinstance(entry.value, str) else "json",
+        "cache": cache_status,
+        "generated_at": datetime.fromtimestamp(entry.created_at, timezone.utc).isoformat(),
+        "age_seconds": round(entry.age, 1),
+    }
+
+def render_report(payload, markdown=False):
+    """Reports are stored as StockReport dicts (REPORT_FORMAT=json); render one as markdown when the client asks."""
+    if markdown and payload.get("format") == "json":
+        return {**payload, "data": render_markdown(payload["data"]), "format": "markdown"}
+    return payload
+
+def chat_payload(user_question, answer, cached=None, cache_status="miss", session_id=None):
+    payload = {"status": "success", "user_question": user_question, "data": answer, "cache": "hit" if cached is not None else cache_status}
+    if cached is not None:
+        payload.update(matched_question=cached.question, similarity=cached.similarity, age_seconds=round(cached.age, 1))
+    if session_id:
+        payload["session_id"] = session_id
+    return payload
+
+def parse_session_id(data):
+    """Returns (session_id, error_message); chats without a session id are stateless."""
+    session_id = data.get('session_id')
+    if session_id is None:
+        return None, None
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id):
+        return None, "Invalid 'session_id'. Use up to 128 letters, digits, '.', '_' or '-'."
+    return session_id, None
+
+def cached_chat_answer(user_question, refresh=False, followup=False):
+    # A follow-up depends on the earlier conversation, so it neither reads nor fills the shared answer cache
+    cached = None if refresh or followup else get_chat_cache().get(user_question)
+    if cached is not None:
+        app.logger.info(f"Serving cached chat answer (similarity {cached.similarity:.2f}, age {cached.age:.0f}s) for: {user_question}")
+    return cached
+
+def save_chat_answer(user_question, answer, session_id=None, followup=False):
+    if not followup:
+        get_chat_cache().set(user_question, answer)
+    get_conversation_memory().record(session_id, user_question, answer)
+
+def validate_analysis_request(data):
+    """Validate an analysis request body; returns (stock_symbol, analysis_type, error_message)."""
     if not data:
-        return jsonify({"status": "error", "message": "Invalid JSON payload"}), 400
+        return None, None, "Invalid JSON payload"
 
     stock_symbol = data.get('stock_symbol')
     analysis_type = data.get('analysis_type', 'Complete Analysis') # Default value
 
-    if not stock_symbol:
-        return jsonify({"status": "error", "message": "Missing 'stock_symbol' in request"}), 400
+    if not isinstance(analysis_type, str) or analysis_type not in ANALYSIS_PROMPTS:
+        return None, None, f"Invalid 'analysis_type'. Must be one of: {', '.join(ANALYSIS_PROMPTS)}."
+    if analysis_type == "Comparison":
+        # Several tickers, as a 'tickers' list or a comma-separated 'stock_symbol'; run and cached under one key
+        tickers = data.get('tickers') or stock_symbol
+        if not tickers:
+            return None, None, "Missing 'tickers' in request"
+        error = validate_comparison(tickers)
+        return (None, None, error) if error else (comparison_key(tickers), analysis_type, None)
+    if not isinstance(stock_symbol, str) or not stock_symbol.strip():
+        return None, None, "Missing 'stock_symbol' in request"
 
-    try:
-        if analysis_type == "Complete Analysis":
-            prompt = f"Provide comprehensive analysis for {stock_symbol} including current price, analyst recommendations, technical indicators, and investment outlook."
-        elif analysis_type == "News Impact":
-            prompt = f"Find and summarize the latest news for {stock_symbol} with market impact assessment."
+    return canonical_symbol(stock_symbol), analysis_type, None
+
+def parse_analysis_request():
+    """Validate an analysis request; returns (stock_symbol, analysis_type, error_response)."""
+    # Streaming clients using EventSource can only send GET, so accept query parameters as well
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    stock_symbol, analysis_type, error = validate_analysis_request(data)
+    if error:
+        return None, None, (jsonify({"status": "error", "message": error}), 400)
+    return stock_symbol, analysis_type, None
+
+def flag(name):
+    value = request.args.get(name)
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get(name)
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def overloaded_response(e, status=429):
+    return jsonify({"status": "error", "message": str(e), "retry_after": e.retry_after}), status, {"Retry-After": str(e.retry_after)}
+
+def queue_full(e, analysis_type):
+    """`JobQueueFull` as an `Overloaded` whose Retry-After is when the jobs ahead should have started."""
+    return Overloaded(str(e), admission.estimate_wait(analysis_type))
+
+def markdown_requested():
+    value = request.args.get('format')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('format')
+    return str(value).lower() == 'markdown'
+
+def incremental_news(analysis_type):
+    # Merging needs the stored report as data, so markdown reports are always rebuilt in full
+    return analysis_type == "News Impact" and NEWS_INCREMENTAL and STRUCTURED_REPORTS
+
+def quote_price(quote):
+    return f"{quote['close']}" if quote else None
+
+def news_update_delta(stock_symbol, analysis_type, quote=None):
+    """What is new since the stored News Impact report, or None for analyses that are always run in full."""
+    if not incremental_news(analysis_type):
+        return None
+    delta = news_delta(stock_symbol, report_cache.peek(stock_symbol, analysis_type), price=quote_price(quote))
+    annotate(news_articles=len(delta.articles), news_unseen=len(delta.unseen), news_incremental=delta.incremental)
+    return delta
+
+async def anews_update_delta(stock_symbol, analysis_type, quote=None):
+    if not incremental_news(analysis_type):
+        return None
+    previous = await offload(report_cache.peek, stock_symbol, analysis_type)
+    delta = await anews_delta(stock_symbol, previous, price=quote_price(quote))
+    annotate(news_articles=len(delta.articles), news_unseen=len(delta.unseen), news_incremental=delta.incremental)
+    return delta
+
+def full_run_context(stock_symbol, analysis_type, delta, quote=None):
+    """Prompt context for a full analysis; a News Impact run is given the articles its delta will record as assessed.
+
+    A `quote` from the batch's bulk download (market_data.py) replaces the per-ticker price lookup.
+    """
+    if delta is not None:
+        return delta.context()
+    extra = format_quote_context(stock_symbol, quote) if quote else None
+    return analysis_context(stock_symbol, analysis_type, extra, skip=QUOTE_DATASETS if quote else ())
+
+async def afull_run_context(stock_symbol, analysis_type, delta, quote=None):
+    if delta is not None:
+        return delta.context()
+    extra = format_quote_context(stock_symbol, quote) if quote else None
+    return await aanalysis_context(stock_symbol, analysis_type, extra, skip=QUOTE_DATASETS if quote else ())
+
+def run_news_update(delta, background=False):
+    """Merge an assessment of just the unseen articles into the stored News Impact report."""
+    if not delta.unseen:
+        app.logger.info(f"No new articles for {delta.stock_symbol}, keeping the previous news assessment")
+        return delta.merge(None)
+    app.logger.info(f"Assessing {len(delta.unseen)} new articles for {delta.stock_symbol}")
+    with admission.admit("News Update", background):
+        response = new_agent("news_update_agent").run(delta.prompt())
+    return delta.merge(report_content(response.content))
+
+async def arun_news_update(delta):
+    if not delta.unseen:
+        app.logger.info(f"No new articles for {delta.stock_symbol}, keeping the previous news assessment")
+        return delta.merge(None)
+    app.logger.info(f"Assessing {len(delta.unseen)} new articles for {delta.stock_symbol} (async)")
+    async with admission.aadmit("News Update"):
+        response = await new_agent("news_update_agent").arun(delta.prompt())
+    return delta.merge(report_content(response.content))
+
+def news_update_events(delta):
+    """`run_news_update` as `stream_agent_run` events, for the streaming endpoints."""
+    if not delta.unseen:
+        app.logger.info(f"No new articles for {delta.stock_symbol}, keeping the previous news assessment")
+        yield "complete", {"content": delta.merge(None)}
+        return
+    yield "progress", {"stage": f"Assessing {len(delta.unseen)} new articles", "status": "started"}
+    for event, data in admission.stream("News Update", lambda: stream_agent_run(new_agent("news_update_agent"), delta.prompt())):
+        if event == "complete":
+            try:
+                data = {**data, "content": delta.merge(data["content"])}
+            except ValueError as e:
+                event, data = "error", {"message": str(e)}
+        yield event, data
+
+async def anews_update_events(delta):
+    if not delta.unseen:
+        app.logger.info(f"No new articles for {delta.stock_symbol}, keeping the previous news assessment")
+        yield "complete", {"content": delta.merge(None)}
+        return
+    yield "progress", {"stage": f"Assessing {len(delta.unseen)} new articles", "status": "started"}
+    async for event, data in admission.astream("News Update", lambda: astream_agent_run(new_agent("news_update_agent"), delta.prompt())):
+        if event == "complete":
+            try:
+                data = {**data, "content": delta.merge(data["content"])}
+            except ValueError as e:
+                event, data = "error", {"message": str(e)}
+        yield event, data
+
+def run_analysis(stock_symbol, analysis_type, refresh=False, quote=None, background=False):
+    agent_name = analysis_agent_name(analysis_type=analysis_type)
+    app.logger.info(f"Running {agent_name} for: {stock_symbol} ({analysis_type})")
+    # Runs on a job worker that can outlive the request, so it is traced on its own
+    with span("analysis", "analysis", new_trace=True, stock_symbol=stock_symbol, analysis_type=analysis_type, agent=agent_name):
+        with span("prefetch", "prefetch"):
+            delta = news_update_delta(stock_symbol, analysis_type, quote)
+            if delta is None or not delta.incremental:
+                context = full_run_context(stock_symbol, analysis_type, delta, quote)
+        if delta is not None and delta.incremental:
+            content = run_news_update(delta, background)
         else:
-            return jsonify({"status": "error", "message": "Invalid 'analysis_type'. Must be 'Complete Analysis' or 'News Impact'."}), 400
-        
-        app.logger.info(f"Running multi_ai_agent for: {stock_symbol} ({analysis_type})")
-        response = multi_ai_agent.run(prompt)
-        
-        # The 'response.content' should be the raw markdown string
-        return jsonify({"status": "success", "stock_symbol": stock_symbol, "analysis_type": analysis_type, "data": response.content})
+            with admission.admit(analysis_type, background):
+                response = new_agent(agent_name).run(analysis_prompt(stock_symbol, analysis_type, context))
+            # A StockReport is stored as a dict, a markdown report (REPORT_FORMAT=markdown) as the raw string
+            content = report_content(response.content)
+    entry = report_cache.set(stock_symbol, analysis_type, content)
+    if delta is not None:
+        delta.commit()
+    return analysis_payload(stock_symbol, analysis_type, entry, "refresh" if refresh else "miss")
+
+async def run_analysis_async(stock_symbol, analysis_type, refresh=False, quote=None):
+    """`run_analysis` for the async server (serve.py): awaits the agents instead of blocking a thread."""
+    agent_name = analysis_agent_name(analysis_type=analysis_type)
+    app.logger.info(f"Running {agent_name} (async) for: {stock_symbol} ({analysis_type})")
+    with span("analysis", "analysis", stock_symbol=stock_symbol, analysis_type=analysis_type, agent=agent_name):
+        with span("prefetch", "prefetch"):
+            delta = await anews_update_delta(stock_symbol, analysis_type, quote)
+            if delta is None or not delta.incremental:
+                context = await afull_run_context(stock_symbol, analysis_type, delta, quote)
+        if delta is not None and delta.incremental:
+            content = await arun_news_update(delta)
+        else:
+            async with admission.aadmit(analysis_type):
+                response = await new_agent(agent_name).arun(analysis_prompt(stock_symbol, analysis_type, context))
+            content = report_content(response.content)
+    # SQLite writes can wait on another process's lock, so they stay off the event loop
+    entry = await offload(report_cache.set, stock_symbol, analysis_type, content)
+    if delta is not None:
+        await offload(delta.commit)
+    return analysis_payload(stock_symbol, analysis_type, entry, "refresh" if refresh else "miss")
+
+def submit_analysis(stock_symbol, analysis_type, refresh=False, quote=None, background=False):
+    # Jobs take workers in admission priority order: background runs (batch items, pre-warming)
+    # only start when no interactive job is waiting for one
+    return job_manager.submit(
+        report_cache.key(stock_symbol, analysis_type),
+        lambda: run_analysis(stock_symbol, analysis_type, refresh, quote, background),
+        priority=admission.priority(analysis_type, background),
+        kind=analysis_type,
+    )
+
+def prewarm_report(stock_symbol, analysis_type):
+    # Through the job manager, so a user request for the same report joins the run instead of starting another
+    job, _ = submit_analysis(stock_symbol, analysis_type, refresh=True, background=True)
+    job.wait()
+    if job.error is not None:
+        raise RuntimeError(job.error)
+
+# Started by the process that serves requests (below, or in serve.py), not on import
+prewarmer = Prewarmer(prewarm_report, report_cache)
+
+def traced_events(events, trace_span, started):
+    with activate(trace_span, finish=False):
+        yield from events
+    finish_request_trace(trace_span, started, 200)
 
+def sse_response(events):
+    if 'trace_span' in g:
+        g.trace_streamed = True
+        events = traced_events(events, g.trace_span, g.request_started)
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/analyze', methods=['POST'])
+def analyze_stock_endpoint():
+    stock_symbol, analysis_type, error = parse_analysis_request()
+    if error:
+        return error
+
+    refresh = flag('refresh')
+    markdown = markdown_requested()
+
+    try:
+        cached = None if refresh else report_cache.get(stock_symbol, analysis_type)
+        record_report_cache(stock_symbol, analysis_type, "refresh" if refresh else "hit" if cached is not None else "miss")
+        if cached is not None:
+            app.logger.info(f"Serving cached report for: {stock_symbol} ({analysis_type}), age {cached.age:.0f}s")
+            return jsonify(render_report(analysis_payload(stock_symbol, analysis_type, cached, "hit"), markdown))
+
+        # Shed before queueing a job, unless the request would just join one already in flight
+        if job_manager.find(report_cache.key(stock_symbol, analysis_type)) is None:
+            admission.check(analysis_type)
+        job, coalesced = submit_analysis(stock_symbol, analysis_type, refresh)
+        annotate(job_id=job.id, coalesced=coalesced)
+        if flag('async'):
+            return jsonify({"status": "accepted", "job_id": job.id, "job_status": job.status, "coalesced": coalesced}), 202, {"Location": f"/jobs/{job.id}"}
+
+        job.wait()
+        if isinstance(job.exception, Overloaded):
+            return overloaded_response(job.exception)
+        if job.error is not None:
+            return jsonify({"status": "error", "message": job.error}), 500
+        return jsonify({**render_report(job.result, markdown), "coalesced": coalesced})
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except JobQueueFull as e:
+        return overloaded_response(queue_full(e, analysis_type), 503)
     except Exception as e:
         app.logger.error(f"Error during analysis for {stock_symbol}: {e}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 100))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 16))
+
+def batch_concurrency(data):
+    """The requested fan-out for a batch, clamped to the configured bounds; None if it is not a number.
+
+    Items run as analysis jobs, so more of them than the job pool has workers cannot run at once.
+    """
+    try:
+        return max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_MAX_CONCURRENCY, job_manager.max_workers))
+    except (TypeError, ValueError):
+        return None
+
+def analyze_batch_item(stock_symbol, analysis_type, refresh, quote, markdown=False):
+    cached = None if refresh else report_cache.get(stock_symbol, analysis_type)
+    record_report_cache(stock_symbol, analysis_type, "refresh" if refresh else "hit" if cached is not None else "miss")
+    if cached is not None:
+        return render_report(analysis_payload(stock_symbol, analysis_type, cached, "hit"), markdown)
+    job, coalesced = submit_analysis(stock_symbol, analysis_type, refresh, quote, background=True)
+    job.wait()
+    if job.error is not None:
+        raise RuntimeError(job.error)
+    return {**render_report(job.result, markdown), "coalesced": coalesced}
+
+def analyze_items(items, refresh=False, concurrency=BATCH_CONCURRENCY, markdown=False):
+    """Analyze (stock_symbol, analysis_type) pairs concurrently, yielding each result as it completes."""
+    # A comparison gathers its own data for all its tickers at once
+    symbols = list(dict.fromkeys(symbol for symbol, analysis_type in items if analysis_type != "Comparison"))
+    # One bulk download for the whole watchlist instead of a price lookup per agent run (see full_run_context)
+    quotes = prefetch_quotes(symbols)
+    app.logger.info(f"Batch analysis of {len(items)} items, concurrency {concurrency}, prefetched {len(quotes)} quotes")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="analysis-batch") as executor:
+        futures = {
+            executor.submit(analyze_batch_item, symbol, analysis_type, refresh, quotes.get(symbol), markdown): (symbol, analysis_type)
+            for symbol, analysis_type in items
+        }
+        for future in as_completed(futures):
+            symbol, analysis_type = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                app.logger.error(f"Batch analysis failed for {symbol} ({analysis_type}): {e}")
+                yield {"status": "error", "stock_symbol": symbol, "analysis_type": analysis_type, "message": str(e)}
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch_endpoint():
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"status": "error", "message": "Invalid JSON payload"}), 400
+
+    tickers = data.get('tickers')
+    analysis_types = data.get('analysis_types') or [data.get('analysis_type', 'Complete Analysis')]
+    if not tickers or not isinstance(tickers, list):
+        return jsonify({"status": "error", "message": "Missing 'tickers' list in request"}), 400
+    # A comparison covers several tickers in one report, so it is not a per-ticker batch item
+    invalid = [t for t in analysis_types if t not in ANALYSIS_PROMPTS or t == "Comparison"]
+    if invalid:
+        return jsonify({"status": "error", "message": f"Invalid analysis types: {invalid}"}), 400
+
+    symbols = list(dict.fromkeys(canonical_symbol(t) for t in tickers if isinstance(t, str) and t.strip()))
+    items = [(symbol, analysis_type) for symbol in symbols for analysis_type in analysis_types]
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"status": "error", "message": f"Batch too large: {len(items)} items (max {BATCH_MAX_ITEMS})"}), 400
+
+    concurrency = batch_concurrency(data)
+    if concurrency is None:
+        return jsonify({"status": "error", "message": "'concurrency' must be an integer"}), 400
+    results = analyze_items(items, flag('refresh'), concurrency, markdown_requested())
+
+    if flag('stream'):
+        # Newline-delimited JSON, one line per item in completion order
+        lines = (json.dumps(result) + "\n" for result in results)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson', headers={"X-Batch-Concurrency": str(concurrency)})
+
+    collected = list(results)
+    errors = [r for r in collected if r["status"] == "error"]
+    return jsonify({
+        "status": "success" if not errors else "partial" if len(errors) < len(collected) else "error",
+        "results": [r for r in collected if r["status"] != "error"],
+        "errors": errors,
+        # The fan-out actually used, after clamping to the job pool
+        "concurrency": concurrency,
+    })
+
+@app.route('/screen', methods=['POST'])
+def screen_endpoint():
+    """Rank a universe locally; with `analyze`, run full reports for the top tickers only."""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"status": "error", "message": "Invalid JSON payload"}), 400
+
+    universe = data.get('tickers') or data.get('universe', 'sp500')
+    analysis_type = data.get('analysis_type', 'Complete Analysis')
+    if analysis_type not in ANALYSIS_PROMPTS:
+        return jsonify({"status": "error", "message": f"Invalid analysis type: {analysis_type}"}), 400
+    concurrency = batch_concurrency(data)
+    if concurrency is None:
+        return jsonify({"status": "error", "message": "'concurrency' must be an integer"}), 400
+    comparison = flag('analyze') and analysis_type == "Comparison"
+    try:
+        # A comparison takes the top COMPARISON_MAX_TICKERS unless asked for fewer
+        top_n = max(1, min(int(data.get('top_n', COMPARISON_MAX_TICKERS if comparison else 10)), SCREEN_MAX_TOP))
+        if comparison and not COMPARISON_MIN_TICKERS <= top_n <= COMPARISON_MAX_TICKERS:
+            return jsonify({"status": "error", "message": f"A comparison takes {COMPARISON_MIN_TICKERS} to {COMPARISON_MAX_TICKERS} tickers; 'top_n' is {top_n}"}), 400
+        weights = data.get('weights')
+        if isinstance(weights, str):
+            weights = parse_weights(weights)
+        result = screen(universe, top_n, weights, refresh=flag('refresh'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Screening failed: {e}")
+        return jsonify({"status": "error", "message": f"Screening failed: {e}"}), 502
+    app.logger.info(f"Screened {result['screened']} tickers, top: {[r['stock_symbol'] for r in result['results']]}")
+
+    if flag('analyze'):
+        symbols = [r["stock_symbol"] for r in result["results"]]
+        if comparison:
+            # One comparative report over the top tickers instead of a report each
+            error = validate_comparison(symbols)
+            if error:
+                return jsonify({"status": "error", "message": error}), 400
+            result["comparison"] = next(analyze_items([(comparison_key(symbols), analysis_type)], markdown=markdown_requested()))
+        else:
+            reports = {r["stock_symbol"]: r for r in analyze_items([(s, analysis_type) for s in symbols], False, concurrency, markdown_requested())}
+            for r in result["results"]:
+                r["report"] = reports.get(r["stock_symbol"])
+            result["concurrency"] = concurrency
+    return jsonify({"status": "success", **result})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status_endpoint(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job '{job_id}'"}), 404
+    return jsonify({"status": "success", **job.to_dict()})
+
+@app.route('/analyze/stream', methods=['GET', 'POST'])
+def analyze_stream_endpoint():
+    stock_symbol, analysis_type, error = parse_analysis_request()
+    if error:
+        return error
+
+    refresh = flag('refresh')
+    markdown = markdown_requested()
+
+    cached = None if refresh else report_cache.get(stock_symbol, analysis_type)
+    record_report_cache(stock_symbol, analysis_type, "refresh" if refresh else "hit" if cached is not None else "miss")
+    if cached is None:
+        try:
+            admission.check(analysis_type)
+        except Overloaded as e:
+            return overloaded_response(e)
+
+    def events():
+        if cached is not None:
+            yield sse_event("done", render_report(analysis_payload(stock_symbol, analysis_type, cached, "hit"), markdown))
+            return
+
+        agent_name = analysis_agent_name(analysis_type=analysis_type)
+        app.logger.info(f"Streaming {agent_name} for: {stock_symbol} ({analysis_type})")
+        yield sse_event("progress", {"stage": "Prefetching market data", "status": "started"})
+        with span("prefetch", "prefetch"):
+            delta = news_update_delta(stock_symbol, analysis_type)
+            if delta is None or not delta.incremental:
+                prompt = analysis_prompt(stock_symbol, analysis_type, full_run_context(stock_symbol, analysis_type, delta))
+        yield sse_event("progress", {"stage": "Prefetching market data", "status": "completed"})
+        if delta is not None and delta.incremental:
+            run = news_update_events(delta)
+        else:
+            run = admission.stream(analysis_type, lambda: stream_agent_run(new_agent(agent_name), prompt))
+        for event, data in run:
+            if event == "complete":
+                entry = report_cache.set(stock_symbol, analysis_type, data["content"])
+                if delta is not None:
+                    delta.commit()
+                yield sse_event("done", render_report(analysis_payload(stock_symbol, analysis_type, entry, "refresh" if refresh else "miss"), markdown))
+            elif event == "error":
+                app.logger.error(f"Error during streamed analysis for {stock_symbol}: {data['message']}")
+                yield sse_event("error", {"status": "error", **data})
+            else:
+                yield sse_event(event, data)
+
+    return sse_response(events())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats_endpoint():
+    return jsonify({"status": "success", "tools": get_tool_cache().stats(), "chat": get_chat_cache().stats()})
+
+@app.route('/prewarm/status', methods=['GET'])
+def prewarm_status_endpoint():
+    return jsonify({"status": "success", "enabled": PREWARM_ENABLED, **prewarmer.status()})
+
+@app.route('/models/stats', methods=['GET'])
+def model_stats_endpoint():
+    return jsonify({"status": "success", "models": get_latency_stats().summary()})
+
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats_endpoint():
+    return jsonify({"status": "success", **admission.stats()})
+
+@app.route('/health', methods=['GET'])
+def health_endpoint():
+    # Answers as soon as the process is up: provider SDKs and toolkits load on the first request that needs them
+    return jsonify({"status": "success", "pid": os.getpid()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/chat', methods=['POST'])
 def chat_endpoint():
     data = request.get_json()
@@ -146,36 +608,91 @@ def chat_endpoint():
     user_question = data.get('user_question')
     if not user_question:
         return jsonify({"status": "error", "message": "Missing 'user_question' in request"}), 400
+    session_id, error = parse_session_id(data)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
+
+    refresh = flag('refresh')
+    memory = get_conversation_memory()
+    followup = memory.has_context(session_id)
+    cached = cached_chat_answer(user_question, refresh, followup)
+    if cached is not None:
+        memory.record(session_id, user_question, cached.answer)
+        return jsonify(chat_payload(user_question, cached.answer, cached, session_id=session_id))
 
     try:
         app.logger.info(f"Processing chat question: {user_question}")
-        ai_response_content = None
-
-        if gemini_chat_model and hasattr(gemini_chat_model, 'chat'):
-            # Ideal case: the Gemini model wrapper has a direct chat method
-            ai_response = gemini_chat_model.chat(user_question) # Assumes .chat() returns an object with .content
-            ai_response_content = ai_response.content
-        else:
-            # Fallback: use the chatbot_agent_for_direct_chat or a similar agent's .run() method
-            # This is more aligned with the general 'Agent' structure if a direct '.chat()' isn't available
-            # on your specific Gemini model wrapper.
-            response_obj = chatbot_agent_for_direct_chat.run(user_question)
-            ai_response_content = response_obj.content
+        with admission.admit("chat"):
+            response_obj = new_agent("chat_agent").run(memory.prompt(session_id, user_question))
+        ai_response_content = response_obj.content
+        save_chat_answer(user_question, ai_response_content, session_id, followup)
             
         # The 'ai_response_content' should be the raw markdown string
-        return jsonify({"status": "success", "user_question": user_question, "data": ai_response_content})
+        return jsonify(chat_payload(user_question, ai_response_content, cache_status="refresh" if refresh else "miss", session_id=session_id))
 
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         app.logger.error(f"Error during chat processing: {e}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
 
-if __name__ == '__main__':
-    # Make sure to provide the API keys to your models when initializing them
-    # For Groq and Gemini models in 'agno', they might take api_key as an argument
-    # e.g., model=Groq(api_key=GROQ_API_KEY, id="...")
-    # model=Gemini(api_key=GOOGLE_API_KEY, id="...")
-    # I have added api_key to the model instantiations above. Ensure your agno classes support this.
+@app.route('/chat/stream', methods=['GET', 'POST'])
+def chat_stream_endpoint():
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    if not data:
+        return jsonify({"status": "error", "message": "Invalid JSON payload"}), 400
+
+    user_question = data.get('user_question')
+    if not user_question:
+        return jsonify({"status": "error", "message": "Missing 'user_question' in request"}), 400
+    session_id, error = parse_session_id(data)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
 
+    refresh = flag('refresh')
+    memory = get_conversation_memory()
+    followup = memory.has_context(session_id)
+    cached = cached_chat_answer(user_question, refresh, followup)
+    if cached is None:
+        try:
+            admission.check("chat")
+        except Overloaded as e:
+            return overloaded_response(e)
+
+    def events():
+        if cached is not None:
+            memory.record(session_id, user_question, cached.answer)
+            yield sse_event("done", chat_payload(user_question, cached.answer, cached, session_id=session_id))
+            return
+        app.logger.info(f"Streaming chat question: {user_question}")
+        for event, payload in admission.stream("chat", lambda: stream_agent_run(new_agent("chat_agent"), memory.prompt(session_id, user_question))):
+            if event == "complete":
+                save_chat_answer(user_question, payload["content"], session_id, followup)
+                yield sse_event("done", chat_payload(user_question, payload["content"], cache_status="refresh" if refresh else "miss", session_id=session_id))
+            elif event == "error":
+                app.logger.error(f"Error during streamed chat processing: {payload['message']}")
+                yield sse_event("error", {"status": "error", **payload})
+            else:
+                yield sse_event(event, payload)
+
+    return sse_response(events())
+
+@app.route('/chat/sessions/<session_id>', methods=['GET'])
+def chat_session_endpoint(session_id):
+    session = get_conversation_memory().get(session_id)
+    if session is None:
+        return jsonify({"status": "error", "message": "Unknown or expired session"}), 404
+    return jsonify({"status": "success", "session_id": session_id, **session})
+
+@app.route('/chat/sessions/<session_id>', methods=['DELETE'])
+def clear_chat_session_endpoint(session_id):
+    get_conversation_memory().clear(session_id)
+    return jsonify({"status": "success", "message": "Session cleared"})
+
+if __name__ == '__main__':
+    # Development server only; use `python serve.py` for the async production server
     port = int(os.environ.get("PORT", 5001))
-app.run(host="0.0.0.0", port=port, debug=True)
+    if PREWARM_ENABLED:
+        prewarmer.start()
+    app.run(host="0.0.0.0", port=port, debug=os.environ.get("FLASK_DEBUG", "0").lower() in ('1', 'true', 'yes'))
  # Running on a different port to avoid conflict if needed
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""Server-sent-event streaming of agent runs.
+
+Agents built by the registry carry `progress_hook` as a tool hook. While a
+listener is installed with `listen()`, every tool call (including the ones
+made by team members inside a delegated task) is reported to it, which lets
+the API surface "fetching fundamentals"-style progress while tokens stream.
+"""
+import asyncio
+import contextvars
+import json
+import queue
+import threading
+from contextlib import contextmanager
+from inspect import isgenerator
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+from agno.run.response import RunEvent, RunResponse
+from pydantic import BaseModel
+
+from report_schema import report_content
+
+TOOL_LABELS = {
+    "get_current_stock_price": "Fetching current price",
+    "get_stock_fundamentals": "Fetching fundamentals",
+    "get_analyst_recommendations": "Fetching analyst recommendations",
+    "get_company_news": "Fetching company news",
+    "duckduckgo_search": "Searching the web",
+    "duckduckgo_news": "Searching news",
+}
+
+_listener: contextvars.ContextVar[Optional[Callable[[str, Dict[str, Any]], None]]] = contextvars.ContextVar(
+    "progress_listener", default=None
+)
+
+
+def tool_label(function_name: str) -> str:
+    if function_name in TOOL_LABELS:
+        return TOOL_LABELS[function_name]
+    if function_name.startswith("transfer_task_to_"):
+        return f"Delegating to {function_name[len('transfer_task_to_'):].replace('_', ' ').title()}"
+    return f"Running {function_name}"
+
+
+def emit(event: str, data: Dict[str, Any]) -> None:
+    listener = _listener.get()
+    if listener is not None:
+        listener(event, data)
+
+
+@contextmanager
+def listen(callback: Callable[[str, Dict[str, Any]], None]):
+    token = _listener.set(callback)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def progress_hook(function_name: str, function_call: Callable, arguments: Dict[str, Any]):
+    """agno tool hook reporting tool start/completion to the current listener."""
+    progress = {"tool": function_name, "stage": tool_label(function_name)}
+    emit("progress", {**progress, "status": "started"})
+    result = function_call(**arguments)
+    if isgenerator(result):
+        # Delegated team tasks stream their output; report completion once it is consumed
+        return _complete_after(result, progress)
+    emit("progress", {**progress, "status": "completed"})
+    return result
+
+
+def _complete_after(result: Iterator[Any], progress: Dict[str, Any]) -> Iterator[Any]:
+    yield from result
+    emit("progress", {**progress, "status": "completed"})
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _token(chunk) -> Optional[str]:
+    if chunk.event == RunEvent.run_response.value and isinstance(chunk.content, str) and chunk.content:
+        return chunk.content
+    return None
+
+
+def _structured(chunk) -> Optional[BaseModel]:
+    return chunk.content if isinstance(chunk.content, BaseModel) else None
+
+
+def run_chunks(result) -> Iterator[Any]:
+    # Agents with a response_model do not stream: run(stream=True) returns the whole response instead
+    return iter([result]) if isinstance(result, RunResponse) else result
+
+
+async def arun_chunks(result) -> AsyncIterator[Any]:
+    if isinstance(result, RunResponse):
+        yield result
+        return
+    async for chunk in result:
+        yield chunk
+
+
+def stream_agent_run(agent, prompt: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Run `agent` in a worker thread and yield (event, data) pairs as they happen.
+
+    Emits `progress` events for tool calls, `token` events for content deltas and
+    finally either `complete` with the full document or `error`. Agents that answer
+    with a structured report emit no tokens, and `complete` carries the report as a dict.
+    """
+    events: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue()
+
+    def worker():
+        with listen(lambda event, data: events.put((event, data))):
+            try:
+                chunks, structured = [], None
+                for chunk in run_chunks(agent.run(prompt, stream=True, stream_intermediate_steps=True)):
+                    token = _token(chunk)
+                    if token:
+                        chunks.append(token)
+                        events.put(("token", {"content": token}))
+                    structured = _structured(chunk) or structured
+                events.put(("complete", {"content": report_content(structured) if structured else "".join(chunks)}))
+            except Exception as e:
+                events.put(("error", {"message": str(e)}))
+
+    # Run in a copy of the caller's context so the run's spans join the caller's trace
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(worker,), daemon=True).start()
+    while True:
+        event, data = events.get()
+        yield event, data
+        if event in ("complete", "error"):
+            return
+
+
+async def astream_agent_run(agent, prompt: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Async `stream_agent_run`: the run is a task on the current event loop instead of a thread."""
+    loop = asyncio.get_running_loop()
+    events: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue()
+
+    def put(event: str, data: Dict[str, Any]) -> None:
+        # Sync tools run in worker threads, so their progress events are handed back to the loop
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    async def produce():
+        with listen(put):
+            try:
+                chunks, structured = [], None
+                async for chunk in arun_chunks(await agent.arun(prompt, stream=True, stream_intermediate_steps=True)):
+                    token = _token(chunk)
+                    if token:
+                        chunks.append(token)
+                        put("token", {"content": token})
+                    structured = _structured(chunk) or structured
+                put("complete", {"content": report_content(structured) if structured else "".join(chunks)})
+            except Exception as e:
+                put("error", {"message": str(e)})
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            event, data = await events.get()
+            yield event, data
+            if event in ("complete", "error"):
+                return
+    finally:
+        # Stop the run if the client went away mid-stream
+        task.cancel()
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Caches are created on import under FINANCE_AGENT_CACHE_DIR; keep the tests' out of the working tree
+os.environ.setdefault("FINANCE_AGENT_CACHE_DIR", tempfile.mkdtemp(prefix="finance-agent-tests-"))
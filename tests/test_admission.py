@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from admission import DEFAULT_RUN_SECONDS, RATE_LIMIT_PAUSE, AdmissionController, Overloaded
+
+
+def controller(**options) -> AdmissionController:
+    return AdmissionController(**{"max_runs": 1, "max_queue": 10, "max_wait": 120, "rpm": 0, **options})
+
+
+def wait_until(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_queued_runs_are_admitted_by_priority():
+    admission = controller()
+    holder = admission.acquire("Complete Analysis")
+    order = []
+
+    def run(kind, background=False):
+        ticket = admission.acquire(kind, background)
+        order.append(f"{kind} (background)" if background else kind)
+        admission.release(ticket)
+
+    threads = []
+    for args in [("Complete Analysis", True), ("Complete Analysis",), ("News Impact",), ("chat",)]:
+        threads.append(threading.Thread(target=run, args=args))
+        threads[-1].start()
+        # Queued one by one, so submission order is the reverse of priority order
+        wait_until(lambda: admission.stats()["queued"] == len(threads))
+    admission.release(holder)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["chat", "News Impact", "Complete Analysis", "Complete Analysis (background)"]
+
+
+def test_a_full_queue_sheds_without_queueing():
+    admission = controller(max_queue=1)
+    admission.acquire("Complete Analysis")
+    threading.Thread(target=admission.acquire, args=("Complete Analysis",), daemon=True).start()
+    wait_until(lambda: admission.stats()["queued"] == 1)
+    with pytest.raises(Overloaded):
+        admission.check("Complete Analysis")
+    assert admission.stats()["queued"] == 1 and admission.counts["shed"] == 1
+
+
+def test_queued_background_work_never_sheds_interactive_requests():
+    admission = controller(max_queue=1)
+    admission.acquire("Complete Analysis")
+    threading.Thread(target=admission.acquire, args=("Complete Analysis", True), daemon=True).start()
+    wait_until(lambda: admission.stats()["queued"] == 1)
+    admission.check("Complete Analysis")
+    with pytest.raises(Overloaded):
+        admission.check("Complete Analysis", background=True)
+
+
+def test_retry_after_is_the_estimated_wait():
+    admission = controller(max_wait=10)
+    admission.acquire("Complete Analysis")
+    with pytest.raises(Overloaded) as shed:
+        admission.check("chat")
+    # One slot, taken by a run expected to last DEFAULT_RUN_SECONDS more
+    assert shed.value.retry_after == pytest.approx(DEFAULT_RUN_SECONDS["Complete Analysis"], abs=1)
+
+
+def test_runs_wait_for_the_provider_quota():
+    # One model call a second, and a Complete Analysis spends all six the bucket holds
+    admission = controller(max_runs=8, rpm=60, burst=6)
+    admission.acquire("Complete Analysis")
+    assert admission.estimate_wait("chat") == pytest.approx(1, abs=0.1)
+    with pytest.raises(Overloaded) as timed_out:
+        admission.acquire("chat", timeout=0.05)
+    assert timed_out.value.retry_after == 1 and admission.counts["timed_out"] == 1
+    ticket = admission.acquire("chat", timeout=2)
+    assert ticket.started_at - ticket.enqueued_at > 0.5
+
+
+def test_rate_limit_errors_pause_admissions():
+    admission = controller(max_runs=8)
+    ticket = admission.acquire("chat")
+    admission.release(ticket, RuntimeError("429 Too Many Requests"))
+    assert admission.estimate_wait("chat") == pytest.approx(RATE_LIMIT_PAUSE, abs=1)
+    assert admission.counts["rate_limited"] == 1
+
+
+def test_jobs_waiting_for_a_worker_count_towards_the_wait():
+    admission = controller(max_runs=2, max_wait=60)
+    assert admission.estimate_wait("Complete Analysis") == 0
+    backlog = {admission.priority("Complete Analysis"): ["Complete Analysis"] * 4}
+    admission.backlog = lambda priority: backlog.get(priority, [])
+    assert admission.estimate_wait("Complete Analysis") == pytest.approx(4 * DEFAULT_RUN_SECONDS["Complete Analysis"] / 2)
+    # Queued analyses are not ahead of a chat
+    assert admission.estimate_wait("chat") == 0
+    with pytest.raises(Overloaded) as shed:
+        admission.check("Complete Analysis")
+    assert shed.value.retry_after == 80
@@ -0,0 +1,66 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+from cache import LRUCache, SQLiteStore, TieredCache, offload
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a").value == 1 and cache.get("c").value == 3
+
+
+def test_ttl_is_checked_at_read_time(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"))
+    cache = TieredCache(LRUCache(), store)
+    cache.set("key", {"value": 1})
+    assert cache.get("key", ttl=60).value == {"value": 1}
+    store.set("old", "stale", created_at=time.time() - 120)
+    assert cache.get("old", ttl=60) is None and cache.get("old").value == "stale"
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache(LRUCache(), SQLiteStore(path)).set("key", "value")
+    # Another process's cache: empty memory, same file
+    memory = LRUCache()
+    cache = TieredCache(memory, SQLiteStore(path))
+    entry = cache.get("key")
+    assert entry.value == "value" and memory.get("key").created_at == entry.created_at
+    cache.delete("key")
+    assert cache.get("key") is None and SQLiteStore(path).get("key") is None
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    def increment():
+        store = SQLiteStore(path)
+        for _ in range(20):
+            store.update("count", lambda current: (current or 0) + 1)
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SQLiteStore(path).get("count").value == 80
+
+
+def test_offload_runs_off_the_loop_in_the_callers_context():
+    def blocking():
+        return threading.current_thread(), request_id.get()
+
+    async def handler():
+        request_id.set("r1")
+        return await offload(blocking)
+
+    thread, seen = asyncio.run(handler())
+    assert thread is not threading.main_thread() and seen == "r1"
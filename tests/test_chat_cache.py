@@ -0,0 +1,47 @@
+import pytest
+
+from chat_cache import ChatAnswerCache, normalize_question
+
+
+@pytest.fixture
+def cache():
+    return ChatAnswerCache(max_entries=32, ttl=3600, threshold=0.85)
+
+
+@pytest.mark.parametrize("question", [
+    "When should I buy AAPL?",
+    "How do I buy AAPL?",
+    "Where can I buy AAPL?",
+    "Should I buy AAPL?",
+])
+def test_question_words_are_not_collapsed(cache, question):
+    cache.set("Why should I buy AAPL?", "Because.")
+    assert normalize_question(question) != normalize_question("Why should I buy AAPL?")
+    assert cache.get(question) is None
+
+
+def test_negation_is_not_a_near_duplicate(cache):
+    cache.set("How do interest rates affect stocks?", "Higher rates lower valuations.")
+    assert cache.get("Why do interest rates not affect stocks?") is None
+    assert cache.get("How do interest rates not affect stocks?") is None
+
+
+@pytest.mark.parametrize("negated, plain", [
+    ("Why don't rates affect stocks?", "Why do rates affect stocks?"),
+    ("Can't I short AAPL?", "Can I short AAPL?"),
+    ("Is there no dividend for TSLA?", "Is there a dividend for TSLA?"),
+    ("Has NVDA never split?", "Has NVDA split?"),
+])
+def test_negations_are_kept(cache, negated, plain):
+    cache.set(plain, "Answer.")
+    assert normalize_question(negated) != normalize_question(plain)
+    assert cache.get(negated) is None
+
+
+def test_rephrasing_still_hits(cache):
+    cache.set("Why should I buy AAPL?", "Because.")
+    assert cache.get("why should i buy AAPL").similarity == 1.0
+    assert cache.get("Why should you buy AAPL?").answer == "Because."
+    assert cache.get("What's the outlook for MSFT?") is None
+    cache.set("What is the outlook for MSFT?", "Positive.")
+    assert cache.get("What's the outlook for MSFT?").answer == "Positive."
@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks import fake_data
+from comparison import comparison_context, comparison_key, validate_comparison
+
+
+@pytest.fixture
+def fake_yfinance(monkeypatch):
+    import yfinance
+    monkeypatch.setattr(yfinance, "download", fake_data.fake_download)
+    monkeypatch.setattr(yfinance, "Ticker", fake_data.FakeTicker)
+
+
+def test_comparison_key_is_order_independent():
+    assert comparison_key("msft, aapl vs GOOGL") == comparison_key(["GOOGL", "MSFT", "AAPL"]) == "AAPL,GOOGL,MSFT"
+    assert validate_comparison("AAPL") is not None
+    assert validate_comparison("AAPL,MSFT") is None
+
+
+def test_context_has_every_return(fake_yfinance):
+    context = comparison_context("AAPL,MSFT")
+    for row in ("1M return", "3M return", "12M return (ex last month)", "P/E"):
+        assert f"| {row} |" in context
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import atr, bollinger_bands, ema, latest_indicators, macd, rsi, sma
+
+BARS = 260
+# The second ticker's history starts later, so it is NaN-padded at the start
+PADDING = 40
+
+
+@pytest.fixture(scope="module")
+def bars():
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (2, BARS)), axis=1))
+    high = close * (1 + rng.uniform(0, 0.02, close.shape))
+    low = close * (1 - rng.uniform(0, 0.02, close.shape))
+    volume = rng.uniform(1e6, 5e6, close.shape)
+    for values in (close, high, low, volume):
+        values[1, :PADDING] = np.nan
+    return {"Close": close, "High": high, "Low": low, "Volume": volume}
+
+
+def frames(bars):
+    """Per ticker, a pandas frame of just its valid bars and where they start."""
+    return [(start, pd.DataFrame({k: v[i, start:] for k, v in bars.items()})) for i, start in enumerate((0, PADDING))]
+
+
+def check(actual: np.ndarray, expected: pd.Series, start: int) -> None:
+    np.testing.assert_array_equal(np.isnan(actual[:start]), True)
+    np.testing.assert_allclose(actual[start:], expected.to_numpy(), rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def wilder(series: pd.Series, window: int) -> pd.Series:
+    return series.ewm(alpha=1 / window, adjust=False).mean()
+
+
+def test_moving_averages_match_pandas(bars):
+    close = bars["Close"]
+    for i, (start, frame) in enumerate(frames(bars)):
+        check(sma(close, 20)[i], frame["Close"].rolling(20).mean(), start)
+        check(ema(close, 12)[i], frame["Close"].ewm(span=12, adjust=False).mean(), start)
+
+
+def test_rsi_matches_wilders_smoothing(bars):
+    for i, (start, frame) in enumerate(frames(bars)):
+        delta = frame["Close"].diff()
+        rs = wilder(delta.clip(lower=0), 14) / wilder(-delta.clip(upper=0), 14)
+        expected = (100 - 100 / (1 + rs)).where(delta.notna().cumsum() >= 14)
+        check(rsi(bars["Close"], 14)[i], expected, start)
+
+
+def test_macd_matches_pandas(bars):
+    result = macd(bars["Close"])
+    for i, (start, frame) in enumerate(frames(bars)):
+        close = frame["Close"]
+        line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        line[:25] = np.nan
+        signal = line.ewm(span=9, adjust=False).mean()
+        check(result["macd"][i], line, start)
+        check(result["signal"][i], signal, start)
+        check(result["histogram"][i], line - signal, start)
+
+
+def test_bollinger_bands_match_pandas(bars):
+    result = bollinger_bands(bars["Close"])
+    for i, (start, frame) in enumerate(frames(bars)):
+        middle, std = frame["Close"].rolling(20).mean(), frame["Close"].rolling(20).std(ddof=0)
+        check(result["upper"][i], middle + 2 * std, start)
+        check(result["lower"][i], middle - 2 * std, start)
+
+
+def test_atr_matches_pandas(bars):
+    for i, (start, frame) in enumerate(frames(bars)):
+        previous = frame["Close"].shift()
+        true_range = pd.concat([frame["High"] - frame["Low"], (frame["High"] - previous).abs(), (frame["Low"] - previous).abs()], axis=1).max(axis=1)
+        expected = wilder(true_range, 14)
+        expected[:13] = np.nan
+        check(atr(bars["High"], bars["Low"], bars["Close"], 14)[i], expected, start)
+
+
+def test_latest_values_are_the_last_bar(bars):
+    report = latest_indicators(["AAA", "BBB"], bars)
+    for i, symbol in enumerate(["AAA", "BBB"]):
+        values = report[symbol]["indicators"]
+        assert values["close"] == pytest.approx(bars["Close"][i, -1], abs=1e-4)
+        assert values["sma_20"] == pytest.approx(bars["Close"][i, -20:].mean(), abs=1e-4)
+        # The shorter history has fewer than 200 bars before the end
+        assert (values["sma_200"] is None) == (BARS - (PADDING if i else 0) < 200)
+        assert set(report[symbol]["signals"]) >= {"rsi", "macd", "bollinger", "volume"}
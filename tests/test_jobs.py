@@ -0,0 +1,41 @@
+import threading
+
+from jobs import FAILED, SUCCEEDED, JobManager
+
+
+def test_jobs_cancelled_at_shutdown_fail_instead_of_hanging():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    running, _ = manager.submit("running", release.wait)
+    queued, _ = manager.submit("queued", lambda: "never")
+
+    manager.shutdown(wait=False)
+    assert queued.wait(timeout=5)
+    assert queued.status == FAILED and "cancelled" in queued.error
+    assert manager.find("queued") is None
+
+    release.set()
+    assert running.wait(timeout=5) and running.status == SUCCEEDED
+
+
+def test_submit_after_shutdown_fails_the_job():
+    manager = JobManager(max_workers=1)
+    manager.shutdown()
+    job, coalesced = manager.submit("late", lambda: "never")
+    assert not coalesced and job.wait(timeout=1) and job.status == FAILED
+
+
+def test_queued_jobs_start_in_priority_order():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    order = []
+    manager.submit("running", release.wait)
+    manager.submit("background", lambda: order.append("background"), priority=10, kind="Complete Analysis")
+    manager.submit("interactive", lambda: order.append("interactive"), priority=2, kind="Complete Analysis")
+    last, _ = manager.submit("chat", lambda: order.append("chat"), priority=0, kind="chat")
+
+    assert [job.key for job in manager.queued()] == ["chat", "interactive", "background"]
+    assert [job.key for job in manager.queued(2)] == ["chat", "interactive"]
+    release.set()
+    manager.shutdown()
+    assert order == ["chat", "interactive", "background"] and last.status == SUCCEEDED
@@ -0,0 +1,74 @@
+import json
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import news_store
+from cache import CacheEntry
+from news_store import NEWS_BASELINE_MAX_AGE, NewsStore
+
+
+def done(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def futures(*titles: str) -> dict:
+    news = [{"title": title, "link": f"https://example.com/{title}", "providerPublishTime": 1_700_000_000 + i} for i, title in enumerate(titles)]
+    return {"price": done("101.5"), "company_news": done(json.dumps(news)), "search_news": done("[]")}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = NewsStore(str(tmp_path / "news.sqlite3"))
+    monkeypatch.setattr(news_store, "get_news_store", lambda: store)
+    return store
+
+
+def fresh_report() -> CacheEntry:
+    return CacheEntry({"symbol": "AAPL", "summary": "Calm.", "news": []}, time.time())
+
+
+def test_merged_reports_do_not_extend_the_baseline(store):
+    full = news_store._delta("AAPL", None, futures("a"))
+    assert not full.incremental
+    full.commit()
+    baseline_at = store.state("AAPL")["baseline_at"]
+
+    update = news_store._delta("AAPL", fresh_report(), futures("a", "b"))
+    assert update.incremental and [a.title for a in update.unseen] == ["b"]
+    update.commit()
+    assert store.state("AAPL")["baseline_at"] == baseline_at
+
+
+def test_old_baseline_forces_a_full_analysis_even_with_a_fresh_report(store, monkeypatch):
+    news_store._delta("AAPL", None, futures("a")).commit()
+    later = time.time() + NEWS_BASELINE_MAX_AGE + 1
+    monkeypatch.setattr(news_store.time, "time", lambda: later)
+    assert not news_store._delta("AAPL", fresh_report(), futures("a", "b")).incremental
+
+
+def test_reports_without_a_recorded_baseline_are_rebuilt(store):
+    assert not news_store._delta("AAPL", fresh_report(), futures("a")).incremental
+
+
+def test_full_analysis_prompt_shows_the_articles_it_records(store):
+    titles = [f"Story {n}" for n in range(5)]
+    full = news_store._delta("AAPL", None, futures(*titles))
+    context = full.context()
+    assert all(f"| {title}" in context for title in titles) and "101.5" in context
+    full.commit()
+    assert store.unseen("AAPL", full.articles) == []
+
+
+def test_articles_left_out_of_a_full_analysis_are_still_new(store, monkeypatch):
+    monkeypatch.setattr(news_store, "NEWS_PROMPT_MAX_ARTICLES", 2)
+    full = news_store._delta("AAPL", None, futures("Story A", "Story B", "Story C"))
+    # The newest articles make the prompt; "Story A" is fetched but never shown to the model
+    assert [a.title for a in full.unseen] == ["Story C", "Story B"] and "Story A" not in full.context()
+    full.commit()
+
+    update = news_store._delta("AAPL", fresh_report(), futures("Story A", "Story B", "Story C"))
+    assert update.incremental and [a.title for a in update.unseen] == ["Story A"]
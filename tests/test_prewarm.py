@@ -0,0 +1,30 @@
+import pytest
+
+from prewarm import DemandTracker
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "demand.sqlite3")
+
+
+def test_record_stays_in_memory_until_flushed(path):
+    tracker = DemandTracker(path)
+    for _ in range(3):
+        tracker.record("AAPL", "Complete Analysis")
+    assert DemandTracker(path).top(5) == []
+    assert tracker.top(5) == [("AAPL", "Complete Analysis", 3.0)]
+
+    assert tracker.flush() == 1
+    assert DemandTracker(path).top(5) == [("AAPL", "Complete Analysis", 3.0)]
+    assert tracker.top(5) == [("AAPL", "Complete Analysis", 3.0)]
+
+
+def test_workers_add_up_in_the_shared_store(path):
+    first, second = DemandTracker(path), DemandTracker(path)
+    first.record("AAPL", "News Impact")
+    second.record("AAPL", "News Impact")
+    second.record("MSFT", "News Impact")
+    first.flush()
+    second.flush()
+    assert DemandTracker(path).top(5) == [("AAPL", "News Impact", 2.0), ("MSFT", "News Impact", 1.0)]
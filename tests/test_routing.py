@@ -0,0 +1,93 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+import pytest
+from agno.models.base import Model
+
+import routing
+from routing import MIN_SAMPLES, LatencyStats, RoutedModel, model_key
+
+
+@dataclass
+class FakeModel(Model):
+    delay: float = 0.0
+    fail: bool = False
+
+    def _answer(self):
+        if self.fail:
+            raise RuntimeError(f"{self.id} is down")
+        return self.id
+
+    def invoke(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return self._answer()
+
+    async def ainvoke(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self._answer()
+
+    def invoke_stream(self, *args, **kwargs):
+        yield self.invoke()
+
+    async def ainvoke_stream(self, *args, **kwargs):
+        yield await self.ainvoke()
+
+    def parse_provider_response(self, response, **kwargs):
+        return response
+
+    def parse_provider_response_delta(self, response):
+        return response
+
+
+def record(stats: LatencyStats, model: Model, seconds: float, ok: bool = True, count: int = MIN_SAMPLES) -> None:
+    for _ in range(count):
+        stats.record(model_key(model), "invoke", seconds, ok)
+
+
+def test_rank_prefers_healthy_then_fast_models():
+    stats = LatencyStats()
+    slow, fast, failing, new = FakeModel(id="slow"), FakeModel(id="fast"), FakeModel(id="failing"), FakeModel(id="new")
+    record(stats, slow, 2.0)
+    record(stats, fast, 0.5)
+    record(stats, failing, 0.1, ok=False)
+    # Models without enough samples go first so they get some
+    assert [m.id for m in stats.rank([slow, fast, failing, new], "invoke")] == ["new", "fast", "slow", "failing"]
+
+
+def test_fails_over_to_the_next_candidate():
+    stats = LatencyStats()
+    down, backup = FakeModel(id="down", fail=True), FakeModel(id="backup")
+    routed = RoutedModel(candidates=[down, backup], mode="route", stats=stats)
+    assert routed.invoke([]).model is backup
+    assert stats.error_rate("down") == 0  # One failure is below MIN_SAMPLES
+    with pytest.raises(RuntimeError):
+        RoutedModel(candidates=[down], mode="route", stats=stats).invoke([])
+
+
+def test_hedges_a_request_slower_than_its_p95(monkeypatch):
+    monkeypatch.setattr(routing, "HEDGE_MIN_DELAY", 0.05)
+    stats = LatencyStats()
+    stalled, runner_up = FakeModel(id="stalled", delay=1.0), FakeModel(id="runner_up", delay=0.01)
+    record(stats, stalled, 0.05)
+    record(stats, runner_up, 0.2)
+    routed = RoutedModel(candidates=[stalled, runner_up], mode="hedge", stats=stats)
+
+    started = time.perf_counter()
+    assert routed.invoke([]).model is runner_up
+    assert time.perf_counter() - started < 0.5
+
+    async def hedged():
+        return await routed.ainvoke([])
+
+    started = time.perf_counter()
+    assert asyncio.run(hedged()).model is runner_up
+    assert time.perf_counter() - started < 0.5
+
+
+def test_route_mode_never_hedges():
+    stats = LatencyStats()
+    first, second = FakeModel(id="first", delay=0.1), FakeModel(id="second")
+    record(stats, first, 0.01)
+    record(stats, second, 0.02)
+    assert RoutedModel(candidates=[first, second], mode="route", stats=stats).invoke([]).model is first
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import screener
+from benchmarks import fake_data
+from screener import YEAR, compute_metrics, compute_scores, download_bars
+
+
+def synthetic_bars(tickers: int, bars: int) -> dict:
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (tickers, bars)), axis=1))
+    volume = rng.integers(1_000_000, 5_000_000, (tickers, bars)).astype(float)
+    return {"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close, "Volume": volume}
+
+
+@pytest.fixture
+def fake_yfinance(monkeypatch):
+    import yfinance
+    monkeypatch.setattr(yfinance, "download", fake_data.fake_download)
+
+
+def test_one_year_is_too_short_for_12_1_momentum():
+    # What a "1y" download really returns; the reason SCREEN_PERIOD is longer
+    metrics = compute_metrics(synthetic_bars(5, fake_data.PERIOD_BARS["1y"]), [{}] * 5)
+    assert fake_data.PERIOD_BARS["1y"] < YEAR
+    assert np.isnan(metrics["return_12m_1m"]).all()
+
+
+def test_default_period_has_every_metric(fake_yfinance):
+    symbols = [f"S{i}" for i in range(8)]
+    bars = download_bars(symbols, screener.SCREEN_PERIOD)
+    metrics = compute_metrics(bars, [{}] * len(symbols))
+    for name in ("return_1m", "return_3m", "return_12m_1m", "above_sma_50", "volatility", "volume_ratio"):
+        assert np.isfinite(metrics[name]).all(), name
+
+
+def test_12_1_momentum_moves_the_momentum_score(fake_yfinance):
+    symbols = [f"S{i}" for i in range(8)]
+    metrics = compute_metrics(download_bars(symbols, screener.SCREEN_PERIOD), [{}] * len(symbols))
+    without = dict(metrics, return_12m_1m=np.full(len(symbols), np.nan))
+    assert not np.allclose(compute_scores(metrics)["momentum"], compute_scores(without)["momentum"])
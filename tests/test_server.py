@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+# server.py refuses to import without provider keys; validation never calls the providers
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import server  # noqa: E402
+
+
+@pytest.mark.parametrize("stock_symbol", [None, "", "  ", 123, ["AAPL"], {"symbol": "AAPL"}])
+def test_analysis_requests_need_a_string_symbol(stock_symbol):
+    assert server.validate_analysis_request({"stock_symbol": stock_symbol}) == (None, None, "Missing 'stock_symbol' in request")
+
+
+def test_analysis_request_symbols_are_canonical():
+    assert server.validate_analysis_request({"stock_symbol": " aapl "}) == ("AAPL", "Complete Analysis", None)
+
+
+def test_non_string_symbols_get_a_json_400():
+    response = server.app.test_client().post("/analyze", json={"stock_symbol": 123})
+    assert response.status_code == 400 and response.get_json()["status"] == "error"
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+import tracing
+from tracing import annotate, current_span, render_prometheus, span
+
+
+def test_spans_nest_under_the_current_span():
+    with span("request", "request", new_trace=True) as root:
+        with span("analysis", "agent") as agent:
+            with span("groq:model", "model"):
+                annotate(input_tokens=10, output_tokens=5)
+        assert current_span() is root
+    assert current_span() is None
+    assert [child.name for child in root.children] == ["analysis"] and agent.children[0].attributes["input_tokens"] == 10
+    assert {s.trace_id for s in (root, agent, agent.children[0])} == {root.trace_id}
+    assert root.end is not None and agent.end <= root.end
+
+
+def test_errors_are_recorded_and_counted():
+    with pytest.raises(ValueError):
+        with span("fetch", "tool") as failed:
+            raise ValueError("boom")
+    assert failed.error == "ValueError: boom" and failed.end is not None
+    assert 'finance_agent_span_errors_total{kind="tool",name="fetch"}' in render_prometheus()
+
+
+def test_finished_spans_feed_metrics():
+    with span("test-model", "model") as model_span:
+        annotate(input_tokens=7, output_tokens=3)
+    metrics = render_prometheus()
+    assert 'finance_agent_tokens_total{direction="input",model="test-model"}' in metrics
+    assert 'finance_agent_span_duration_seconds_count{kind="model",name="test-model"}' in metrics
+    assert model_span.attributes == {"input_tokens": 7, "output_tokens": 3}
+
+
+def test_concurrent_tasks_keep_their_own_spans():
+    async def request(name):
+        with span(name, "request", new_trace=True) as root:
+            await asyncio.sleep(0.01)
+            with span("work", "agent"):
+                await asyncio.sleep(0.01)
+        return root
+
+    async def main():
+        return await asyncio.gather(request("a"), request("b"))
+
+    a, b = asyncio.run(main())
+    assert len(a.children) == len(b.children) == 1 and a.trace_id != b.trace_id
+
+
+def test_root_spans_are_dumped(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DUMP_DIR", str(tmp_path))
+    with span("request", "request", new_trace=True) as root:
+        with span("child", "tool"):
+            pass
+    dumped = json.loads((tmp_path / f"{root.trace_id}.json").read_text())
+    assert dumped["name"] == "request" and dumped["children"][0]["name"] == "child"
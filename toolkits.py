@@ -0,0 +1,105 @@
+"""The agents' toolkits, served through the shared tool cache (cached_tools.py).
+
+Importing this module imports yfinance (and with it pandas) and
+duckduckgo-search, which take longer than the rest of the server together.
+Only import it where a toolkit is built, so processes load them on first use.
+"""
+import inspect
+import os
+from typing import Callable, Dict, Optional
+
+from agno.tools.duckduckgo import DuckDuckGoTools
+from agno.tools.yfinance import YFinanceTools
+
+from cached_tools import SEARCH_MAX_RESULTS, SEARCH_TTL, YFINANCE_TTLS, ToolCache, compact_search_results, get_tool_cache, normalize_query
+from rate_limit import TokenBucket
+
+
+def _cached_method(cache: ToolCache, name: str, ttl: float, method: Callable[..., str]) -> Callable[..., str]:
+    method_signature = inspect.signature(method)
+
+    def wrapper(*args, **kwargs) -> str:
+        # Bind to the real signature so positional, keyword and default arguments share one key
+        bound = method_signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        call_args = dict(bound.arguments)
+        if isinstance(call_args.get("symbol"), str):
+            call_args["symbol"] = call_args["symbol"].strip().upper()
+        return cache.get_or_call(name, call_args, ttl, lambda: method(*args, **kwargs))
+
+    # Keep name, docstring and signature so agno builds the same tool schema as for the original
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    wrapper.__wrapped__ = method
+    wrapper.__annotations__ = dict(getattr(method, "__annotations__", {}))
+    return wrapper
+
+
+class CachedYFinanceTools(YFinanceTools):
+    """`YFinanceTools` whose functions are served from a shared `ToolCache`."""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, cache: Optional[ToolCache] = None, **kwargs):
+        self.ttls = {**YFINANCE_TTLS, **(ttls or {})}
+        self.cache = cache or get_tool_cache()
+        # Shadow the bound methods before YFinanceTools registers them as tools
+        for name, ttl in self.ttls.items():
+            setattr(self, name, _cached_method(self.cache, name, ttl, getattr(self, name)))
+        super().__init__(**kwargs)
+
+
+_search_limiter = TokenBucket(
+    rate=float(os.environ.get("SEARCH_RATE_PER_SECOND", 1)),
+    capacity=float(os.environ.get("SEARCH_RATE_BURST", 3)),
+)
+
+
+class CachedDuckDuckGoTools(DuckDuckGoTools):
+    """`DuckDuckGoTools` with query caching, a shared rate limit and compact, de-duplicated results."""
+
+    def __init__(
+        self,
+        ttl: float = SEARCH_TTL,
+        max_results: int = SEARCH_MAX_RESULTS,
+        rate_limiter: Optional[TokenBucket] = None,
+        cache: Optional[ToolCache] = None,
+        **kwargs,
+    ):
+        self.ttl = ttl
+        self.max_results = max_results
+        self.rate_limiter = rate_limiter or _search_limiter
+        self.cache = cache or get_tool_cache()
+        super().__init__(**kwargs)
+
+    def _search(self, tool: str, fetch: Callable[[str, int], str], query: str, max_results: int) -> str:
+        limit = max(1, min(max_results, self.max_results))
+
+        def call() -> str:
+            self.rate_limiter.acquire()
+            # Over-fetch slightly so de-duplication can still fill the limit
+            return compact_search_results(fetch(query, limit + 2), limit)
+
+        return self.cache.get_or_call(tool, {"query": normalize_query(query), "max_results": limit}, self.ttl, call)
+
+    def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+        """Use this function to search DuckDuckGo for a query.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The result from DuckDuckGo.
+        """
+        return self._search("duckduckgo_search", super().duckduckgo_search, query, max_results)
+
+    def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+        """Use this function to get the latest news from DuckDuckGo.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The latest news from DuckDuckGo.
+        """
+        return self._search("duckduckgo_news", super().duckduckgo_news, query, max_results)
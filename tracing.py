@@ -0,0 +1,331 @@
+"""Per-request tracing and Prometheus metrics.
+
+Spans form a tree per trace (one HTTP request or one background analysis) and
+are tracked through a context variable, so nested model calls, sub-agent runs
+and tool calls attach to whatever span is current. Finished spans feed
+Prometheus histograms/counters rendered by `render_prometheus()`; when
+TRACE_DUMP_DIR is set, every finished trace is also written there as JSON.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from inspect import isgenerator
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACE_DUMP_DIR = os.environ.get("TRACE_DUMP_DIR")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+# --- Metrics ---
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_format_labels(k)} {v}" for k, v in sorted(self._values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect_left(self.buckets, value)] += 1
+            totals[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, totals) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', repr(float(bound))),))} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {totals[0]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram("finance_agent_http_request_duration_seconds", "HTTP request latency by endpoint and status.")
+SPAN_SECONDS = Histogram("finance_agent_span_duration_seconds", "Latency of model calls, agent runs and tool calls.")
+SPAN_ERRORS = Counter("finance_agent_span_errors_total", "Spans that ended with an exception.")
+TOKENS = Counter("finance_agent_tokens_total", "LLM tokens by model and direction.")
+CACHE_RESULTS = Counter("finance_agent_cache_requests_total", "Cache lookups by cache, key kind and outcome.")
+MODEL_ROUTES = Counter("finance_agent_model_routes_total", "Routed model calls by serving model and outcome (first_choice, failover, hedge, hedge_sent).")
+ADMISSIONS = Counter("finance_agent_admissions_total", "Agent runs by kind and admission outcome (admitted, shed, timed_out).")
+PREWARMS = Counter("finance_agent_prewarm_reports_total", "Reports regenerated ahead of expiry by the pre-warmer, by outcome.")
+
+METRICS = [HTTP_REQUEST_SECONDS, SPAN_SECONDS, SPAN_ERRORS, TOKENS, CACHE_RESULTS, MODEL_ROUTES, ADMISSIONS, PREWARMS]
+
+
+def render_prometheus() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+# --- Spans ---
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    trace_id: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    end: Optional[float] = None
+    error: Optional[str] = None
+    children: List["Span"] = field(default_factory=list)
+    parent: Optional["Span"] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 2),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(**attributes) -> None:
+    """Attach attributes (e.g. cache outcome, token counts) to the current span."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def start_span(name: str, kind: str, new_trace: bool = False, **attributes) -> Span:
+    """Create a span under the current one without activating it; finish it with `finish_span()`."""
+    parent = None if new_trace else _current_span.get()
+    current = Span(name=name, kind=kind, trace_id=parent.trace_id if parent else uuid.uuid4().hex, attributes=attributes, parent=parent)
+    if parent is not None:
+        parent.children.append(current)
+    return current
+
+
+def attach(current: Span) -> contextvars.Token:
+    """Make `current` the active span; undo with `detach()` in the same context."""
+    return _current_span.set(current)
+
+
+def detach(token: contextvars.Token) -> None:
+    _current_span.reset(token)
+
+
+@contextmanager
+def activate(current: Span, finish: bool = True) -> Iterator[Span]:
+    """Run a block with `current` active, recording any exception on it and finishing it afterwards."""
+    token = attach(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        finish = True
+        raise
+    finally:
+        detach(token)
+        if finish:
+            finish_span(current)
+
+
+@contextmanager
+def span(name: str, kind: str, new_trace: bool = False, **attributes) -> Iterator[Span]:
+    """Open a span as a child of the current one (or as the root of a new trace)."""
+    with activate(start_span(name, kind, new_trace, **attributes)) as current:
+        yield current
+
+
+def finish_span(finished: Span) -> None:
+    finished.end = time.time()
+    if finished.kind != "request":
+        SPAN_SECONDS.observe(finished.duration, kind=finished.kind, name=finished.name)
+    if finished.error:
+        SPAN_ERRORS.inc(kind=finished.kind, name=finished.name)
+    for direction in ("input", "output"):
+        tokens = finished.attributes.get(f"{direction}_tokens")
+        if tokens and finished.kind == "model":
+            TOKENS.inc(tokens, model=finished.name, direction=direction)
+    if finished.parent is None and TRACE_DUMP_DIR:
+        _dump(finished)
+
+
+def _dump(root: Span) -> None:
+    try:
+        os.makedirs(TRACE_DUMP_DIR, exist_ok=True)
+        with open(os.path.join(TRACE_DUMP_DIR, f"{root.trace_id}.json"), "w") as f:
+            json.dump({"trace_id": root.trace_id, **root.to_dict()}, f, indent=2, default=str)
+    except OSError as e:
+        logger.warning(f"Could not write trace {root.trace_id}: {e}")
+
+
+# --- agno instrumentation ---
+
+def _usage(response: Any) -> Dict[str, int]:
+    """Token counts from a raw provider response (OpenAI-style `usage` or Gemini `usage_metadata`)."""
+    # Groq reports usage of streamed responses under `x_groq`
+    usage = getattr(response, "usage", None) or getattr(getattr(response, "x_groq", None), "usage", None)
+    if usage is not None:
+        return {"input_tokens": getattr(usage, "prompt_tokens", None) or 0, "output_tokens": getattr(usage, "completion_tokens", None) or 0}
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        return {"input_tokens": getattr(usage, "prompt_token_count", None) or 0, "output_tokens": getattr(usage, "candidates_token_count", None) or 0}
+    return {}
+
+
+def instrument_model(model):
+    """Wrap a model's (a)invoke/(a)invoke_stream so every provider round trip becomes a `model` span."""
+    invoke, invoke_stream = model.invoke, model.invoke_stream
+    ainvoke, ainvoke_stream = model.ainvoke, model.ainvoke_stream
+    name = f"{model.provider}:{model.id}" if getattr(model, "provider", None) else model.id
+
+    def traced_invoke(*args, **kwargs):
+        with span(name, "model") as model_span:
+            response = invoke(*args, **kwargs)
+            model_span.attributes.update(_usage(response))
+            return response
+
+    def traced_invoke_stream(*args, **kwargs):
+        with span(name, "model", stream=True) as model_span:
+            for chunk in invoke_stream(*args, **kwargs):
+                # Streaming providers report usage on the final chunk(s)
+                model_span.attributes.update(_usage(chunk))
+                yield chunk
+
+    async def traced_ainvoke(*args, **kwargs):
+        with span(name, "model") as model_span:
+            response = await ainvoke(*args, **kwargs)
+            model_span.attributes.update(_usage(response))
+            return response
+
+    async def traced_ainvoke_stream(*args, **kwargs):
+        with span(name, "model", stream=True) as model_span:
+            async for chunk in ainvoke_stream(*args, **kwargs):
+                model_span.attributes.update(_usage(chunk))
+                yield chunk
+
+    model.invoke = traced_invoke
+    model.invoke_stream = traced_invoke_stream
+    model.ainvoke = traced_ainvoke
+    model.ainvoke_stream = traced_ainvoke_stream
+    return model
+
+
+def _run_tokens(run_response) -> Dict[str, int]:
+    metrics = getattr(run_response, "metrics", None) or {}
+    tokens = {}
+    for key in ("input_tokens", "output_tokens"):
+        value = metrics.get(key)
+        if value is not None:
+            tokens[key] = sum(value) if isinstance(value, list) else value
+    return tokens
+
+
+def instrument_agent(agent):
+    """Wrap `agent.run`/`agent.arun` so each (sub-)agent run becomes an `agent` span with its token totals."""
+    run, arun = agent.run, agent.arun
+
+    # Agents with a response_model are not streamable: run(stream=True) returns the whole response
+    def traced_run(*args, stream=False, **kwargs):
+        if stream and agent.is_streamable:
+            return _traced_stream(agent, run, *args, stream=stream, **kwargs)
+        with span(agent.name or "agent", "agent") as agent_span:
+            response = run(*args, stream=stream, **kwargs)
+            agent_span.attributes.update(_run_tokens(response))
+            return response
+
+    async def traced_arun(*args, stream=False, **kwargs):
+        if stream and agent.is_streamable:
+            return _traced_astream(agent, arun, *args, stream=stream, **kwargs)
+        with span(agent.name or "agent", "agent") as agent_span:
+            response = await arun(*args, stream=stream, **kwargs)
+            agent_span.attributes.update(_run_tokens(response))
+            return response
+
+    agent.run = traced_run
+    agent.arun = traced_arun
+    return agent
+
+
+def _traced_stream(agent, run, *args, **kwargs):
+    with span(agent.name or "agent", "agent", stream=True) as agent_span:
+        yield from run(*args, **kwargs)
+        agent_span.attributes.update(_run_tokens(getattr(agent, "run_response", None)))
+
+
+async def _traced_astream(agent, arun, *args, **kwargs):
+    with span(agent.name or "agent", "agent", stream=True) as agent_span:
+        async for chunk in await arun(*args, **kwargs):
+            yield chunk
+        agent_span.attributes.update(_run_tokens(getattr(agent, "run_response", None)))
+
+
+def trace_tool_hook(function_name: str, function_call, arguments: Dict[str, Any]):
+    """agno tool hook recording each tool call as a `tool` span."""
+    tool_span = start_span(function_name, "tool")
+    with activate(tool_span, finish=False):
+        result = function_call(**arguments)
+    if isgenerator(result):
+        # Delegated team tasks stream their output; keep the span open until it is consumed
+        return _trace_stream(tool_span, result)
+    finish_span(tool_span)
+    return result
+
+
+def _trace_stream(tool_span: Span, result: Iterator[Any]) -> Iterator[Any]:
+    with activate(tool_span):
+        yield from result